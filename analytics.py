@@ -0,0 +1,232 @@
+import os
+import argparse
+import asyncio
+import logging
+from datetime import date, datetime, timedelta
+from fastapi.concurrency import run_in_threadpool
+from mysql.connector import Error, errorcode
+from database import get_connection
+
+logger = logging.getLogger(__name__)
+
+# Rollup table -> its grouping columns and the expressions that fill them. Vendor and category are
+# the ones order_items recorded at placement (migrations/0012_order_item_snapshot.sql), so adding
+# and taking out an order hit the same rows; items without them fall back to the product's current ones
+VENDOR = "COALESCE(oi.vendor_id, p.vendor_id, 0)"
+CATEGORY = "COALESCE(oi.category, p.category, '')"
+ROLLUPS = {
+    "sales_product_daily": {"product_id": "oi.product_id", "vendor_id": VENDOR, "category": CATEGORY},
+    "sales_vendor_daily": {"vendor_id": VENDOR},
+    "sales_category_daily": {"category": CATEGORY},
+    "sales_daily": {},
+}
+DEADLOCK_RETRIES = 3
+
+
+# Aggregate the matching orders' items in the database and add them (times the first three
+# parameters, 1 or -1) to a rollup table; archived reads orders_archive/order_items_archive
+def _rollup_sql(table, where, archived=False):
+    suffix = "_archive" if archived else ""
+    columns = ["day", *ROLLUPS[table]]
+    expressions = ", ".join(["DATE(o.created_at)", *ROLLUPS[table].values()])
+    return (
+        f"INSERT INTO {table} ({', '.join(columns)}, order_count, units, revenue) "
+        f"SELECT {expressions}, %s * COUNT(DISTINCT o.id), %s * SUM(oi.quantity), %s * SUM(oi.subtotal) "
+        f"FROM orders{suffix} o JOIN order_items{suffix} oi ON oi.order_id = o.id LEFT JOIN products p ON p.id = oi.product_id "
+        f"WHERE {where} GROUP BY {expressions} "
+        "ON DUPLICATE KEY UPDATE order_count = order_count + VALUES(order_count), "
+        "units = units + VALUES(units), revenue = revenue + VALUES(revenue)"
+    )
+
+
+def record_orders(cursor, order_ids, sign=1):
+    """Add orders to the rollups, or take them out again with sign=-1, in the caller's transaction."""
+    placeholders = ", ".join(["%s"] * len(order_ids))
+    for table in ROLLUPS:
+        cursor.execute(_rollup_sql(table, f"o.id IN ({placeholders})"), (sign, sign, sign, *order_ids))
+
+
+def queue_orders(cursor, order_ids, sign=1):
+    """Queue orders to be added to the rollups, or taken out with sign=-1, in the caller's transaction.
+
+    Every order transaction would otherwise update the same sales_daily row for the day and
+    hold its lock until commit. The queue only gets new rows; RollupWorker applies it.
+    """
+    cursor.executemany(
+        "INSERT INTO sales_rollup_queue (order_id, sign) VALUES (%s, %s)",
+        [(order_id, sign) for order_id in order_ids]
+    )
+
+
+def _apply_batch(cursor, batch_size):
+    # SKIP LOCKED lets workers in several processes take disjoint batches
+    cursor.execute(
+        "SELECT id, order_id, sign FROM sales_rollup_queue ORDER BY id LIMIT %s FOR UPDATE SKIP LOCKED",
+        (batch_size,)
+    )
+    rows = cursor.fetchall()
+    if not rows:
+        return 0
+
+    for sign in (1, -1):
+        order_ids = [order_id for _, order_id, row_sign in rows if row_sign == sign]
+        if order_ids:
+            record_orders(cursor, order_ids, sign)
+    placeholders = ", ".join(["%s"] * len(rows))
+    cursor.execute(f"DELETE FROM sales_rollup_queue WHERE id IN ({placeholders})", tuple(row[0] for row in rows))
+    return len(rows)
+
+
+def apply_queue(conn, batch_size=500):
+    """Apply up to batch_size queued orders to the rollups in one transaction; returns how many."""
+    cursor = conn.cursor()
+
+    try:
+        for attempt in range(DEADLOCK_RETRIES):
+            try:
+                applied = _apply_batch(cursor, batch_size)
+                conn.commit()
+                return applied
+            except Error as e:
+                conn.rollback()
+                if e.errno != errorcode.ER_LOCK_DEADLOCK or attempt == DEADLOCK_RETRIES - 1:
+                    raise
+
+    finally:
+        cursor.close()
+
+
+class RollupWorker:
+    """Background job that applies sales_rollup_queue to the rollups, one batch per transaction."""
+
+    def __init__(self, batch_size=500, interval=1.0):
+        self.batch_size = batch_size
+        self.interval = interval
+        self._task = None
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self.run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def run(self):
+        while True:
+            try:
+                applied = await run_in_threadpool(self.apply_once)
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception("Rollup worker failed to apply the queue")
+                applied = 0
+            if applied < self.batch_size:
+                await asyncio.sleep(self.interval)
+
+    def apply_once(self):
+        conn = get_connection()
+
+        try:
+            return apply_queue(conn, self.batch_size)
+
+        finally:
+            conn.close()
+
+
+rollup_worker = RollupWorker(
+    batch_size=int(os.getenv("ROLLUP_BATCH_SIZE", "500")),
+    interval=float(os.getenv("ROLLUP_INTERVAL", "1")),
+)
+
+
+def _rebuild_day(cursor, day):
+    start = datetime(day.year, day.month, day.day)
+    # The rebuild counts the day's orders as they are now, so their queued changes are dropped
+    for orders_table in ("orders", "orders_archive"):
+        cursor.execute(
+            f"DELETE FROM sales_rollup_queue WHERE order_id IN "
+            f"(SELECT id FROM {orders_table} WHERE created_at >= %s AND created_at < %s)",
+            (start, start + timedelta(days=1))
+        )
+    for table in ROLLUPS:
+        cursor.execute(f"DELETE FROM {table} WHERE day = %s", (day,))
+    for table in ROLLUPS:
+        for archived in (False, True):
+            cursor.execute(
+                _rollup_sql(table, "o.created_at >= %s AND o.created_at < %s AND o.status <> 'Canceled'", archived),
+                (1, 1, 1, start, start + timedelta(days=1))
+            )
+
+
+def backfill(date_from=None, date_to=None):
+    """Rebuild the rollups from order history, one day per transaction.
+
+    Yields (day, orders, revenue) as each day is committed. Days are found by seeking
+    on created_at in orders and orders_archive, so days without orders are skipped and
+    archived orders (see archive.py) still count. Queued changes for the day's orders
+    are dropped, since the rebuild already reflects them. An order placed, canceled or
+    archived while its day is being rebuilt waits on the day's row locks (InnoDB's
+    default REPEATABLE READ), as does a RollupWorker batch, and is counted exactly once.
+    """
+    conn = get_connection()
+    cursor = conn.cursor()
+
+    try:
+        day = date_from
+        while True:
+            where = "WHERE 1=1"
+            params = []
+            if day is not None:
+                where += " AND created_at >= %s"
+                params.append(datetime(day.year, day.month, day.day))
+            if date_to is not None:
+                where += " AND created_at < %s"
+                params.append(datetime(date_to.year, date_to.month, date_to.day) + timedelta(days=1))
+            first = []
+            for table in ("orders", "orders_archive"):
+                cursor.execute(f"SELECT created_at FROM {table} {where} ORDER BY created_at LIMIT 1", tuple(params))
+                row = cursor.fetchone()
+                if row:
+                    first.append(row[0])
+            if not first:
+                break
+            day = min(first).date()
+
+            for attempt in range(DEADLOCK_RETRIES):
+                try:
+                    _rebuild_day(cursor, day)
+                    conn.commit()
+                    break
+                except Error as e:
+                    conn.rollback()
+                    if e.errno != errorcode.ER_LOCK_DEADLOCK or attempt == DEADLOCK_RETRIES - 1:
+                        raise
+
+            cursor.execute("SELECT order_count, revenue FROM sales_daily WHERE day = %s", (day,))
+            order_count, revenue = cursor.fetchone() or (0, 0)
+            yield day, order_count, revenue
+            day += timedelta(days=1)
+
+    finally:
+        cursor.close()
+        conn.close()
+
+
+# python analytics.py [--from 2025-01-01] [--to 2025-12-31]   rebuild the sales rollups from order history
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--from", dest="date_from", type=date.fromisoformat)
+    parser.add_argument("--to", dest="date_to", type=date.fromisoformat)
+    args = parser.parse_args()
+
+    days = 0
+    for day, order_count, revenue in backfill(args.date_from, args.date_to):
+        days += 1
+        print(f"{day}: {order_count} orders, {revenue} revenue")
+    print(f"Rebuilt {days} day(s) of sales rollups")
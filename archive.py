@@ -0,0 +1,169 @@
+import os
+import argparse
+import asyncio
+import logging
+from datetime import datetime, timedelta
+from fastapi.concurrency import run_in_threadpool
+from mysql.connector import Error, errorcode
+from database import get_connection
+
+logger = logging.getLogger(__name__)
+
+# Orders in these statuses never change again, so they can leave the live tables
+ARCHIVED_STATUSES = ("Delivered", "Canceled")
+# Live table -> the columns copied into its archive table (migrations/0008_order_archive.sql and 0012),
+# children first so an order row is always the last one moved
+ARCHIVE_COLUMNS = {
+    "order_items": ["id", "order_id", "product_id", "quantity", "subtotal", "vendor_id", "category"],
+    "deliveries": ["id", "order_id", "delivery_personnel_id", "status", "tracking_link", "updated_at"],
+    "payments": ["id", "order_id", "amount", "payment_method", "payment_status", "stripe_session_id"],
+    "orders": ["id", "customer_id", "status", "total_amount", "created_at", "delivery_latitude", "delivery_longitude"],
+}
+DEADLOCK_RETRIES = 3
+
+
+def _move_chunk(cursor, status, before, chunk_size):
+    # SKIP LOCKED lets archivers in several workers take disjoint chunks
+    cursor.execute(
+        "SELECT id FROM orders WHERE status = %s AND created_at < %s "
+        "ORDER BY created_at, id LIMIT %s FOR UPDATE SKIP LOCKED",
+        (status, before, chunk_size)
+    )
+    order_ids = [row[0] for row in cursor.fetchall()]
+    if not order_ids:
+        return 0
+
+    placeholders = ", ".join(["%s"] * len(order_ids))
+    for table, columns in ARCHIVE_COLUMNS.items():
+        key = "id" if table == "orders" else "order_id"
+        column_list = ", ".join(columns)
+        cursor.execute(
+            f"INSERT INTO {table}_archive ({column_list}) SELECT {column_list} FROM {table} WHERE {key} IN ({placeholders})",
+            tuple(order_ids)
+        )
+    for table in ARCHIVE_COLUMNS:
+        key = "id" if table == "orders" else "order_id"
+        cursor.execute(f"DELETE FROM {table} WHERE {key} IN ({placeholders})", tuple(order_ids))
+    return len(order_ids)
+
+
+def archive_chunk(conn, before, chunk_size=1000):
+    """Move up to chunk_size completed orders placed before `before`, with their items,
+    delivery and payments, into the archive tables in one transaction.
+
+    Returns the number of orders moved; 0 when nothing is left to archive.
+    """
+    cursor = conn.cursor()
+
+    try:
+        for status in ARCHIVED_STATUSES:
+            for attempt in range(DEADLOCK_RETRIES):
+                try:
+                    moved = _move_chunk(cursor, status, before, chunk_size)
+                    conn.commit()
+                    break
+                except Error as e:
+                    conn.rollback()
+                    if e.errno != errorcode.ER_LOCK_DEADLOCK or attempt == DEADLOCK_RETRIES - 1:
+                        raise
+            if moved:
+                return moved
+        return 0
+
+    finally:
+        cursor.close()
+
+
+def archive_orders(before, chunk_size=1000):
+    """Archive every completed order placed before `before`, one chunk per transaction.
+
+    Yields the number of orders moved as each chunk is committed.
+    """
+    conn = get_connection()
+
+    try:
+        while True:
+            moved = archive_chunk(conn, before, chunk_size)
+            if not moved:
+                break
+            yield moved
+
+    finally:
+        conn.close()
+
+
+class OrderArchiver:
+    """Background job that keeps the live order tables down to recent and open orders.
+
+    Archives one chunk per threadpool call, pausing between chunks so the archive
+    never holds locks or a connection for long, and checks again every interval
+    once it has caught up. Stops with a warning if the archive tables do not exist.
+    """
+
+    def __init__(self, after_days=90, chunk_size=1000, interval=3600, pause=0.5):
+        self.after_days = after_days
+        self.chunk_size = chunk_size
+        self.interval = interval
+        self.pause = pause
+        self._task = None
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self.run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def run(self):
+        while True:
+            try:
+                moved = await run_in_threadpool(self.archive_once)
+            except asyncio.CancelledError:
+                raise
+            except Error as e:
+                if e.errno == errorcode.ER_NO_SUCH_TABLE:
+                    logger.warning("Order archiver stopped: archive tables are missing (migration 0008_order_archive): %s", e)
+                    return
+                logger.exception("Order archiver failed to archive a chunk")
+                moved = 0
+            except Exception:
+                logger.exception("Order archiver failed to archive a chunk")
+                moved = 0
+            await asyncio.sleep(self.pause if moved else self.interval)
+
+    def archive_once(self):
+        conn = get_connection()
+
+        try:
+            return archive_chunk(conn, datetime.now() - timedelta(days=self.after_days), self.chunk_size)
+
+        finally:
+            conn.close()
+
+
+archiver = OrderArchiver(
+    after_days=int(os.getenv("ARCHIVE_AFTER_DAYS", "90")),
+    chunk_size=int(os.getenv("ARCHIVE_CHUNK_SIZE", "1000")),
+    interval=float(os.getenv("ARCHIVE_INTERVAL", "3600")),
+    pause=float(os.getenv("ARCHIVE_PAUSE", "0.5")),
+)
+
+
+# python archive.py [--days 90] [--chunk-size 1000]   archive completed orders older than --days now
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--days", type=int, default=archiver.after_days)
+    parser.add_argument("--chunk-size", type=int, default=archiver.chunk_size)
+    args = parser.parse_args()
+
+    total = 0
+    for moved in archive_orders(datetime.now() - timedelta(days=args.days), args.chunk_size):
+        total += moved
+        print(f"Archived {total} order(s)")
+    print(f"Archived {total} completed order(s) older than {args.days} day(s)")
@@ -0,0 +1,109 @@
+import math
+
+KM_PER_DEGREE_LAT = 110.57
+KM_PER_DEGREE_LON = 111.32
+
+
+class CourierGrid:
+    """Uniform grid over courier positions for nearest-courier lookups.
+
+    Coordinates are projected onto a local plane (equirectangular around the
+    couriers' mean latitude), which is accurate enough at city scale.
+    """
+
+    def __init__(self, couriers, cell_km=2.0):
+        self.cell_km = cell_km
+        latitudes = [courier["latitude"] for courier in couriers]
+        self.lon_scale = KM_PER_DEGREE_LON * math.cos(math.radians(sum(latitudes) / len(latitudes))) if latitudes else KM_PER_DEGREE_LON
+
+        self.couriers = []
+        self.cells = {}
+        for courier in couriers:
+            remaining = courier["capacity"] - courier.get("load", 0)
+            if remaining <= 0:
+                continue
+            x, y = self.project(courier["latitude"], courier["longitude"])
+            cell = self.cell_of(x, y)
+            entry = [courier["id"], x, y, remaining, cell]
+            self.couriers.append(entry)
+            self.cells.setdefault(cell, []).append(entry)
+
+        if self.cells:
+            self.min_cx = min(cx for cx, _ in self.cells)
+            self.max_cx = max(cx for cx, _ in self.cells)
+            self.min_cy = min(cy for _, cy in self.cells)
+            self.max_cy = max(cy for _, cy in self.cells)
+
+    def project(self, latitude, longitude):
+        return longitude * self.lon_scale, latitude * KM_PER_DEGREE_LAT
+
+    def cell_of(self, x, y):
+        return int(math.floor(x / self.cell_km)), int(math.floor(y / self.cell_km))
+
+    def _ring(self, cx, cy, radius):
+        if radius == 0:
+            yield cx, cy
+            return
+        for dx in range(-radius, radius + 1):
+            yield cx + dx, cy - radius
+            yield cx + dx, cy + radius
+        for dy in range(-radius + 1, radius):
+            yield cx - radius, cy + dy
+            yield cx + radius, cy + dy
+
+    # Closest courier with spare capacity, searching outward ring by ring
+    def nearest(self, x, y, max_distance_km=None):
+        if not self.cells:
+            return None, None
+        cx, cy = self.cell_of(x, y)
+        max_radius = max(abs(cx - self.min_cx), abs(cx - self.max_cx), abs(cy - self.min_cy), abs(cy - self.max_cy))
+
+        best = None
+        best_distance = math.inf
+        cells = self.cells
+        for radius in range(max_radius + 1):
+            for cell in self._ring(cx, cy, radius):
+                for entry in cells.get(cell, ()):
+                    distance = math.hypot(entry[1] - x, entry[2] - y)
+                    if distance < best_distance:
+                        best, best_distance = entry, distance
+            # Every cell in the next ring is at least radius * cell_km away
+            if best_distance <= radius * self.cell_km:
+                break
+            if max_distance_km is not None and radius * self.cell_km > max_distance_km:
+                break
+
+        if best is None or (max_distance_km is not None and best_distance > max_distance_km):
+            return None, None
+        return best, best_distance
+
+    def take(self, entry):
+        entry[3] -= 1
+        if entry[3] == 0:
+            bucket = self.cells[entry[4]]
+            bucket.remove(entry)
+            if not bucket:
+                del self.cells[entry[4]]
+
+
+def assign_orders(orders, couriers, max_distance_km=None, cell_km=2.0):
+    """Greedily match orders (in priority order) to the nearest courier with spare capacity.
+
+    orders:   dicts with id, latitude, longitude
+    couriers: dicts with id, latitude, longitude, capacity and current load
+    Returns (assignments, unassigned_order_ids); assignments are (order_id, courier_id, distance_km).
+    """
+    grid = CourierGrid(couriers, cell_km)
+    assignments = []
+    unassigned = []
+
+    for order in orders:
+        x, y = grid.project(order["latitude"], order["longitude"])
+        entry, distance = grid.nearest(x, y, max_distance_km)
+        if entry is None:
+            unassigned.append(order["id"])
+            continue
+        grid.take(entry)
+        assignments.append((order["id"], entry[0], round(distance, 3)))
+
+    return assignments, unassigned
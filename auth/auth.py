@@ -1,21 +1,98 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+import os
+import time
+import asyncio
+import hashlib
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from fastapi import APIRouter, Depends, HTTPException, Request, status
+from fastapi.concurrency import run_in_threadpool
 from fastapi.security import OAuth2PasswordBearer, OAuth2PasswordRequestForm
 from datetime import datetime, timezone, timedelta
 from jose import JWTError, jwt
 import bcrypt
 from database import get_connection
+from cache import TTLCache
+from metrics import external_call
 from config import SECRET_KEY, ALGORITHM, ACCESS_TOKEN_EXPIRE_MINUTES
 
 router = APIRouter()
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="auth/login")
 
+# Verified token payloads, keyed by SHA-256 of the token; entries never outlive the token's exp
+token_cache = TTLCache(
+    maxsize=int(os.getenv("TOKEN_CACHE_SIZE", "10000")),
+    ttl=float(os.getenv("TOKEN_CACHE_TTL", "300"))
+)
+
+# bcrypt releases the GIL, so a small dedicated thread pool keeps hashing off the event loop
+# without tying up the threadpool FastAPI uses for sync handlers
+bcrypt_executor = ThreadPoolExecutor(max_workers=int(os.getenv("BCRYPT_WORKERS", "4")), thread_name_prefix="bcrypt")
+
+LOGIN_RATE_LIMIT = int(os.getenv("LOGIN_RATE_LIMIT", "5"))
+# Many users can share one address behind a proxy or NAT, so the per-IP limit is much higher
+LOGIN_IP_RATE_LIMIT = int(os.getenv("LOGIN_IP_RATE_LIMIT", "100"))
+LOGIN_RATE_WINDOW = float(os.getenv("LOGIN_RATE_WINDOW", "60"))
+
+
+# Sliding-window limiter for failed login attempts
+class RateLimiter:
+    def __init__(self, limit, window, max_keys=100000):
+        self.limit = limit
+        self.window = window
+        self.max_keys = max_keys
+        self._attempts = {}
+        self._lock = threading.Lock()
+
+    def retry_after(self, key):
+        """Seconds to wait if the key is over the limit, else 0."""
+        now = time.monotonic()
+        with self._lock:
+            attempts = self._attempts.get(key)
+            if not attempts:
+                return 0
+            while attempts and now - attempts[0] >= self.window:
+                attempts.popleft()
+            if len(attempts) >= self.limit:
+                return self.window - (now - attempts[0])
+            return 0
+
+    def hit(self, key):
+        """Record an attempt."""
+        now = time.monotonic()
+        with self._lock:
+            attempts = self._attempts.get(key)
+            if attempts is None:
+                if len(self._attempts) >= self.max_keys:
+                    self._prune(now)
+                attempts = self._attempts[key] = deque()
+            attempts.append(now)
+
+    def reset(self, key):
+        with self._lock:
+            self._attempts.pop(key, None)
+
+    def _prune(self, now):
+        for key in [key for key, attempts in self._attempts.items() if not attempts or now - attempts[-1] >= self.window]:
+            del self._attempts[key]
+
+
+login_limiter = RateLimiter(LOGIN_RATE_LIMIT, LOGIN_RATE_WINDOW)
+login_ip_limiter = RateLimiter(LOGIN_IP_RATE_LIMIT, LOGIN_RATE_WINDOW)
+
+
+async def run_bcrypt(func, *args):
+    return await asyncio.get_running_loop().run_in_executor(bcrypt_executor, func, *args)
+
 # Function to hash passwords
 def hash_password(password: str) -> str:
-    return bcrypt.hashpw(password.encode("utf-8"), bcrypt.gensalt()).decode("utf-8")
+    with external_call("bcrypt", "hash"):
+        return bcrypt.hashpw(password.encode("utf-8"), bcrypt.gensalt()).decode("utf-8")
 
 # Function to verify passwords
 def verify_password(plain_password, hashed_password) -> bool:
-    return bcrypt.checkpw(plain_password.encode("utf-8"), hashed_password.encode("utf-8"))
+    with external_call("bcrypt", "verify"):
+        return bcrypt.checkpw(plain_password.encode("utf-8"), hashed_password.encode("utf-8"))
 
 # Function to create JWT token
 def create_access_token(data: dict, expires_delta: timedelta = None):
@@ -24,24 +101,16 @@ def create_access_token(data: dict, expires_delta: timedelta = None):
     to_encode.update({"exp": expire})
     return jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
 
-# User Registration Endpoint
-@router.post("/register")
-def register(username: str, email: str, password: str, role: str, phone_number: str):
-    if role not in ["admin", "vendor", "delivery", "customer"]:
-        raise HTTPException(status_code=400, detail="Invalid role")
-
+def _insert_user(username, email, hashed_password, role, phone_number):
     conn = get_connection()
     cursor = conn.cursor()
 
     try:
-        hashed_password = hash_password(password)
-
         cursor.execute(
             "INSERT INTO users (username, email, password_hash, role, phone_number) VALUES (%s, %s, %s, %s, %s)",
             (username, email, hashed_password, role, phone_number),
         )
         conn.commit()
-        return {"message": "User registered successfully"}
 
     except Exception as e:
         conn.rollback()
@@ -51,31 +120,67 @@ def register(username: str, email: str, password: str, role: str, phone_number:
         cursor.close()
         conn.close()
 
-
-# User Login & Token Generation
-@router.post("/login")
-def login(form_data: OAuth2PasswordRequestForm = Depends()):
+def _fetch_user(username):
     conn = get_connection()
     cursor = conn.cursor(dictionary=True)
 
     try:
-        cursor.execute("SELECT * FROM users WHERE username = %s", (form_data.username,))
-        user = cursor.fetchone()
-
-        if not user or not verify_password(form_data.password, user["password_hash"]):
-            raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid credentials")
-
-        access_token = create_access_token(
-            data={"sub": user["username"], "user_id": user["id"], "role": user["role"]}
-        )
-        return {"access_token": access_token, "token_type": "bearer"}
+        cursor.execute("SELECT * FROM users WHERE username = %s", (username,))
+        return cursor.fetchone()
 
     finally:
         cursor.close()
         conn.close()
 
+# User Registration Endpoint
+# Handlers take a pooled connection only for their query, not while hashing or rate limiting
+@router.post("/register")
+async def register(username: str, email: str, password: str, role: str, phone_number: str):
+    if role not in ["admin", "vendor", "delivery", "customer"]:
+        raise HTTPException(status_code=400, detail="Invalid role")
+
+    hashed_password = await run_bcrypt(hash_password, password)
+    await run_in_threadpool(_insert_user, username, email, hashed_password, role, phone_number)
+    return {"message": "User registered successfully"}
+
+
+# User Login & Token Generation
+@router.post("/login")
+async def login(request: Request, form_data: OAuth2PasswordRequestForm = Depends()):
+    client = request.client.host if request.client else "unknown"
+    # Only failed attempts count. Usernames are limited per client, so nobody can lock
+    # someone else out of their account
+    buckets = ((login_limiter, f"{client}:{form_data.username}"), (login_ip_limiter, client))
+    for limiter, key in buckets:
+        retry_after = limiter.retry_after(key)
+        if retry_after:
+            raise HTTPException(
+                status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+                detail="Too many login attempts, try again later",
+                headers={"Retry-After": str(int(retry_after) + 1)},
+            )
+
+    user = await run_in_threadpool(_fetch_user, form_data.username)
+
+    if not user or not await run_bcrypt(verify_password, form_data.password, user["password_hash"]):
+        for limiter, key in buckets:
+            limiter.hit(key)
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid credentials")
+
+    login_limiter.reset(buckets[0][1])
+
+    access_token = create_access_token(
+        data={"sub": user["username"], "user_id": user["id"], "role": user["role"]}
+    )
+    return {"access_token": access_token, "token_type": "bearer"}
+
 # Get Current User (Decode JWT)
 def get_current_user(token: str = Depends(oauth2_scheme)):
+    key = hashlib.sha256(token.encode("utf-8")).digest()
+    payload = token_cache.get(key)
+    if payload is not None and payload["exp"] > time.time():
+        return dict(payload)
+
     try:
         payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
         
@@ -83,7 +188,8 @@ def get_current_user(token: str = Depends(oauth2_scheme)):
         if datetime.now(timezone.utc) > datetime.fromtimestamp(exp, tz=timezone.utc):
             raise HTTPException(status_code=401, detail="Token has expired")
 
-        return payload 
+        token_cache.set(key, payload, ttl=min(exp - time.time(), token_cache.ttl))
+        return dict(payload)
 
     except JWTError:
         raise HTTPException(status_code=401, detail="Invalid token")
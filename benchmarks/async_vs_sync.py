@@ -0,0 +1,80 @@
+"""Throughput of a blocking handler vs. one that offloads to the threadpool.
+
+Drives N concurrent requests through two FastAPI endpoints that run the same
+query against the SQLite stand-in (with a simulated round-trip delay):
+
+  /blocking   async def that calls cursor.execute directly on the event loop
+  /offloaded  async def that awaits run_in_threadpool, as place_order does
+
+Usage: python benchmarks/async_vs_sync.py [--requests 200] [--concurrency 50] [--latency 0.005]
+"""
+import argparse
+import asyncio
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(__file__))
+
+import httpx
+from fastapi import FastAPI
+from fastapi.concurrency import run_in_threadpool
+
+import sqlite_standin
+
+
+def lookup_price(db, product_id):
+    cursor = db.cursor()
+    try:
+        cursor.execute("SELECT price FROM products WHERE id = %s", (product_id,))
+        return cursor.fetchone()[0]
+    finally:
+        cursor.close()
+
+
+def build_app(db):
+    app = FastAPI()
+
+    @app.get("/blocking/{product_id}")
+    async def blocking(product_id: int):
+        return {"price": lookup_price(db, product_id)}
+
+    @app.get("/offloaded/{product_id}")
+    async def offloaded(product_id: int):
+        return {"price": await run_in_threadpool(lookup_price, db, product_id)}
+
+    return app
+
+
+async def drive(app, path, requests, concurrency):
+    semaphore = asyncio.Semaphore(concurrency)
+    transport = httpx.ASGITransport(app=app)
+
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        async def one(i):
+            async with semaphore:
+                response = await client.get(f"{path}/{i % 1000 + 1}")
+                response.raise_for_status()
+
+        started = time.perf_counter()
+        await asyncio.gather(*(one(i) for i in range(requests)))
+        return time.perf_counter() - started
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--latency", type=float, default=0.005, help="simulated seconds per query")
+    args = parser.parse_args()
+
+    db = sqlite_standin.connect(latency=args.latency)
+    app = build_app(db)
+
+    for path in ("/blocking", "/offloaded"):
+        elapsed = asyncio.run(drive(app, path, args.requests, args.concurrency))
+        print(f"{path:<12} {args.requests} requests in {elapsed:.3f}s  ->  {args.requests / elapsed:8.1f} req/s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,103 @@
+"""Moving 10k orders (and their deliveries) to a new status: per-request updates vs. one bulk transition.
+
+Every order starts Shipped with an Assigned delivery and is moved to Out for
+Delivery. Three ways, each against a fresh SQLite stand-in database with a
+simulated round-trip delay per statement:
+
+  per request  what dispatch tooling had to do before: /orders/update_status
+               and /deliveries/update_delivery_status for every order, each an
+               existence SELECT, an UPDATE and a commit
+  per order    transitions.apply_transitions for one order per transaction,
+               which is what /orders/update_status does now
+  bulk         transitions.apply_transitions for all orders in one transaction,
+               which is what /orders/bulk_status does
+
+Usage: python benchmarks/bulk_transitions.py [--orders 10000] [--latency 0.0005]
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import sqlite_standin
+from transitions import apply_transitions
+
+COURIER_ID = 2
+TARGET = "Out for Delivery"
+
+
+def build(count, latency):
+    conn = sqlite_standin.connect(latency=latency, products=10)
+    conn._db.executemany(
+        "INSERT INTO orders (id, customer_id, status, total_amount) VALUES (?, 1, 'Shipped', 10)",
+        [(order_id,) for order_id in range(1, count + 1)]
+    )
+    conn._db.executemany(
+        "INSERT INTO deliveries (order_id, delivery_personnel_id, status) VALUES (?, ?, 'Assigned')",
+        [(order_id, COURIER_ID) for order_id in range(1, count + 1)]
+    )
+    conn._db.commit()
+    return conn
+
+
+# The statements of the old update_order_status and update_delivery_status handlers
+def per_request(conn, order_ids):
+    cursor = conn.cursor()
+    for order_id in order_ids:
+        cursor.execute("SELECT status FROM orders WHERE id = %s FOR UPDATE", (order_id,))
+        cursor.fetchone()
+        cursor.execute("UPDATE orders SET status = %s WHERE id = %s", (TARGET, order_id))
+        conn.commit()
+
+        cursor.execute("SELECT delivery_personnel_id FROM deliveries WHERE order_id = %s", (order_id,))
+        cursor.fetchone()
+        cursor.execute("UPDATE deliveries SET status = %s WHERE order_id = %s", (TARGET, order_id))
+        conn.commit()
+    cursor.close()
+
+
+def per_order(conn, order_ids):
+    cursor = conn.cursor()
+    for order_id in order_ids:
+        apply_transitions(cursor, "order", [(order_id, TARGET)])
+        conn.commit()
+    cursor.close()
+
+
+def bulk(conn, order_ids):
+    cursor = conn.cursor()
+    outcomes, _ = apply_transitions(cursor, "order", [(order_id, TARGET) for order_id in order_ids])
+    conn.commit()
+    cursor.close()
+    assert all(outcome["result"] == "updated" for outcome in outcomes)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--orders", type=int, default=10000)
+    parser.add_argument("--latency", type=float, default=0.0005, help="simulated seconds per statement")
+    args = parser.parse_args()
+
+    order_ids = list(range(1, args.orders + 1))
+    print(f"{args.orders} orders Shipped -> {TARGET}, {args.latency * 1000:g} ms per statement")
+    print(f"{'approach':<12} {'seconds':>9} {'statements':>11} {'commits':>8} {'in sync':>8}")
+    baseline = None
+    for name, fn, commits in (("per request", per_request, 2 * args.orders), ("per order", per_order, args.orders), ("bulk", bulk, 1)):
+        conn = build(args.orders, args.latency)
+        conn.round_trips = 0
+        started = time.perf_counter()
+        fn(conn, order_ids)
+        elapsed = time.perf_counter() - started
+        baseline = baseline or elapsed
+        in_sync = conn._db.execute(
+            "SELECT COUNT(*) FROM orders o JOIN deliveries d ON d.order_id = o.id WHERE o.status = ? AND d.status = ?",
+            (TARGET, TARGET)
+        ).fetchone()[0]
+        print(f"{name:<12} {elapsed:>9.2f} {conn.round_trips:>11} {commits:>8} {in_sync:>8}   {baseline / elapsed:.0f}x")
+
+
+if __name__ == "__main__":
+    main()
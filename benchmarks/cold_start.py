@@ -0,0 +1,143 @@
+"""Worker cold start: time from process spawn to the first served request.
+
+Spawns --workers fresh Python processes per mode. Each one imports main, runs
+the app's lifespan startup and serves GET /products/list through the ASGI
+interface, against a SQLite stand-in database whose connections take
+--connect-latency seconds to open, like a TCP/TLS handshake to MySQL. Two modes:
+
+  before   the Stripe and Twilio clients are built during import, as
+           routers/payments.py and routers/notifications.py used to do, and the
+           pool is not warmed up, so the first request opens its connection
+  after    clients are created on first use and the lifespan handler opens
+           DB_POOL_WARM connections before the worker accepts traffic
+
+Reported per mode (median): import of main, lifespan startup, the first
+request, and the spawn-to-first-response total including interpreter start.
+
+Usage: python benchmarks/cold_start.py [--workers 5] [--connect-latency 0.02]
+"""
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.dirname(BENCH_DIR)
+
+
+# What importing routers.notifications and routers.payments used to do
+def create_clients_eagerly():
+    import config
+    import stripe
+    from twilio.rest import Client
+
+    Client(config.TWILIO_SID, config.TWILIO_AUTH_TOKEN)
+    stripe.StripeClient(config.STRIPE_SECRET_KEY, http_client=stripe.HTTPXClient())
+
+
+async def get(app, path, query):
+    scope = {
+        "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1", "method": "GET", "scheme": "http",
+        "path": path, "raw_path": path.encode(), "query_string": query.encode(), "root_path": "",
+        "headers": [(b"host", b"bench")], "client": ("127.0.0.1", 1), "server": ("bench", 80),
+    }
+    messages = []
+
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        messages.append(message)
+
+    await app(scope, receive, send)
+    return messages[0]["status"]
+
+
+def worker(args):
+    sys.path.insert(0, ROOT)
+    sys.path.insert(0, BENCH_DIR)
+    started = time.perf_counter()
+    if args.mode == "before":
+        create_clients_eagerly()
+
+    import sqlite_standin
+    import database
+
+    def connect():
+        time.sleep(args.connect_latency)
+        return sqlite_standin.Connection(args.database)
+
+    database.pool._connect = connect
+    import main
+    imported = time.perf_counter()
+
+    async def serve():
+        async with main.app.router.lifespan_context(main.app):
+            ready = time.perf_counter()
+            status = await get(main.app, "/products/list", "limit=20")
+            answered = time.perf_counter()
+            print(json.dumps({
+                "status": status,
+                "import_ms": (imported - started) * 1000,
+                "startup_ms": (ready - imported) * 1000,
+                "first_request_ms": (answered - ready) * 1000,
+            }), flush=True)
+
+    asyncio.run(serve())
+
+
+def spawn(args, mode):
+    env = {**os.environ, "NOTIFICATION_WORKER": "0", "MIGRATE_ON_STARTUP": "0"}
+    if mode == "before":
+        env["DB_POOL_WARM"] = "0"
+    command = [sys.executable, os.path.abspath(__file__), "--worker", "--mode", mode, "--database", args.database,
+               "--connect-latency", str(args.connect_latency)]
+    started = time.perf_counter()
+    process = subprocess.Popen(command, env=env, stdout=subprocess.PIPE, text=True)
+    line = process.stdout.readline()
+    total_ms = (time.perf_counter() - started) * 1000
+    process.wait()
+    if not line:
+        raise SystemExit(f"{mode} worker failed (exit code {process.returncode})")
+    result = json.loads(line)
+    if result["status"] != 200:
+        raise SystemExit(f"{mode} worker's first request returned {result['status']}")
+    return {**result, "total_ms": total_ms}
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--workers", type=int, default=5, help="processes started per mode")
+    parser.add_argument("--connect-latency", type=float, default=0.02, help="simulated seconds to open a DB connection")
+    parser.add_argument("--worker", action="store_true", help=argparse.SUPPRESS)
+    parser.add_argument("--mode", default="after", help=argparse.SUPPRESS)
+    parser.add_argument("--database", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        worker(args)
+        return
+
+    sys.path.insert(0, BENCH_DIR)
+    import sqlite_standin
+
+    with tempfile.TemporaryDirectory() as directory:
+        args.database = os.path.join(directory, "cold_start.db")
+        sqlite_standin.connect(args.database, products=1000)
+
+        columns = ["import_ms", "startup_ms", "first_request_ms", "total_ms"]
+        print(f"{args.workers} workers per mode, median ms, {args.connect_latency * 1000:g} ms per DB connect")
+        print(f"{'mode':<8} {'import':>8} {'startup':>8} {'1st req':>8} {'spawn -> 1st response':>22}")
+        for mode in ("before", "after"):
+            runs = [spawn(args, mode) for _ in range(args.workers)]
+            import_ms, startup_ms, first_ms, total_ms = (statistics.median(run[column] for run in runs) for column in columns)
+            print(f"{mode:<8} {import_ms:>8.1f} {startup_ms:>8.1f} {first_ms:>8.1f} {total_ms:>22.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,58 @@
+"""Solve time of the batch delivery assignment engine.
+
+Matches a synthetic backlog of orders to couriers spread over a city-sized
+area (about 40 x 40 km) with assignment.assign_orders.
+
+Usage: python benchmarks/delivery_assignment.py [--orders 10000] [--couriers 1000] [--capacity 12]
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from assignment import assign_orders
+
+CENTER = (24.8607, 67.0011)
+SPAN_DEGREES = 0.36
+
+
+def random_point(rng):
+    return CENTER[0] + rng.uniform(-SPAN_DEGREES / 2, SPAN_DEGREES / 2), CENTER[1] + rng.uniform(-SPAN_DEGREES / 2, SPAN_DEGREES / 2)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--orders", type=int, default=10000)
+    parser.add_argument("--couriers", type=int, default=1000)
+    parser.add_argument("--capacity", type=int, default=12)
+    parser.add_argument("--max-distance-km", type=float, default=None)
+    args = parser.parse_args()
+
+    rng = random.Random(3)
+    orders = []
+    for order_id in range(1, args.orders + 1):
+        latitude, longitude = random_point(rng)
+        orders.append({"id": order_id, "latitude": latitude, "longitude": longitude})
+    couriers = []
+    for courier_id in range(1, args.couriers + 1):
+        latitude, longitude = random_point(rng)
+        couriers.append({"id": courier_id, "latitude": latitude, "longitude": longitude,
+                         "capacity": args.capacity, "load": rng.randint(0, args.capacity // 2)})
+
+    started = time.perf_counter()
+    assignments, unassigned = assign_orders(orders, couriers, args.max_distance_km)
+    elapsed = time.perf_counter() - started
+
+    distances = sorted(distance for _, _, distance in assignments)
+    mean = sum(distances) / len(distances) if distances else 0
+    p95 = distances[int(len(distances) * 0.95)] if distances else 0
+    print(f"{args.orders} orders x {args.couriers} couriers solved in {elapsed * 1000:.0f} ms: "
+          f"{len(assignments)} assigned, {len(unassigned)} unassigned, "
+          f"mean {mean:.2f} km, p95 {p95:.2f} km")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,506 @@
+"""Mixed-workload load test of main.app against a seeded benchmark database.
+
+Boots main.app (under uvicorn on a local port, or in-process through httpx's
+ASGI transport with --transport asgi) against the database built by
+benchmarks/seed.py. Stripe is served by benchmarks/mock_stripe.py, and Twilio
+and SMTP are replaced with in-process stubs. No external service is called,
+and the notification worker drains the outbox normally.
+
+Each of --concurrency virtual users repeatedly picks a scenario by weight:
+
+  browse        catalog pages, by id cursor and by category filter
+  search        full-text search and autocomplete
+  place_order   place an order, open a Stripe checkout session, deliver the signed
+                payment webhook and poll verify-payment
+  track         order details, order history, delivery details and the SSE snapshot
+  update_status advance an order's status as admin, and a delivery's as its courier
+
+Latency is recorded per endpoint (method + route template). The report gives
+requests, errors, throughput and p50/p95/p99 per endpoint. Pass --output to
+write it as JSON and --compare to diff it against an earlier report. The
+script exits with status 1 if any endpoint's p95 or throughput is worse than
+the baseline by more than --threshold.
+
+Usage: python benchmarks/loadtest.py [--database online_delivery_bench] [--duration 60] [--warmup 5]
+                                     [--concurrency 32] [--mix browse=40,search=20,...] [--seed 1]
+                                     [--transport http|asgi] [--port 8765] [--stub-latency 0]
+                                     [--output run.json] [--compare baseline.json] [--threshold 10]
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from types import SimpleNamespace
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import httpx
+
+from mock_stripe import MockStripe, sign, webhook_event
+
+DEFAULT_MIX = {"browse": 40, "search": 20, "place_order": 10, "track": 20, "update_status": 10}
+SEARCH_TERMS = ["wireless", "chair", "laptop", "organic", "smart lamp", "portable speaker", "premium", "kettle", "vintage watch", "desk"]
+NEXT_ORDER_STATUS = {"Placed": "Processing", "Processing": "Shipped", "Shipped": "Out for Delivery", "Out for Delivery": "Delivered"}
+NEXT_DELIVERY_STATUS = {"Assigned": "Out for Delivery", "Out for Delivery": "Delivered"}
+SAMPLE_SIZE = 2000
+WEBHOOK_SECRET = "whsec_loadtest"
+
+
+def configure_environment(database, stripe_base_url):
+    """Point the app at the benchmark database and the mock Stripe; must run before main is imported."""
+    os.environ["DB_NAME"] = database
+    os.environ["STRIPE_API_BASE"] = stripe_base_url
+    import config
+    config.STRIPE_WEBHOOK_SECRET = WEBHOOK_SECRET
+    os.environ.setdefault("MIGRATE_ON_STARTUP", "0")
+    os.environ.setdefault("LOGIN_RATE_LIMIT", "1000000")
+    os.environ.setdefault("LOGIN_IP_RATE_LIMIT", "1000000")
+
+
+def install_stubs(latency):
+    """Replace Twilio and SMTP with in-process fakes that sleep for `latency` seconds."""
+    import smtplib
+    import routers.notifications as notifications
+
+    def create_message(**kwargs):
+        time.sleep(latency)
+        return SimpleNamespace(sid=f"SM{random.getrandbits(64):016x}")
+
+    notifications.twilio_client.set(SimpleNamespace(messages=SimpleNamespace(create=create_message)))
+
+    class StubSMTP:
+        def __init__(self, *args, **kwargs):
+            time.sleep(latency)
+
+        def starttls(self, *args, **kwargs):
+            pass
+
+        def login(self, *args, **kwargs):
+            pass
+
+        def send_message(self, *args, **kwargs):
+            time.sleep(latency)
+
+        def quit(self):
+            pass
+
+        def close(self):
+            pass
+
+    smtplib.SMTP = StubSMTP
+
+
+def load_fixtures(seed_value):
+    """Sample users, products and open orders from the seeded database and mint their tokens."""
+    from database import get_connection
+    from auth.auth import create_access_token
+
+    rng = random.Random(seed_value)
+    conn = get_connection()
+    cursor = conn.cursor(dictionary=True)
+
+    try:
+        users = {}
+        for role in ("admin", "customer", "delivery"):
+            cursor.execute("SELECT id, username FROM users WHERE role = %s ORDER BY id LIMIT %s", (role, SAMPLE_SIZE))
+            users[role] = cursor.fetchall()
+            if not users[role]:
+                raise SystemExit(f"No {role} users found; run benchmarks/seed.py first")
+
+        cursor.execute("SELECT id FROM products WHERE availability = TRUE ORDER BY id LIMIT %s", (SAMPLE_SIZE * 10,))
+        product_ids = [row["id"] for row in cursor.fetchall()]
+        cursor.execute("SELECT DISTINCT category FROM products WHERE category IS NOT NULL")
+        categories = [row["category"] for row in cursor.fetchall()]
+
+        cursor.execute(
+            "SELECT o.id, o.customer_id, o.status, d.delivery_personnel_id, d.status AS delivery_status "
+            "FROM orders o LEFT JOIN deliveries d ON d.order_id = o.id ORDER BY o.id DESC LIMIT %s",
+            (SAMPLE_SIZE * 5,)
+        )
+        orders = cursor.fetchall()
+
+    finally:
+        cursor.close()
+        conn.close()
+
+    expires = timedelta(days=1)
+
+    def principal(row, role):
+        token = create_access_token({"sub": row["username"], "user_id": row["id"], "role": role}, expires)
+        return {"id": row["id"], "headers": {"Authorization": f"Bearer {token}"}}
+
+    principals = {role: [principal(row, role) for row in rows] for role, rows in users.items()}
+    customers = {p["id"]: p for p in principals["customer"]}
+    couriers = {p["id"]: p for p in principals["delivery"]}
+    rng.shuffle(orders)
+
+    return SimpleNamespace(
+        admins=principals["admin"],
+        customers=customers,
+        customer_ids=list(customers),
+        couriers=couriers,
+        product_ids=product_ids,
+        categories=categories,
+        # Orders a sampled customer can view
+        customer_orders=[o for o in orders if o["customer_id"] in customers],
+        # Orders whose status can still move forward, and deliveries a sampled courier owns
+        open_orders=[o for o in orders if o["status"] in NEXT_ORDER_STATUS],
+        open_deliveries=[o for o in orders if o["delivery_status"] in NEXT_DELIVERY_STATUS and o["delivery_personnel_id"] in couriers],
+    )
+
+
+class Recorder:
+    def __init__(self):
+        self.samples = {}
+        self.errors = {}
+        self.recording = False
+
+    def record(self, endpoint, elapsed, ok):
+        if not self.recording:
+            return
+        self.samples.setdefault(endpoint, []).append(elapsed)
+        if not ok:
+            self.errors[endpoint] = self.errors.get(endpoint, 0) + 1
+
+
+class VirtualUser:
+    def __init__(self, client, fixtures, recorder, rng, streaming=True):
+        self.client = client
+        self.fx = fixtures
+        self.recorder = recorder
+        self.rng = rng
+        # httpx's ASGI transport buffers whole responses, so SSE is only exercised over HTTP
+        self.streaming = streaming
+
+    async def request(self, method, template, headers=None, params=None, json_body=None, content=None, **path):
+        started = time.perf_counter()
+        try:
+            response = await self.client.request(method, template.format(**path), headers=headers, params=params,
+                                                 json=json_body, content=content)
+            ok = response.status_code < 400
+        except httpx.HTTPError:
+            response, ok = None, False
+        self.recorder.record(f"{method} {template}", time.perf_counter() - started, ok)
+        return response
+
+    async def browse(self):
+        fx = self.fx
+        after_id = self.rng.choice(fx.product_ids)
+        await self.request("GET", "/products/list", params={"after_id": after_id, "limit": 50})
+        await self.request("GET", "/products/products", params={
+            "category": self.rng.choice(fx.categories), "min_price": 10, "max_price": 500, "limit": 50,
+        })
+
+    async def search(self):
+        term = self.rng.choice(SEARCH_TERMS)
+        await self.request("GET", "/search/products", params={"q": term, "limit": 20})
+        await self.request("GET", "/search/autocomplete", params={"prefix": term[:3]})
+
+    async def place_order(self):
+        fx = self.fx
+        customer = fx.customers[self.rng.choice(fx.customer_ids)]
+        products = [
+            {"product_id": product_id, "quantity": self.rng.randint(1, 3)}
+            for product_id in self.rng.sample(fx.product_ids, self.rng.randint(1, 5))
+        ]
+        response = await self.request("POST", "/orders/place_order", headers=customer["headers"], json_body={
+            "customer_id": customer["id"], "products": products,
+            "delivery_latitude": 40.7 + self.rng.uniform(-0.1, 0.1), "delivery_longitude": -74.0 + self.rng.uniform(-0.1, 0.1),
+        })
+        if response is None or response.status_code != 200:
+            return
+        order_id = response.json()["order_id"]
+        fx.open_orders.append({"id": order_id, "customer_id": customer["id"], "status": "Placed"})
+
+        response = await self.request("POST", "/payments/create-checkout-session", params={"order_id": order_id})
+        if response is None or response.status_code != 200:
+            return
+        session_id = response.json()["session_id"]
+        await self.request("GET", "/payments/verify-payment/{session_id}", session_id=session_id)
+
+        session = {"id": session_id, "object": "checkout.session", "payment_status": "paid", "metadata": {"order_id": str(order_id)}}
+        payload = json.dumps(webhook_event("checkout.session.completed", session)).encode("utf-8")
+        await self.request("POST", "/payments/webhook", content=payload,
+                           headers={"Stripe-Signature": sign(payload, WEBHOOK_SECRET), "Content-Type": "application/json"})
+        await self.request("GET", "/payments/verify-payment/{session_id}", session_id=session_id)
+
+    async def track(self):
+        fx = self.fx
+        if not fx.customer_orders:
+            return
+        order = self.rng.choice(fx.customer_orders)
+        customer = fx.customers[order["customer_id"]]
+        await self.request("GET", "/orders/order/{order_id}", headers=customer["headers"], order_id=order["id"])
+        await self.request("GET", "/orders/list", headers=customer["headers"], params={"limit": 20})
+        if order["delivery_personnel_id"] in fx.couriers:
+            courier = fx.couriers[order["delivery_personnel_id"]]
+            await self.request("GET", "/deliveries/delivery/{order_id}", headers=courier["headers"], order_id=order["id"])
+        if self.streaming:
+            await self.snapshot(customer, order["id"])
+
+    # Time to the first SSE event (the snapshot); the stream is closed right after
+    async def snapshot(self, customer, order_id):
+        template = "/tracking/orders/{order_id}/events"
+        started = time.perf_counter()
+        ok = False
+        try:
+            async with self.client.stream("GET", template.format(order_id=order_id), headers=customer["headers"]) as response:
+                if response.status_code == 200:
+                    async for line in response.aiter_lines():
+                        if line.startswith("data:"):
+                            ok = True
+                            break
+        except httpx.HTTPError:
+            pass
+        self.recorder.record(f"GET {template}", time.perf_counter() - started, ok)
+
+    # An order and its delivery move together (transitions.py), so each side's local copy is
+    # advanced with the other, and entries that were finished from the other side are dropped
+    async def update_status(self):
+        fx = self.fx
+        if fx.open_orders:
+            order = fx.open_orders.pop(self.rng.randrange(len(fx.open_orders)))
+            if order["status"] in NEXT_ORDER_STATUS:
+                order["status"] = NEXT_ORDER_STATUS[order["status"]]
+                if order.get("delivery_status") and order["status"] in ("Out for Delivery", "Delivered"):
+                    order["delivery_status"] = order["status"]
+                await self.request("PUT", "/orders/update_status", headers=self.rng.choice(fx.admins)["headers"],
+                                   json_body={"order_id": order["id"], "status": order["status"]})
+                if order["status"] in NEXT_ORDER_STATUS:
+                    fx.open_orders.append(order)
+        if fx.open_deliveries:
+            delivery = fx.open_deliveries.pop(self.rng.randrange(len(fx.open_deliveries)))
+            if delivery["status"] == "Placed":
+                # Couriers cannot leave with an order that is not being processed yet
+                fx.open_deliveries.append(delivery)
+            elif delivery["delivery_status"] in NEXT_DELIVERY_STATUS:
+                delivery["delivery_status"] = delivery["status"] = NEXT_DELIVERY_STATUS[delivery["delivery_status"]]
+                courier = fx.couriers[delivery["delivery_personnel_id"]]
+                await self.request("PUT", "/deliveries/update_delivery_status", headers=courier["headers"],
+                                   json_body={"order_id": delivery["id"], "status": delivery["delivery_status"]})
+                if delivery["delivery_status"] in NEXT_DELIVERY_STATUS:
+                    fx.open_deliveries.append(delivery)
+
+    async def run(self, mix, deadline):
+        scenarios = [getattr(self, name) for name in mix]
+        weights = list(mix.values())
+        while time.monotonic() < deadline:
+            await self.rng.choices(scenarios, weights)[0]()
+
+
+def percentile(sorted_values, fraction):
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, max(0, round(fraction * len(sorted_values) + 0.5) - 1))
+    return sorted_values[index]
+
+
+def summarize(recorder, elapsed):
+    def stats(values, errors):
+        values = sorted(values)
+        return {
+            "requests": len(values),
+            "errors": errors,
+            "throughput_rps": round(len(values) / elapsed, 2),
+            "mean_ms": round(sum(values) / len(values) * 1000, 3) if values else 0.0,
+            "p50_ms": round(percentile(values, 0.50) * 1000, 3),
+            "p95_ms": round(percentile(values, 0.95) * 1000, 3),
+            "p99_ms": round(percentile(values, 0.99) * 1000, 3),
+            "max_ms": round(values[-1] * 1000, 3) if values else 0.0,
+        }
+
+    endpoints = {
+        endpoint: stats(values, recorder.errors.get(endpoint, 0))
+        for endpoint, values in sorted(recorder.samples.items())
+    }
+    everything = [value for values in recorder.samples.values() for value in values]
+    return endpoints, stats(everything, sum(recorder.errors.values()))
+
+
+def _git_commit():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, text=True,
+                                       stderr=subprocess.DEVNULL).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+class Server:
+    """Runs main.app under uvicorn in a background thread."""
+
+    def __init__(self, app, port):
+        import uvicorn
+
+        self.server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning", lifespan="on"))
+        self.thread = threading.Thread(target=self.server.run, name="uvicorn", daemon=True)
+
+    def __enter__(self):
+        self.thread.start()
+        while not self.server.started:
+            if not self.thread.is_alive():
+                raise SystemExit("uvicorn failed to start")
+            time.sleep(0.05)
+        return self
+
+    def __exit__(self, *exc):
+        self.server.should_exit = True
+        self.thread.join()
+
+
+class Lifespan:
+    """Drives the ASGI lifespan protocol for in-process runs, so startup/shutdown handlers run."""
+
+    def __init__(self, app):
+        self.app = app
+        self.inbox = asyncio.Queue()
+        self.outbox = asyncio.Queue()
+
+    async def _send(self, message):
+        await self.outbox.put(message)
+
+    async def __aenter__(self):
+        self.task = asyncio.create_task(self.app({"type": "lifespan", "asgi": {"version": "3.0"}}, self.inbox.get, self._send))
+        await self.inbox.put({"type": "lifespan.startup"})
+        message = await self.outbox.get()
+        if message["type"] != "lifespan.startup.complete":
+            raise SystemExit(f"App startup failed: {message.get('message')}")
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.inbox.put({"type": "lifespan.shutdown"})
+        await self.outbox.get()
+        await self.task
+
+
+async def drive(client, fixtures, mix, concurrency, warmup, duration, seed_value, streaming):
+    recorder = Recorder()
+    users = [VirtualUser(client, fixtures, recorder, random.Random(seed_value * 1000 + i), streaming) for i in range(concurrency)]
+
+    tasks = [asyncio.create_task(user.run(mix, time.monotonic() + warmup + duration)) for user in users]
+    await asyncio.sleep(warmup)
+    recorder.recording = True
+    started = time.monotonic()
+    await asyncio.gather(*tasks)
+    return recorder, time.monotonic() - started
+
+
+async def run_asgi(app, fixtures, args, mix):
+    transport = httpx.ASGITransport(app=app)
+    async with Lifespan(app):
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=30) as client:
+            return await drive(client, fixtures, mix, args.concurrency, args.warmup, args.duration, args.seed, False)
+
+
+async def run_http(fixtures, args, mix):
+    limits = httpx.Limits(max_connections=args.concurrency * 2, max_keepalive_connections=args.concurrency * 2)
+    async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{args.port}", timeout=30, limits=limits) as client:
+        return await drive(client, fixtures, mix, args.concurrency, args.warmup, args.duration, args.seed, True)
+
+
+def compare(report, baseline, threshold):
+    """Print per-endpoint deltas against a baseline report; returns the endpoints that regressed."""
+    regressions = []
+    print(f"\n{'endpoint':<48} {'p95 ms (before -> after)':>26} {'rps (before -> after)':>26}")
+    for endpoint, current in report["endpoints"].items():
+        before = baseline["endpoints"].get(endpoint)
+        if before is None:
+            print(f"{endpoint:<48} {'(new)':>20}")
+            continue
+        p95_change = (current["p95_ms"] - before["p95_ms"]) / before["p95_ms"] * 100 if before["p95_ms"] else 0.0
+        rps_change = (current["throughput_rps"] - before["throughput_rps"]) / before["throughput_rps"] * 100 if before["throughput_rps"] else 0.0
+        regressed = p95_change > threshold or rps_change < -threshold
+        if regressed:
+            regressions.append(endpoint)
+        print(f"{endpoint:<48} {before['p95_ms']:>8.1f} -> {current['p95_ms']:<8.1f}{p95_change:+5.0f}% "
+              f"{before['throughput_rps']:>8.1f} -> {current['throughput_rps']:<8.1f}{rps_change:+5.0f}%"
+              f"{'  REGRESSION' if regressed else ''}")
+    for endpoint in baseline["endpoints"].keys() - report["endpoints"].keys():
+        print(f"{endpoint:<48} {'(missing)':>20}")
+    return regressions
+
+
+def parse_mix(value):
+    mix = {}
+    for part in value.split(","):
+        name, _, weight = part.partition("=")
+        if name not in DEFAULT_MIX:
+            raise argparse.ArgumentTypeError(f"Unknown scenario {name!r}; choose from {', '.join(DEFAULT_MIX)}")
+        mix[name] = float(weight or 1)
+    return mix
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--database", default=os.getenv("BENCH_DB_NAME", "online_delivery_bench"))
+    parser.add_argument("--duration", type=float, default=60, help="Measured seconds")
+    parser.add_argument("--warmup", type=float, default=5, help="Unmeasured seconds before measuring")
+    parser.add_argument("--concurrency", type=int, default=32, help="Virtual users")
+    parser.add_argument("--mix", type=parse_mix, default=DEFAULT_MIX, help="Scenario weights, e.g. browse=40,search=20")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--transport", choices=["http", "asgi"], default="http")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--stub-latency", type=float, default=0.0, help="Seconds each stubbed external call takes")
+    parser.add_argument("--output", help="Write the JSON report to this file")
+    parser.add_argument("--compare", help="Baseline JSON report to compare against")
+    parser.add_argument("--threshold", type=float, default=10.0, help="Allowed regression in percent")
+    args = parser.parse_args()
+
+    stripe_server = MockStripe(latency=args.stub_latency).start()
+    configure_environment(args.database, stripe_server.base_url)
+    from main import app
+
+    install_stubs(args.stub_latency)
+    fixtures = load_fixtures(args.seed)
+
+    if args.transport == "asgi":
+        recorder, elapsed = asyncio.run(run_asgi(app, fixtures, args, args.mix))
+    else:
+        with Server(app, args.port):
+            recorder, elapsed = asyncio.run(run_http(fixtures, args, args.mix))
+
+    endpoints, total = summarize(recorder, elapsed)
+    report = {
+        "meta": {
+            "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "commit": _git_commit(),
+            "python": platform.python_version(),
+            "database": args.database,
+            "transport": args.transport,
+            "duration_s": round(elapsed, 2),
+            "concurrency": args.concurrency,
+            "mix": args.mix,
+            "seed": args.seed,
+            "stub_latency_s": args.stub_latency,
+        },
+        "total": total,
+        "endpoints": endpoints,
+    }
+
+    print(f"{'endpoint':<48} {'requests':>9} {'errors':>7} {'rps':>9} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9}")
+    for endpoint, row in [*endpoints.items(), ("TOTAL", total)]:
+        print(f"{endpoint:<48} {row['requests']:>9} {row['errors']:>7} {row['throughput_rps']:>9.1f} "
+              f"{row['p50_ms']:>9.1f} {row['p95_ms']:>9.1f} {row['p99_ms']:>9.1f}")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+
+    if args.compare:
+        with open(args.compare) as f:
+            regressions = compare(report, json.load(f), args.threshold)
+        if regressions:
+            print(f"\n{len(regressions)} endpoint(s) regressed by more than {args.threshold:g}%")
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
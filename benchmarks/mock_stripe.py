@@ -0,0 +1,141 @@
+"""Minimal local stand-in for the Stripe API, for load tests and manual testing.
+
+Implements the Checkout Session calls:
+
+  POST /v1/checkout/sessions        create a session (form-encoded, like Stripe)
+  GET  /v1/checkout/sessions/{id}   retrieve it
+
+Every call can take a fixed --latency. sign() builds a Stripe-Signature header
+for a webhook payload, so tests can post signed events to /payments/webhook.
+
+Run the app against it with STRIPE_API_BASE=http://127.0.0.1:12111.
+
+Usage: python benchmarks/mock_stripe.py [--port 12111] [--latency 0.05]
+"""
+import argparse
+import hashlib
+import hmac
+import itertools
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs
+
+SESSIONS_PATH = "/v1/checkout/sessions"
+
+
+def sign(payload, secret, timestamp=None):
+    """Stripe-Signature header value for a webhook payload (bytes)."""
+    timestamp = int(time.time()) if timestamp is None else timestamp
+    signed = f"{timestamp}.".encode("utf-8") + payload
+    digest = hmac.new(secret.encode("utf-8"), signed, hashlib.sha256).hexdigest()
+    return f"t={timestamp},v1={digest}"
+
+
+def webhook_event(event_type, session):
+    return {
+        "id": f"evt_mock_{session['id']}_{event_type}",
+        "object": "event",
+        "type": event_type,
+        "created": int(time.time()),
+        "data": {"object": session},
+    }
+
+
+class MockStripe(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, port=0, latency=0.0):
+        super().__init__(("127.0.0.1", port), Handler)
+        self.latency = latency
+        self.sessions = {}
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+
+    @property
+    def base_url(self):
+        return f"http://127.0.0.1:{self.server_address[1]}"
+
+    def create_session(self, form):
+        with self._lock:
+            session_id = f"cs_test_mock{next(self._ids):010d}"
+        amount = int(form.get("line_items[0][price_data][unit_amount]", "0")) * int(form.get("line_items[0][quantity]", "1"))
+        session = {
+            "id": session_id,
+            "object": "checkout.session",
+            "url": f"https://checkout.stripe.test/pay/{session_id}",
+            "mode": form.get("mode", "payment"),
+            "status": "open",
+            "payment_status": "unpaid",
+            "amount_total": amount,
+            "currency": form.get("line_items[0][price_data][currency]", "usd"),
+            "client_reference_id": form.get("client_reference_id"),
+            "metadata": {key[len("metadata["):-1]: value for key, value in form.items() if key.startswith("metadata[")},
+        }
+        self.sessions[session_id] = session
+        return session
+
+    def start(self):
+        threading.Thread(target=self.serve_forever, name="mock-stripe", daemon=True).start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+
+class Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    # Headers and body go out in separate writes; with Nagle on, each response waits for a delayed ACK
+    disable_nagle_algorithm = True
+
+    def log_message(self, *args):
+        pass
+
+    def _reply(self, status, body):
+        data = json.dumps(body).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.send_header("Request-Id", f"req_mock_{time.monotonic_ns()}")
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _not_found(self):
+        self._reply(404, {"error": {"type": "invalid_request_error", "message": f"No such route: {self.path}"}})
+
+    def do_POST(self):
+        time.sleep(self.server.latency)
+        body = self.rfile.read(int(self.headers.get("Content-Length") or 0)).decode("utf-8")
+        if self.path != SESSIONS_PATH:
+            return self._not_found()
+        form = {key: values[-1] for key, values in parse_qs(body).items()}
+        self._reply(200, self.server.create_session(form))
+
+    def do_GET(self):
+        time.sleep(self.server.latency)
+        if not self.path.startswith(SESSIONS_PATH + "/"):
+            return self._not_found()
+        session = self.server.sessions.get(self.path[len(SESSIONS_PATH) + 1:])
+        if session is None:
+            return self._reply(404, {"error": {"type": "invalid_request_error", "message": "No such checkout.session"}})
+        self._reply(200, session)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--port", type=int, default=12111)
+    parser.add_argument("--latency", type=float, default=0.0, help="Seconds each call takes")
+    args = parser.parse_args()
+
+    server = MockStripe(args.port, args.latency)
+    print(f"Mock Stripe listening on {server.base_url}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
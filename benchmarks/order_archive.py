@@ -0,0 +1,146 @@
+"""Archiving completed orders: archival throughput and per-order lookups before and after.
+
+Builds a SQLite stand-in database with --orders orders, each with three items, a
+delivery and a payment. --recent-share of them were placed in the last few days
+and are still open; the rest are older than 90 days and Delivered or Canceled.
+Then:
+
+  archive   archive.archive_orders moves the old orders, --chunk-size per
+            transaction, into the *_archive tables (what the background
+            archiver and `python archive.py` do)
+  lookups   routers.orders.get_order for a recent order and for an old one,
+            before archival (both live) and after (the old one is read from
+            the archive), with a simulated round trip per statement
+
+Live and archived totals are checked to add up to what was there before.
+
+Usage: python benchmarks/order_archive.py [--orders 100000] [--chunk-size 1000] [--latency 0.0005]
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import sqlite_standin
+import archive
+from routers.orders import get_order
+
+ADMIN = {"user_id": 1, "role": "admin"}
+TABLES = ("orders", "order_items", "deliveries", "payments")
+# The indexes the lookups and the archiver use in MySQL (migrations 0001, 0002 and 0008)
+INDEXES = [
+    "CREATE INDEX idx_order_items_order ON order_items (order_id, product_id)",
+    "CREATE UNIQUE INDEX uq_deliveries_order ON deliveries (order_id)",
+    "CREATE INDEX idx_payments_order ON payments (order_id)",
+    "CREATE INDEX idx_orders_status_created ON orders (status, created_at, id)",
+    "CREATE INDEX idx_order_items_archive_order ON order_items_archive (order_id, product_id)",
+    "CREATE INDEX idx_payments_archive_order ON payments_archive (order_id)",
+]
+
+
+def build(count, recent_share):
+    conn = sqlite_standin.connect(products=100)
+    for statement in INDEXES:
+        conn._db.execute(statement)
+
+    rng = random.Random(7)
+    now = datetime.now()
+    orders, items, deliveries, payments = [], [], [], []
+    for order_id in range(1, count + 1):
+        if order_id > count * (1 - recent_share):
+            created_at = now - timedelta(days=rng.uniform(0, 7))
+            status = rng.choice(["Placed", "Processing", "Shipped", "Out for Delivery", "Delivered"])
+        else:
+            created_at = now - timedelta(days=rng.uniform(91, 730))
+            status = "Delivered" if rng.random() < 0.9 else "Canceled"
+        orders.append((order_id, status, created_at.strftime("%Y-%m-%d %H:%M:%S")))
+        for _ in range(3):
+            items.append((order_id, rng.randint(1, 100), rng.randint(1, 3)))
+        deliveries.append((order_id, "Delivered" if status == "Delivered" else "Assigned"))
+        payments.append((order_id, f"cs_{order_id}"))
+
+    conn._db.executemany(
+        "INSERT INTO orders (id, customer_id, status, total_amount, created_at) VALUES (?, 1, ?, 30, ?)", orders
+    )
+    conn._db.executemany("INSERT INTO order_items (order_id, product_id, quantity, subtotal) VALUES (?, ?, ?, 10)", items)
+    conn._db.executemany(
+        "INSERT INTO deliveries (order_id, delivery_personnel_id, status, tracking_link) VALUES (?, 3, ?, 'https://track.delivery/x')",
+        deliveries
+    )
+    conn._db.executemany(
+        "INSERT INTO payments (order_id, amount, payment_method, payment_status, stripe_session_id) VALUES (?, 30, 'Wallet', 'Success', ?)",
+        payments
+    )
+    conn._db.commit()
+    return conn
+
+
+def counts(conn, suffix=""):
+    return {table: conn._db.execute(f"SELECT COUNT(*) FROM {table}{suffix}").fetchone()[0] for table in TABLES}
+
+
+def lookup(conn, order_id, repeat):
+    samples = []
+    for _ in range(repeat):
+        conn.round_trips = 0
+        started = time.perf_counter()
+        order = get_order(order_id, ADMIN, conn)
+        samples.append((time.perf_counter() - started) * 1000)
+    assert len(order["items"]) == 3
+    return statistics.median(samples), conn.round_trips
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--orders", type=int, default=100000)
+    parser.add_argument("--recent-share", type=float, default=0.05, help="share of orders placed in the last week")
+    parser.add_argument("--chunk-size", type=int, default=1000)
+    parser.add_argument("--latency", type=float, default=0.0005, help="simulated seconds per statement for lookups")
+    parser.add_argument("--repeat", type=int, default=200)
+    args = parser.parse_args()
+
+    conn = build(args.orders, args.recent_share)
+    before = counts(conn)
+    recent_id, old_id = args.orders, 1
+
+    conn.latency = args.latency
+    lookups = [("recent order, live", *lookup(conn, recent_id, args.repeat)),
+               ("old order, live", *lookup(conn, old_id, args.repeat))]
+
+    conn.latency = 0
+    archive.get_connection = lambda: conn
+    started = time.perf_counter()
+    chunks = sum(1 for _ in archive.archive_orders(datetime.now() - timedelta(days=90), args.chunk_size))
+    elapsed = time.perf_counter() - started
+
+    conn.latency = args.latency
+    lookups += [("recent order, live", *lookup(conn, recent_id, args.repeat)),
+                ("old order, archive", *lookup(conn, old_id, args.repeat))]
+
+    live, archived = counts(conn), counts(conn, "_archive")
+    assert all(live[table] + archived[table] == before[table] for table in TABLES)
+    assert conn._db.execute("SELECT COUNT(*) FROM orders WHERE status IN ('Delivered', 'Canceled') AND created_at < ?",
+                            ((datetime.now() - timedelta(days=90)).strftime("%Y-%m-%d %H:%M:%S"),)).fetchone()[0] == 0
+
+    print(f"{args.orders} orders, {args.recent_share:.0%} placed in the last week")
+    print(f"archived {archived['orders']} orders in {chunks} chunks of up to {args.chunk_size}: "
+          f"{elapsed:.2f} s, {archived['orders'] / elapsed:,.0f} orders/s")
+    print()
+    print(f"{'table':<12} {'before':>9} {'live after':>11} {'archived':>9}")
+    for table in TABLES:
+        print(f"{table:<12} {before[table]:>9} {live[table]:>11} {archived[table]:>9}")
+    print()
+    print(f"get_order, median of {args.repeat}, {args.latency * 1000:g} ms per statement")
+    print(f"{'':<10} {'order':<20} {'ms':>7} {'statements':>11}")
+    for index, (name, ms, round_trips) in enumerate(lookups):
+        print(f"{'before' if index < 2 else 'after':<10} {name:<20} {ms:>7.2f} {round_trips:>11}")
+
+
+if __name__ == "__main__":
+    main()
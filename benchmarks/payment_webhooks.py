@@ -0,0 +1,136 @@
+"""Stripe webhooks end to end against the mock Stripe server, without MySQL.
+
+Runs main.app in-process (httpx's ASGI transport) on a SQLite stand-in
+database, with Stripe served by benchmarks/mock_stripe.py:
+
+  sessions    /payments/create-checkout-session for --orders orders
+  webhooks    a signed checkout.session.completed for every session, each
+              delivered twice (Stripe redelivers), --concurrency at a time,
+              recorded by the group-commit payment writer
+  late events checkout.session.expired after completion must not undo Success
+  signatures  a wrong secret, a tampered body, a missing header and a correctly
+              signed event older than Stripe's tolerance (a replay) get 400
+
+Every payment is checked to end up Success, through verify-payment and in the
+payments table.
+
+Usage: python benchmarks/payment_webhooks.py [--orders 2000] [--concurrency 50] [--stripe-latency 0]
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import httpx
+
+import sqlite_standin
+from mock_stripe import MockStripe, sign, webhook_event
+
+WEBHOOK_SECRET = "whsec_benchmark"
+
+
+def build(count):
+    conn = sqlite_standin.connect(products=10)
+    conn._db.executemany(
+        "INSERT INTO orders (id, customer_id, total_amount) VALUES (?, 1, ?)",
+        [(order_id, 10 + order_id % 50) for order_id in range(1, count + 1)]
+    )
+    conn._db.commit()
+    return conn
+
+
+def signed(event, secret=WEBHOOK_SECRET, timestamp=None):
+    payload = json.dumps(event).encode("utf-8")
+    return payload, {"stripe-signature": sign(payload, secret, timestamp)}
+
+
+async def run(args, conn):
+    import config
+    import main
+    import routers.payments as payments
+
+    config.STRIPE_WEBHOOK_SECRET = WEBHOOK_SECRET
+
+    # The stand-in is one connection; the payment writer serializes its batches
+    payments.get_connection = lambda: conn
+    payments.get_read_connection = lambda: conn
+
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=main.app), base_url="http://bench") as client:
+        started = time.perf_counter()
+        session_ids = []
+        for order_id in range(1, args.orders + 1):
+            response = await client.post("/payments/create-checkout-session", params={"order_id": order_id})
+            assert response.status_code == 200, response.text
+            session_ids.append(response.json()["session_id"])
+        sessions_elapsed = time.perf_counter() - started
+
+        semaphore = asyncio.Semaphore(args.concurrency)
+
+        async def deliver(event_type, session_id):
+            payload, headers = signed(webhook_event(event_type, {"id": session_id, "payment_status": "paid"}))
+            async with semaphore:
+                response = await client.post("/payments/webhook", content=payload, headers=headers)
+            return response.status_code
+
+        started = time.perf_counter()
+        codes = await asyncio.gather(*(deliver("checkout.session.completed", session_id) for session_id in session_ids * 2))
+        webhooks_elapsed = time.perf_counter() - started
+        assert set(codes) == {200}, set(codes)
+
+        late = session_ids[:10]
+        assert set(await asyncio.gather(*(deliver("checkout.session.expired", session_id) for session_id in late))) == {200}
+
+        event = webhook_event("checkout.session.expired", {"id": session_ids[-1]})
+        payload, headers = signed(event)
+        rejected = {
+            "wrong secret": await client.post("/payments/webhook", content=payload, headers=signed(event, "whsec_other")[1]),
+            "tampered body": await client.post("/payments/webhook", content=payload.replace(b"expired", b"xpired!"), headers=headers),
+            "missing header": await client.post("/payments/webhook", content=payload),
+            "replayed (1 h old)": await client.post(
+                "/payments/webhook", content=payload, headers=signed(event, timestamp=int(time.time()) - 3600)[1]
+            ),
+        }
+        assert all(response.status_code == 400 for response in rejected.values()), {
+            name: response.status_code for name, response in rejected.items()
+        }
+
+        statuses = [(await client.get(f"/payments/verify-payment/{session_id}")).json()["status"] for session_id in session_ids]
+        assert set(statuses) == {"Success"}, set(statuses)
+        stored = dict(conn._db.execute("SELECT payment_status, COUNT(*) FROM payments GROUP BY payment_status").fetchall())
+        assert stored == {"Success": args.orders}, stored
+
+        return sessions_elapsed, webhooks_elapsed, len(codes), payments.payment_writer.stats(), rejected
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--orders", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--stripe-latency", type=float, default=0.0, help="seconds each mock Stripe call takes")
+    args = parser.parse_args()
+
+    stripe = MockStripe(latency=args.stripe_latency).start()
+    os.environ["STRIPE_API_BASE"] = stripe.base_url
+    os.environ["NOTIFICATION_WORKER"] = "0"
+
+    try:
+        sessions_elapsed, webhooks_elapsed, delivered, writer, rejected = asyncio.run(run(args, build(args.orders)))
+    finally:
+        stripe.stop()
+
+    print(f"{args.orders} checkout sessions created in {sessions_elapsed:.2f} s")
+    print(f"{delivered} completed webhooks ({args.concurrency} concurrent, each session twice) in {webhooks_elapsed:.2f} s, "
+          f"{delivered / webhooks_elapsed:,.0f}/s")
+    print(f"payment writer: {writer['updates']} updates in {writer['batches']} batches")
+    print(f"all {args.orders} payments Success, also after late checkout.session.expired events")
+    for name, response in rejected.items():
+        print(f"  {name:<20} {response.status_code} {response.json()['detail']}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,77 @@
+"""Order placement cost vs. cart size: per-item queries vs. batched queries.
+
+Compares the old per-line-item SELECT/INSERT loop with routers.orders._create_order
+(one IN-list price lookup and one multi-row INSERT) for cart sizes 1..500, against
+the SQLite stand-in with a simulated round-trip delay per statement.
+
+Usage: python benchmarks/place_order_batching.py [--latency 0.0005] [--repeat 5]
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import sqlite_standin
+from routers.orders import _create_order
+from schemas import OrderCreate
+
+CART_SIZES = [1, 5, 10, 40, 100, 250, 500]
+CUSTOMER = {"user_id": 1, "role": "customer"}
+
+
+# The implementation place_order used before batching
+def per_item_order(conn, user, order):
+    products = order.products
+    cursor = conn.cursor()
+    total_amount = 0
+    product_prices = {}
+    for item in products:
+        cursor.execute("SELECT price FROM products WHERE id = %s", (item.product_id,))
+        price = cursor.fetchone()[0]
+        product_prices[item.product_id] = price
+        total_amount += price * item.quantity
+    cursor.execute(
+        "INSERT INTO orders (customer_id, total_amount, status) VALUES (%s, %s, %s)",
+        (user["user_id"], total_amount, "Placed")
+    )
+    order_id = cursor.lastrowid
+    for item in products:
+        cursor.execute(
+            "INSERT INTO order_items (order_id, product_id, quantity, subtotal) VALUES (%s, %s, %s, %s)",
+            (order_id, item.product_id, item.quantity, item.quantity * product_prices[item.product_id])
+        )
+    conn.commit()
+    cursor.close()
+
+
+def measure(fn, conn, cart, repeat):
+    conn.round_trips = 0
+    best = float("inf")
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn(conn, CUSTOMER, cart)
+        best = min(best, time.perf_counter() - started)
+    return best, conn.round_trips // repeat
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--latency", type=float, default=0.0005, help="simulated seconds per statement")
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    conn = sqlite_standin.connect(latency=args.latency, products=1000)
+
+    print(f"{'items':>6} {'per-item ms':>12} {'trips':>6} {'batched ms':>11} {'trips':>6}")
+    for size in CART_SIZES:
+        cart = OrderCreate(customer_id=1, products=[{"product_id": i + 1, "quantity": 1 + i % 3} for i in range(size)])
+        old_time, old_trips = measure(per_item_order, conn, cart, args.repeat)
+        new_time, new_trips = measure(_create_order, conn, cart, args.repeat)
+        print(f"{size:>6} {old_time * 1000:>12.2f} {old_trips:>6} {new_time * 1000:>11.2f} {new_trips:>6}")
+
+
+if __name__ == "__main__":
+    main()
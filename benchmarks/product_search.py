@@ -0,0 +1,86 @@
+"""Build time, memory and query latency of the product search index.
+
+Indexes a synthetic catalog (1M products by default) and times full-text
+queries with facets and prefix autocomplete.
+
+Usage: python benchmarks/search_index.py [--products 1000000] [--queries 200]
+"""
+import argparse
+import os
+import random
+import resource
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from search_index import ProductIndex
+
+ADJECTIVES = ["wireless", "portable", "ergonomic", "smart", "compact", "premium", "gaming", "waterproof",
+              "bluetooth", "noise", "canceling", "mechanical", "organic", "stainless", "leather", "vintage"]
+NOUNS = ["headphones", "laptop", "chair", "keyboard", "mouse", "speaker", "watch", "backpack", "bottle",
+         "lamp", "desk", "camera", "charger", "monitor", "jacket", "sneakers", "blender", "kettle"]
+CATEGORIES = ["Electronics", "Furniture", "Clothing", "Kitchen", "Sports", "Books", "Toys", "Garden"]
+QUERIES = ["wireless headphones", "gaming laptop", "ergonomic chair", "smart watch", "portable speaker",
+           "stainless bottle", "mechanical keyboard", "waterproof jacket", "premium", "blu"]
+
+
+def synthetic_products(count, seed=7):
+    rng = random.Random(seed)
+    for product_id in range(1, count + 1):
+        words = rng.sample(ADJECTIVES, 2)
+        noun = rng.choice(NOUNS)
+        yield {
+            "id": product_id,
+            "name": f"{words[0].title()} {words[1].title()} {noun.title()} {product_id % 977}",
+            "description": f"{rng.choice(ADJECTIVES)} {noun} with {rng.choice(ADJECTIVES)} finish",
+            "price": round(rng.uniform(1, 2000), 2),
+            "availability": rng.random() > 0.1,
+            "category": rng.choice(CATEGORIES),
+        }
+
+
+def percentile(samples, fraction):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--products", type=int, default=1_000_000)
+    parser.add_argument("--queries", type=int, default=200)
+    args = parser.parse_args()
+
+    index = ProductIndex()
+    started = time.perf_counter()
+    for product in synthetic_products(args.products):
+        index.add(product)
+    build_time = time.perf_counter() - started
+    max_rss_mb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    print(f"indexed {len(index)} products in {build_time:.1f}s (max RSS {max_rss_mb:.0f} MB)")
+
+    rng = random.Random(11)
+    cases = {
+        "search": lambda q: index.search(q),
+        "search+filters": lambda q: index.search(q, category=rng.choice(CATEGORIES), max_price=500, available=True),
+        "autocomplete": lambda q: index.autocomplete(q[:3]),
+    }
+    for name, run in cases.items():
+        samples = []
+        for i in range(args.queries):
+            query = QUERIES[i % len(QUERIES)]
+            started = time.perf_counter()
+            run(query)
+            samples.append((time.perf_counter() - started) * 1000)
+        print(f"{name:<16} p50 {percentile(samples, 0.5):8.2f} ms   p95 {percentile(samples, 0.95):8.2f} ms")
+
+    started = time.perf_counter()
+    for product_id in range(1, 1001):
+        index.remove(product_id)
+    for product in synthetic_products(1000, seed=99):
+        index.add(product)
+    print(f"incremental update of 1000 products: {(time.perf_counter() - started) * 1000:.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,91 @@
+"""Route planning time and quality for one courier's stops.
+
+Scatters --stops delivery points over a city-sized area (about 20 x 20 km) and
+plans them with routing.RoutePlan, the planner behind /deliveries/route/{id}:
+
+  full         first plan: distance matrix, nearest neighbor and 2-opt
+  add stop     one delivery assigned to an already planned route
+  fail stop    one delivery removed (failed or delivered) from the route
+  cached       same stops again; the sequence is reused
+
+Route length is compared with the stops in id order (the order they were
+assigned, which is how couriers saw them before) and with nearest neighbor alone.
+
+Usage: python benchmarks/route_planning.py [--stops 50] [--repeat 50]
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from routing import RoutePlan, haversine_km, nearest_neighbor, route_length
+
+CENTER = (24.8607, 67.0011)
+SPAN_DEGREES = 0.18
+
+
+def random_point(rng):
+    return CENTER[0] + rng.uniform(-SPAN_DEGREES / 2, SPAN_DEGREES / 2), CENTER[1] + rng.uniform(-SPAN_DEGREES / 2, SPAN_DEGREES / 2)
+
+
+def timed_ms(setup, fn, repeat):
+    samples = []
+    for _ in range(repeat):
+        state = setup()
+        started = time.perf_counter()
+        fn(state)
+        samples.append((time.perf_counter() - started) * 1000)
+    return statistics.median(samples)
+
+
+def planned(start, stops):
+    plan = RoutePlan()
+    plan.update(start, stops)
+    return plan
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--stops", type=int, default=50)
+    parser.add_argument("--repeat", type=int, default=50)
+    args = parser.parse_args()
+
+    rng = random.Random(7)
+    start = random_point(rng)
+    stops = {order_id: random_point(rng) for order_id in range(1, args.stops + 1)}
+    extra = {args.stops + 1: random_point(rng)}
+    with_extra = {**stops, **extra}
+    without_first = {order_id: point for order_id, point in stops.items() if order_id != 1}
+
+    timings = [
+        ("full", timed_ms(lambda: RoutePlan(), lambda plan: plan.update(start, stops), args.repeat)),
+        ("add stop", timed_ms(lambda: planned(start, stops), lambda plan: plan.update(start, with_extra), args.repeat)),
+        ("fail stop", timed_ms(lambda: planned(start, stops), lambda plan: plan.update(start, without_first), args.repeat)),
+        ("cached", timed_ms(lambda: planned(start, stops), lambda plan: plan.update(start, stops), args.repeat)),
+    ]
+
+    points = [start] + list(stops.values())
+    matrix = [[haversine_km(*a, *b) for b in points] for a in points]
+    _, planned_km, _ = planned(start, stops).update(start, stops)
+    lengths = [
+        ("assignment order", route_length(list(range(len(points))), matrix)),
+        ("nearest neighbor", route_length(nearest_neighbor(matrix), matrix)),
+        ("nn + 2-opt", planned_km),
+    ]
+
+    print(f"{args.stops} stops, median of {args.repeat}")
+    print(f"{'update':<12} {'ms':>8}")
+    for name, ms in timings:
+        print(f"{name:<12} {ms:>8.3f}")
+    print()
+    print(f"{'route':<18} {'km':>8}")
+    for name, km in lengths:
+        print(f"{name:<18} {km:>8.1f}")
+
+
+if __name__ == "__main__":
+    main()
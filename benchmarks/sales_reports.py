@@ -0,0 +1,90 @@
+"""Sales reports from the rollup tables vs. the same reports computed from orders.
+
+Runs against the configured MySQL database (use the database built by
+benchmarks/seed.py). First rebuilds the rollups with analytics.backfill() and
+times it, then times top-10 products and a daily revenue series over the
+last --days days, both from the rollups (the queries behind /analytics) and
+by aggregating orders and order_items directly.
+
+Usage: python benchmarks/sales_reports.py [--days 90] [--repeat 20] [--skip-backfill]
+"""
+import argparse
+import os
+import statistics
+import sys
+import time
+from datetime import date, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from database import get_connection
+from analytics import backfill
+from routers.analytics import _top_products, _daily_totals
+
+RAW_TOP_PRODUCTS = (
+    "SELECT oi.product_id, COUNT(DISTINCT o.id), SUM(oi.quantity), SUM(oi.subtotal) AS revenue "
+    "FROM orders o JOIN order_items oi ON oi.order_id = o.id "
+    "WHERE o.created_at >= %s AND o.created_at < %s AND o.status <> 'Canceled' "
+    "GROUP BY oi.product_id ORDER BY revenue DESC, oi.product_id LIMIT 10"
+)
+RAW_DAILY_TOTALS = (
+    "SELECT DATE(o.created_at), COUNT(DISTINCT o.id), SUM(oi.quantity), SUM(oi.subtotal) "
+    "FROM orders o JOIN order_items oi ON oi.order_id = o.id "
+    "WHERE o.created_at >= %s AND o.created_at < %s AND o.status <> 'Canceled' "
+    "GROUP BY DATE(o.created_at)"
+)
+
+
+def timed(repeat, fn):
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - started) * 1000)
+    return statistics.median(samples)
+
+
+def raw_query(conn, query, params):
+    cursor = conn.cursor()
+    try:
+        cursor.execute(query, params)
+        return cursor.fetchall()
+    finally:
+        cursor.close()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--days", type=int, default=90)
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--skip-backfill", action="store_true")
+    args = parser.parse_args()
+
+    if not args.skip_backfill:
+        started = time.perf_counter()
+        days = sum(1 for _ in backfill())
+        print(f"backfill: {days} days in {time.perf_counter() - started:.1f}s")
+
+    date_to = date.today()
+    date_from = date_to - timedelta(days=args.days - 1)
+    window = (date_from, date_to + timedelta(days=1))
+
+    conn = get_connection()
+    try:
+        rows = [
+            ("top 10 products", lambda: _top_products(conn, date_from, date_to, "revenue", None, None, 10),
+             lambda: raw_query(conn, RAW_TOP_PRODUCTS, window)),
+            ("daily revenue series", lambda: _daily_totals(conn, date_from, date_to, None, None, None),
+             lambda: raw_query(conn, RAW_DAILY_TOTALS, window)),
+        ]
+        print(f"{'report':<22} {'rollup ms':>10} {'raw scan ms':>12} {'speedup':>8}   ({args.days} days, median of {args.repeat})")
+        for name, rollup, raw in rows:
+            rollup_ms = timed(args.repeat, rollup)
+            raw_ms = timed(max(1, args.repeat // 5), raw)
+            print(f"{name:<22} {rollup_ms:>10.2f} {raw_ms:>12.1f} {raw_ms / rollup_ms:>7.0f}x")
+    finally:
+        conn.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,194 @@
+"""Builds a benchmark database from database.sql, the migrations and synthetic data.
+
+The schema comes from database.sql, with the database name replaced, followed
+by every file in migrations/. The tables are then filled with a deterministic
+(--seed) data set:
+customers, vendors, couriers (with positions), one admin, products with
+searchable names, and orders with items, deliveries and payments spread over
+the last year. Every seeded user has the password SEED_PASSWORD.
+
+The database is dropped and recreated on every run. Connection settings come
+from the same DB_HOST/DB_PORT/DB_USER/Password variables as the app.
+
+Usage: python benchmarks/seed.py [--database online_delivery_bench]
+                                 [--users 10000] [--products 100000] [--orders 200000] [--seed 42]
+"""
+import argparse
+import os
+import random
+import sys
+import time
+from datetime import datetime, timedelta
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+DEFAULT_DATABASE = os.getenv("BENCH_DB_NAME", "online_delivery_bench")
+SEED_PASSWORD = "benchmark"
+BATCH_SIZE = 5000
+
+# City the delivery coordinates are scattered around
+CENTER_LATITUDE = 40.7128
+CENTER_LONGITUDE = -74.0060
+SPREAD_DEGREES = 0.15
+
+CATEGORIES = ["Electronics", "Furniture", "Grocery", "Books", "Clothing", "Toys", "Sports", "Beauty", "Garden", "Kitchen"]
+ADJECTIVES = ["wireless", "ergonomic", "organic", "portable", "classic", "compact", "premium", "smart", "vintage", "waterproof"]
+NOUNS = ["headphones", "chair", "laptop", "blender", "lamp", "backpack", "speaker", "kettle", "jacket", "notebook",
+         "camera", "desk", "sneakers", "watch", "monitor", "keyboard", "puzzle", "tent", "bottle", "skillet"]
+ORDER_STATUSES = ["Placed", "Processing", "Shipped", "Out for Delivery", "Delivered", "Canceled"]
+ORDER_STATUS_WEIGHTS = [10, 10, 10, 5, 60, 5]
+DELIVERY_STATUS = {"Processing": "Assigned", "Shipped": "Assigned", "Out for Delivery": "Out for Delivery",
+                   "Delivered": "Delivered", "Canceled": "Failed"}
+
+
+def schema_statements(database):
+    from migrate import _statements
+
+    with open(os.path.join(ROOT, "database.sql")) as f:
+        return _statements(f.read().replace("online_delivery_db", database))
+
+
+def _insert(cursor, query, rows):
+    for start in range(0, len(rows), BATCH_SIZE):
+        cursor.executemany(query, rows[start:start + BATCH_SIZE])
+
+
+def _coordinates(rng):
+    return (round(CENTER_LATITUDE + rng.uniform(-SPREAD_DEGREES, SPREAD_DEGREES), 6),
+            round(CENTER_LONGITUDE + rng.uniform(-SPREAD_DEGREES, SPREAD_DEGREES), 6))
+
+
+def seed_users(cursor, rng, customers):
+    from auth.auth import hash_password
+
+    password_hash = hash_password(SEED_PASSWORD)
+    vendors = max(1, customers // 100)
+    couriers = max(1, customers // 50)
+    rows = [("bench_admin", "bench_admin@example.com", password_hash, "admin", "+10000000000")]
+    for role, count in (("customer", customers), ("vendor", vendors), ("delivery", couriers)):
+        rows.extend(
+            (f"bench_{role}_{i}", f"bench_{role}_{i}@example.com", password_hash, role, f"+1555{i:07d}")
+            for i in range(count)
+        )
+    _insert(cursor, "INSERT INTO users (username, email, password_hash, role, phone_number) VALUES (%s, %s, %s, %s, %s)", rows)
+
+    cursor.execute("SELECT id, role FROM users")
+    ids = {"admin": [], "customer": [], "vendor": [], "delivery": []}
+    for user_id, role in cursor.fetchall():
+        ids[role].append(user_id)
+
+    _insert(
+        cursor,
+        "INSERT INTO courier_locations (delivery_personnel_id, latitude, longitude, capacity, available) VALUES (%s, %s, %s, %s, %s)",
+        [(courier_id, *_coordinates(rng), rng.randint(5, 15), rng.random() < 0.9) for courier_id in ids["delivery"]]
+    )
+    return ids
+
+
+def seed_products(cursor, rng, count, vendor_ids):
+    rows = []
+    for i in range(count):
+        category = rng.choice(CATEGORIES)
+        adjective, noun = rng.choice(ADJECTIVES), rng.choice(NOUNS)
+        rows.append((
+            rng.choice(vendor_ids),
+            f"{adjective.title()} {noun.title()} {i}",
+            f"A {adjective} {noun} from our {category.lower()} range",
+            round(rng.uniform(1, 2000), 2),
+            rng.random() < 0.95,
+            category,
+        ))
+    _insert(cursor, "INSERT INTO products (vendor_id, name, description, price, availability, category) VALUES (%s, %s, %s, %s, %s, %s)", rows)
+
+    cursor.execute("SELECT id, price FROM products")
+    return cursor.fetchall()
+
+
+def seed_orders(conn, cursor, rng, count, ids, products):
+    now = datetime.now().replace(microsecond=0)
+    cursor.execute("SELECT COALESCE(MAX(id), 0) FROM orders")
+    next_id = cursor.fetchone()[0] + 1
+
+    for start in range(0, count, BATCH_SIZE):
+        orders, items, deliveries, payments = [], [], [], []
+        for order_id in range(next_id + start, next_id + min(start + BATCH_SIZE, count)):
+            status = rng.choices(ORDER_STATUSES, ORDER_STATUS_WEIGHTS)[0]
+            total = 0
+            for product_id, price in rng.sample(products, rng.randint(1, 4)):
+                quantity = rng.randint(1, 3)
+                subtotal = price * quantity
+                total += subtotal
+                items.append((order_id, product_id, quantity, subtotal))
+
+            created_at = now - timedelta(seconds=rng.randint(0, 365 * 86400))
+            orders.append((order_id, rng.choice(ids["customer"]), status, total, created_at, *_coordinates(rng)))
+            if status in DELIVERY_STATUS:
+                deliveries.append((order_id, rng.choice(ids["delivery"]), DELIVERY_STATUS[status], f"https://track.delivery/{order_id}"))
+            payment_status = "Pending" if status == "Placed" else ("Failed" if status == "Canceled" else "Success")
+            payments.append((order_id, total, rng.choice(["Credit Card", "Debit Card", "Wallet"]), payment_status))
+
+        cursor.executemany(
+            "INSERT INTO orders (id, customer_id, status, total_amount, created_at, delivery_latitude, delivery_longitude) "
+            "VALUES (%s, %s, %s, %s, %s, %s, %s)", orders
+        )
+        _insert(cursor, "INSERT INTO order_items (order_id, product_id, quantity, subtotal) VALUES (%s, %s, %s, %s)", items)
+        _insert(cursor, "INSERT INTO deliveries (order_id, delivery_personnel_id, status, tracking_link) VALUES (%s, %s, %s, %s)", deliveries)
+        _insert(cursor, "INSERT INTO payments (order_id, amount, payment_method, payment_status) VALUES (%s, %s, %s, %s)", payments)
+        conn.commit()
+
+
+def seed(database, users, products, orders, seed_value=42):
+    if database == "online_delivery_db":
+        raise SystemExit("Refusing to recreate the application database; pick another --database")
+
+    # database.py reads DB_NAME at import time
+    os.environ["DB_NAME"] = database
+    import mysql.connector
+    from database import DB_CONFIG
+    from migrate import apply_migrations
+    from analytics import backfill
+
+    server_config = {key: value for key, value in DB_CONFIG.items() if key != "database"}
+    conn = mysql.connector.connect(**server_config)
+    cursor = conn.cursor()
+    rng = random.Random(seed_value)
+    started = time.perf_counter()
+
+    try:
+        cursor.execute(f"DROP DATABASE IF EXISTS `{database}`")
+        for statement in schema_statements(database):
+            cursor.execute(statement)
+        conn.commit()
+        applied = apply_migrations()
+
+        ids = seed_users(cursor, rng, users)
+        conn.commit()
+        product_rows = seed_products(cursor, rng, products, ids["vendor"])
+        conn.commit()
+        seed_orders(conn, cursor, rng, orders, ids, product_rows)
+        rollup_days = sum(1 for _ in backfill())
+
+    finally:
+        cursor.close()
+        conn.close()
+
+    print(f"Seeded {database}: {users} customers, {len(ids['vendor'])} vendors, {len(ids['delivery'])} couriers, "
+          f"{products} products, {orders} orders, {rollup_days} days of sales rollups; migrations {', '.join(applied) or 'none'} "
+          f"in {time.perf_counter() - started:.1f}s")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--database", default=DEFAULT_DATABASE)
+    parser.add_argument("--users", type=int, default=10000, help="Number of customers")
+    parser.add_argument("--products", type=int, default=100000)
+    parser.add_argument("--orders", type=int, default=200000)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    seed(args.database, args.users, args.products, args.orders, args.seed)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,113 @@
+"""Cost of turning 10k product rows into a JSON response body, before and after.
+
+The rows are built in memory the way mysql.connector returns them: tuples with
+Decimal prices and 0/1 availability. Each pipeline starts from those rows:
+
+  before         dictionary=True cursor mapping (the column-name tuple is rebuilt
+                 for every row, as MySQLCursorDict does), then jsonable_encoder
+                 and JSONResponse, which is what FastAPI did for the old handlers
+  response_model tuple rows mapped once per result set (database.fetch_dicts),
+                 then validated and dumped by Pydantic, FastAPI's path for
+                 routes with a response_model
+  orjson         fetch_dicts, then responses.ORJSONResponse, the path of the
+                 product and order listings
+  cached page    a catalog cache hit, whose body is already serialized
+
+Usage: python benchmarks/serialization.py [--rows 10000] [--repeat 20]
+"""
+import argparse
+import os
+import statistics
+import sys
+import time
+from decimal import Decimal
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse, Response
+from pydantic import TypeAdapter
+
+from database import fetch_dicts
+from responses import ORJSONResponse
+from schemas import ProductOut
+
+COLUMNS = ("id", "vendor_id", "name", "description", "price", "availability", "category", "stock")
+
+
+class RowCursor:
+    """Just enough of a mysql.connector cursor over pre-built rows."""
+
+    def __init__(self, rows):
+        self.rows = rows
+        self.description = [(name, None) for name in COLUMNS]
+
+    @property
+    def column_names(self):
+        return tuple(d[0] for d in self.description)
+
+    def fetchall(self):
+        return self.rows
+
+    def fetchall_dicts(self):
+        # MySQLCursorDict: dict(zip(self.column_names, row)) per row
+        return [dict(zip(self.column_names, row)) for row in self.rows]
+
+
+def build_rows(count):
+    return [
+        (i, 2 + i % 50, f"Product {i}", f"Description of product {i}", Decimal(f"{i % 500}.99"), int(i % 7 != 0), f"Category {i % 20}", None if i % 3 else i % 100)
+        for i in range(1, count + 1)
+    ]
+
+
+def before(cursor):
+    return JSONResponse(jsonable_encoder(cursor.fetchall_dicts())).body
+
+
+products_adapter = TypeAdapter(list[ProductOut])
+
+
+def response_model(cursor):
+    return products_adapter.dump_json(products_adapter.validate_python(fetch_dicts(cursor)))
+
+
+def with_orjson(cursor):
+    return ORJSONResponse(fetch_dicts(cursor)).body
+
+
+def timed_ms(fn, repeat):
+    fn()
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - started) * 1000)
+    return statistics.median(samples)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=10000)
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    cursor = RowCursor(build_rows(args.rows))
+    cached_body = with_orjson(cursor)
+
+    baseline = timed_ms(lambda: before(cursor), args.repeat)
+    results = [
+        ("before", baseline, len(before(cursor))),
+        ("response_model", timed_ms(lambda: response_model(cursor), args.repeat), len(response_model(cursor))),
+        ("orjson", timed_ms(lambda: with_orjson(cursor), args.repeat), len(cached_body)),
+        ("cached page", timed_ms(lambda: Response(cached_body, media_type="application/json"), args.repeat), len(cached_body)),
+    ]
+
+    print(f"{args.rows} products, median of {args.repeat}")
+    print(f"{'pipeline':<16} {'ms':>9} {'speedup':>9} {'bytes':>10}")
+    for name, ms, size in results:
+        print(f"{name:<16} {ms:>9.3f} {baseline / ms:>8.1f}x {size:>10}")
+
+
+if __name__ == "__main__":
+    main()
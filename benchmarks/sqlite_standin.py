@@ -0,0 +1,297 @@
+"""SQLite stand-in for the MySQL database used by the benchmarks.
+
+Exposes the small part of the mysql.connector API the routers use
+(cursor(dictionary=True), %s placeholders, lastrowid, executemany, commit,
+rollback) and can add a fixed delay per statement to mimic a network
+round trip to a real server. SQLite serializes writers on its own, so row
+locks (FOR UPDATE / SKIP LOCKED) are dropped, and unique-key violations are
+raised as mysql.connector IntegrityError with errno ER_DUP_ENTRY. INSERT ...
+ON DUPLICATE KEY UPDATE is rewritten to SQLite's ON CONFLICT DO UPDATE, and
+triggers stand in for MySQL's ON UPDATE CURRENT_TIMESTAMP.
+"""
+import re
+import sqlite3
+import time
+from datetime import datetime, timezone
+from decimal import Decimal
+from mysql.connector import IntegrityError, errorcode
+
+sqlite3.register_adapter(Decimal, str)
+
+SCHEMA = """
+CREATE TABLE users (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    username TEXT UNIQUE NOT NULL,
+    email TEXT UNIQUE NOT NULL,
+    password_hash TEXT NOT NULL,
+    role TEXT NOT NULL,
+    phone_number TEXT NOT NULL DEFAULT ''
+);
+CREATE TABLE products (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    vendor_id INTEGER NOT NULL,
+    name TEXT NOT NULL,
+    description TEXT,
+    price NUMERIC NOT NULL,
+    availability BOOLEAN DEFAULT 1,
+    category TEXT,
+    stock INTEGER,
+    updated_at TIMESTAMP NOT NULL DEFAULT (strftime('%Y-%m-%d %H:%M:%f', 'now'))
+);
+CREATE TRIGGER products_updated_at AFTER UPDATE ON products BEGIN
+    UPDATE products SET updated_at = strftime('%Y-%m-%d %H:%M:%f', 'now') WHERE id = NEW.id;
+END;
+CREATE TABLE orders (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    customer_id INTEGER NOT NULL,
+    status TEXT DEFAULT 'Placed',
+    total_amount NUMERIC NOT NULL,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    delivery_latitude NUMERIC,
+    delivery_longitude NUMERIC
+);
+CREATE TABLE order_items (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    order_id INTEGER NOT NULL,
+    product_id INTEGER NOT NULL,
+    quantity INTEGER NOT NULL,
+    subtotal NUMERIC NOT NULL,
+    vendor_id INTEGER,
+    category TEXT
+);
+CREATE TABLE deliveries (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    order_id INTEGER NOT NULL,
+    delivery_personnel_id INTEGER NOT NULL,
+    status TEXT DEFAULT 'Assigned',
+    tracking_link TEXT,
+    updated_at TIMESTAMP NOT NULL DEFAULT (strftime('%Y-%m-%d %H:%M:%f', 'now'))
+);
+CREATE TRIGGER deliveries_updated_at AFTER UPDATE ON deliveries BEGIN
+    UPDATE deliveries SET updated_at = strftime('%Y-%m-%d %H:%M:%f', 'now') WHERE id = NEW.id;
+END;
+CREATE TABLE payments (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    order_id INTEGER NOT NULL,
+    amount NUMERIC NOT NULL,
+    payment_method TEXT NOT NULL,
+    payment_status TEXT DEFAULT 'Pending',
+    stripe_session_id TEXT UNIQUE
+);
+CREATE TABLE orders_archive (
+    id INTEGER PRIMARY KEY,
+    customer_id INTEGER NOT NULL,
+    status TEXT NOT NULL,
+    total_amount NUMERIC NOT NULL,
+    created_at TIMESTAMP,
+    delivery_latitude NUMERIC,
+    delivery_longitude NUMERIC,
+    archived_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+CREATE TABLE order_items_archive (
+    id INTEGER PRIMARY KEY,
+    order_id INTEGER NOT NULL,
+    product_id INTEGER NOT NULL,
+    quantity INTEGER NOT NULL,
+    subtotal NUMERIC NOT NULL,
+    vendor_id INTEGER,
+    category TEXT
+);
+CREATE TABLE deliveries_archive (
+    id INTEGER PRIMARY KEY,
+    order_id INTEGER NOT NULL UNIQUE,
+    delivery_personnel_id INTEGER NOT NULL,
+    status TEXT NOT NULL,
+    tracking_link TEXT,
+    updated_at TIMESTAMP
+);
+CREATE TABLE payments_archive (
+    id INTEGER PRIMARY KEY,
+    order_id INTEGER NOT NULL,
+    amount NUMERIC NOT NULL,
+    payment_method TEXT NOT NULL,
+    payment_status TEXT NOT NULL,
+    stripe_session_id TEXT UNIQUE
+);
+CREATE TABLE courier_locations (
+    delivery_personnel_id INTEGER PRIMARY KEY,
+    latitude NUMERIC NOT NULL,
+    longitude NUMERIC NOT NULL,
+    capacity INTEGER NOT NULL DEFAULT 10,
+    available BOOLEAN DEFAULT 1,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+CREATE TABLE idempotency_keys (
+    user_id INTEGER NOT NULL,
+    idempotency_key TEXT NOT NULL,
+    request_hash TEXT NOT NULL,
+    order_id INTEGER NOT NULL,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (user_id, idempotency_key)
+);
+CREATE TABLE sales_product_daily (
+    day DATE NOT NULL,
+    product_id INTEGER NOT NULL,
+    vendor_id INTEGER NOT NULL,
+    category TEXT NOT NULL DEFAULT '',
+    order_count INTEGER NOT NULL DEFAULT 0,
+    units INTEGER NOT NULL DEFAULT 0,
+    revenue NUMERIC NOT NULL DEFAULT 0,
+    PRIMARY KEY (day, product_id)
+);
+CREATE TABLE sales_vendor_daily (
+    day DATE NOT NULL,
+    vendor_id INTEGER NOT NULL,
+    order_count INTEGER NOT NULL DEFAULT 0,
+    units INTEGER NOT NULL DEFAULT 0,
+    revenue NUMERIC NOT NULL DEFAULT 0,
+    PRIMARY KEY (day, vendor_id)
+);
+CREATE TABLE sales_category_daily (
+    day DATE NOT NULL,
+    category TEXT NOT NULL DEFAULT '',
+    order_count INTEGER NOT NULL DEFAULT 0,
+    units INTEGER NOT NULL DEFAULT 0,
+    revenue NUMERIC NOT NULL DEFAULT 0,
+    PRIMARY KEY (day, category)
+);
+CREATE TABLE sales_daily (
+    day DATE NOT NULL PRIMARY KEY,
+    order_count INTEGER NOT NULL DEFAULT 0,
+    units INTEGER NOT NULL DEFAULT 0,
+    revenue NUMERIC NOT NULL DEFAULT 0
+);
+CREATE TABLE sales_rollup_queue (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    order_id INTEGER NOT NULL,
+    sign INTEGER NOT NULL,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+CREATE TABLE notification_outbox (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    channel TEXT NOT NULL,
+    recipient TEXT NOT NULL,
+    subject TEXT,
+    body TEXT NOT NULL,
+    status TEXT DEFAULT 'Pending',
+    attempts INTEGER NOT NULL DEFAULT 0,
+    next_attempt_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    last_error TEXT,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+"""
+
+_LOCKING_RE = re.compile(r"\s+FOR UPDATE(\s+SKIP LOCKED)?", re.IGNORECASE)
+_UPSERT_VALUES_RE = re.compile(r"\bVALUES\((\w+)\)")
+
+
+def _translate(query):
+    query = _LOCKING_RE.sub("", query).replace("%s", "?")
+    # MySQL upserts become SQLite's ON CONFLICT clause
+    if "ON DUPLICATE KEY UPDATE" in query:
+        head, update = query.split("ON DUPLICATE KEY UPDATE")
+        query = head + "ON CONFLICT DO UPDATE SET" + _UPSERT_VALUES_RE.sub(r"excluded.\1", update)
+    return query
+
+
+# MySQL's UNIX_TIMESTAMP(); SQLite stores CURRENT_TIMESTAMP as UTC text
+def _unix_timestamp(value):
+    if value is None:
+        return None
+    return datetime.fromisoformat(value).replace(tzinfo=timezone.utc).timestamp()
+
+
+class Cursor:
+    def __init__(self, connection, dictionary=False):
+        self._connection = connection
+        self._cursor = connection._db.cursor()
+        self._dictionary = dictionary
+
+    def _wait(self):
+        if self._connection.latency:
+            time.sleep(self._connection.latency)
+        self._connection.round_trips += 1
+
+    def execute(self, query, params=()):
+        self._wait()
+        try:
+            # mysql.connector takes None for no parameters, which is what database.py passes on
+            self._cursor.execute(_translate(query), params or ())
+        except sqlite3.IntegrityError as e:
+            raise IntegrityError(msg=str(e), errno=errorcode.ER_DUP_ENTRY) from e
+
+    def executemany(self, query, seq_params):
+        # mysql.connector folds an INSERT executemany into one statement
+        self._wait()
+        try:
+            self._cursor.executemany(_translate(query), seq_params)
+        except sqlite3.IntegrityError as e:
+            raise IntegrityError(msg=str(e), errno=errorcode.ER_DUP_ENTRY) from e
+
+    def _row(self, row):
+        if row is None or not self._dictionary:
+            return row
+        return {d[0]: v for d, v in zip(self._cursor.description, row)}
+
+    def fetchone(self):
+        return self._row(self._cursor.fetchone())
+
+    def fetchall(self):
+        return [self._row(r) for r in self._cursor.fetchall()]
+
+    @property
+    def column_names(self):
+        return tuple(d[0] for d in self._cursor.description or ())
+
+    @property
+    def lastrowid(self):
+        return self._cursor.lastrowid
+
+    @property
+    def rowcount(self):
+        return self._cursor.rowcount
+
+    def close(self):
+        self._cursor.close()
+
+
+class Connection:
+    def __init__(self, path=":memory:", latency=0.0):
+        self._db = sqlite3.connect(path, check_same_thread=False, detect_types=sqlite3.PARSE_DECLTYPES)
+        self._db.create_function("UNIX_TIMESTAMP", 1, _unix_timestamp, deterministic=True)
+        self.latency = latency
+        self.round_trips = 0
+
+    def cursor(self, dictionary=False):
+        return Cursor(self, dictionary)
+
+    def commit(self):
+        self._db.commit()
+
+    def rollback(self):
+        self._db.rollback()
+
+    # Lets database.ConnectionPool manage stand-in connections
+    @property
+    def in_transaction(self):
+        return self._db.in_transaction
+
+    def ping(self, reconnect=False):
+        pass
+
+    def close(self):
+        pass
+
+
+def connect(path=":memory:", latency=0.0, products=1000):
+    connection = Connection(path, latency)
+    connection._db.executescript(SCHEMA)
+    connection._db.execute(
+        "INSERT INTO users (username, email, password_hash, role, phone_number) VALUES ('customer_user', 'customer@example.com', 'x', 'customer', '')"
+    )
+    connection._db.executemany(
+        "INSERT INTO products (vendor_id, name, description, price, availability, category) VALUES (?, ?, ?, ?, 1, ?)",
+        [(2, f"Product {i}", f"Description {i}", f"{(i % 500) + 0.99:.2f}", f"Category {i % 20}") for i in range(products)],
+    )
+    connection._db.commit()
+    return connection
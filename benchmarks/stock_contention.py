@@ -0,0 +1,136 @@
+"""Many concurrent buyers racing for one SKU through POST /orders/place_order.
+
+Creates a product with --stock units in the configured MySQL database (use the
+database built by benchmarks/seed.py). Then --buyers customers each order one
+unit at the same time, through main.app in-process. Every buyer sends its
+request --attempts times with the same Idempotency-Key, concurrently, the way a
+client that times out and retries would.
+
+Reports latency and outcome counts, then checks the invariants: no overselling
+(orders == initial stock - final stock, never more than the initial stock) and
+exactly one order per buyer that got one.
+
+Usage: python benchmarks/stock_contention.py [--buyers 500] [--stock 100] [--attempts 2]
+"""
+import argparse
+import asyncio
+import os
+import sys
+import time
+import uuid
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import httpx
+
+from main import app
+from database import get_connection
+from auth.auth import create_access_token
+
+
+def setup(buyers, stock):
+    conn = get_connection()
+    cursor = conn.cursor()
+
+    try:
+        cursor.execute("SELECT id, username FROM users WHERE role = 'customer' ORDER BY id LIMIT %s", (buyers,))
+        customers = cursor.fetchall()
+        if len(customers) < buyers:
+            raise SystemExit(f"Need {buyers} customers, found {len(customers)}; run benchmarks/seed.py first")
+        cursor.execute(
+            "INSERT INTO products (vendor_id, name, description, price, availability, category, stock) "
+            "VALUES (%s, %s, %s, %s, %s, %s, %s)",
+            (0, "Contended Item", "Limited stock benchmark product", 9.99, True, "Benchmark", stock)
+        )
+        product_id = cursor.lastrowid
+        conn.commit()
+        return product_id, customers
+
+    finally:
+        cursor.close()
+        conn.close()
+
+
+def outcome(product_id):
+    conn = get_connection()
+    cursor = conn.cursor()
+
+    try:
+        cursor.execute("SELECT stock FROM products WHERE id = %s", (product_id,))
+        final_stock = cursor.fetchone()[0]
+        cursor.execute(
+            "SELECT COUNT(DISTINCT oi.order_id), COUNT(DISTINCT o.customer_id), COALESCE(SUM(oi.quantity), 0) "
+            "FROM order_items oi JOIN orders o ON o.id = oi.order_id WHERE oi.product_id = %s",
+            (product_id,)
+        )
+        orders, customers, units = cursor.fetchone()
+        return final_stock, orders, customers, int(units)
+
+    finally:
+        cursor.close()
+        conn.close()
+
+
+async def run(product_id, customers, attempts):
+    latencies = []
+    statuses = {}
+    order_ids = {}
+    replays = 0
+
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+        async def attempt(customer_id, headers, body):
+            nonlocal replays
+            started = time.perf_counter()
+            response = await client.post("/orders/place_order", json=body, headers=headers)
+            latencies.append(time.perf_counter() - started)
+            statuses[response.status_code] = statuses.get(response.status_code, 0) + 1
+            if response.status_code == 200:
+                order_ids.setdefault(customer_id, set()).add(response.json()["order_id"])
+                replays += response.headers.get("Idempotent-Replayed") == "true"
+
+        async def buyer(customer_id, username):
+            token = create_access_token({"sub": username, "user_id": customer_id, "role": "customer"})
+            headers = {"Authorization": f"Bearer {token}", "Idempotency-Key": str(uuid.uuid4())}
+            body = {"customer_id": customer_id, "products": [{"product_id": product_id, "quantity": 1}]}
+            await asyncio.gather(*(attempt(customer_id, headers, body) for _ in range(attempts)))
+
+        started = time.perf_counter()
+        await asyncio.gather(*(buyer(customer_id, username) for customer_id, username in customers))
+        elapsed = time.perf_counter() - started
+
+    return elapsed, sorted(latencies), statuses, order_ids, replays
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--buyers", type=int, default=500)
+    parser.add_argument("--stock", type=int, default=100)
+    parser.add_argument("--attempts", type=int, default=2, help="Concurrent sends per buyer with the same Idempotency-Key")
+    args = parser.parse_args()
+
+    product_id, customers = setup(args.buyers, args.stock)
+    elapsed, latencies, statuses, order_ids, replays = asyncio.run(run(product_id, customers, args.attempts))
+    final_stock, orders, ordering_customers, units = outcome(product_id)
+
+    def pct(fraction):
+        return latencies[min(len(latencies) - 1, int(fraction * len(latencies)))] * 1000
+
+    print(f"{len(latencies)} requests from {args.buyers} buyers in {elapsed:.2f}s ({len(latencies) / elapsed:,.0f} req/s); "
+          f"p50 {pct(0.50):.1f} ms, p95 {pct(0.95):.1f} ms, p99 {pct(0.99):.1f} ms")
+    print(f"status codes: {dict(sorted(statuses.items()))}; idempotent replays: {replays}")
+    print(f"product {product_id}: stock {args.stock} -> {final_stock}, {orders} orders for {units} units")
+
+    problems = []
+    if units > args.stock or units != args.stock - final_stock:
+        problems.append("oversold or lost stock")
+    if orders != ordering_customers or any(len(ids) != 1 for ids in order_ids.values()):
+        problems.append("duplicate orders for one Idempotency-Key")
+    if orders != min(args.buyers, args.stock):
+        problems.append(f"expected {min(args.buyers, args.stock)} orders")
+    print("FAILED: " + "; ".join(problems) if problems else "OK: no overselling, one order per buyer")
+    sys.exit(1 if problems else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,126 @@
+import os
+import gzip
+from starlette.concurrency import run_in_threadpool
+from starlette.datastructures import Headers, MutableHeaders
+from cache import TTLCache
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+MIN_SIZE = int(os.getenv("COMPRESSION_MIN_SIZE", "1024"))
+GZIP_LEVEL = int(os.getenv("COMPRESSION_GZIP_LEVEL", "6"))
+BROTLI_QUALITY = int(os.getenv("COMPRESSION_BROTLI_QUALITY", "4"))
+# Bodies larger than this are compressed in the threadpool instead of on the event loop
+THREAD_MIN_SIZE = int(os.getenv("COMPRESSION_THREAD_MIN_SIZE", "131072"))
+
+COMPRESSIBLE_TYPES = ("application/json", "text/plain", "text/html", "text/csv")
+
+# Compressed bodies of responses that carry an ETag, per (path, ETag, size, encoding)
+compressed_cache = TTLCache(
+    maxsize=int(os.getenv("COMPRESSION_CACHE_SIZE", "128")),
+    ttl=float(os.getenv("COMPRESSION_CACHE_TTL", "300"))
+)
+
+
+def _accepted(accept_encoding):
+    accepted = set()
+    for part in accept_encoding.lower().split(","):
+        coding, _, params = part.strip().partition(";")
+        quality = params.strip()
+        if quality.startswith("q="):
+            try:
+                if float(quality[2:]) <= 0:
+                    continue
+            except ValueError:
+                continue
+        accepted.add(coding.strip())
+    return accepted
+
+
+def choose_encoding(accept_encoding):
+    accepted = _accepted(accept_encoding)
+    if brotli is not None and ("br" in accepted or "*" in accepted):
+        return "br"
+    if "gzip" in accepted or "*" in accepted:
+        return "gzip"
+    return None
+
+
+def compress(body, encoding):
+    if encoding == "br":
+        return brotli.compress(body, quality=BROTLI_QUALITY)
+    return gzip.compress(body, compresslevel=GZIP_LEVEL, mtime=0)
+
+
+class CompressionMiddleware:
+    """Compresses complete JSON and text responses with brotli (if installed) or gzip.
+
+    Responses smaller than COMPRESSION_MIN_SIZE, already encoded, or streamed
+    (SSE, NDJSON exports; anything sent in several body chunks) pass through
+    unchanged. Compressed bodies of responses with an ETag are cached, so a
+    cached catalog page is compressed once, not on every request.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        encoding = choose_encoding(Headers(scope=scope).get("accept-encoding", ""))
+        start = None
+
+        async def send_wrapper(message):
+            nonlocal start
+            if message["type"] == "http.response.start":
+                start = message
+                return
+            if start is None:
+                await send(message)
+                return
+
+            response_start, start = start, None
+            body = message.get("body", b"")
+            headers = MutableHeaders(raw=list(response_start.get("headers", [])))
+            eligible = (
+                not message.get("more_body", False)
+                and len(body) >= MIN_SIZE
+                and "content-encoding" not in headers
+                and headers.get("content-type", "").split(";")[0].strip() in COMPRESSIBLE_TYPES
+            )
+            if eligible:
+                headers.add_vary_header("Accept-Encoding")
+            if eligible and encoding is not None:
+                body = await self._compressed(scope["path"], body, encoding, headers.get("etag"))
+                headers["Content-Encoding"] = encoding
+                headers["Content-Length"] = str(len(body))
+                # The encoded body is a different representation, so its validator is weak
+                etag = headers.get("etag")
+                if etag and not etag.startswith("W/"):
+                    headers["ETag"] = f"W/{etag}"
+                message = {**message, "body": body}
+
+            await send({**response_start, "headers": headers.raw})
+            await send(message)
+
+        await self.app(scope, receive, send_wrapper)
+
+    async def _compressed(self, path, body, encoding, etag):
+        key = (path, etag, len(body), encoding)
+        if etag:
+            cached = compressed_cache.get(key)
+            if cached is not None:
+                return cached
+
+        if len(body) >= THREAD_MIN_SIZE:
+            compressed = await run_in_threadpool(compress, body, encoding)
+        else:
+            compressed = compress(body, encoding)
+
+        if etag:
+            compressed_cache.set(key, compressed)
+        return compressed
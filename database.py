@@ -1,16 +1,532 @@
 import os
+import time
+import hashlib
+import itertools
+import logging
+import threading
+import contextvars
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 import mysql.connector as conn
 import dotenv
+from starlette.requests import HTTPConnection
+from metrics import db_query_duration, db_checkout_duration, fingerprint
+from cache import TTLCache
+
+logger = logging.getLogger(__name__)
 
 dotenv.load_dotenv()
 
-def get_connection():
-    connection=conn.connect(
-    host='localhost',
-    user='root',
-    password=os.getenv("Password"),
-    database='online_delivery_db'
+DB_CONFIG = {
+    "host": os.getenv("DB_HOST", "localhost"),
+    "port": int(os.getenv("DB_PORT", "3306")),
+    "user": os.getenv("DB_USER", "root"),
+    "password": os.getenv("Password"),
+    "database": os.getenv("DB_NAME", "online_delivery_db"),
+}
+
+# Pool settings
+POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "10"))
+POOL_MAX_OVERFLOW = int(os.getenv("DB_POOL_MAX_OVERFLOW", "10"))
+POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "30"))
+POOL_RECYCLE = float(os.getenv("DB_POOL_RECYCLE", "1800"))
+POOL_PRE_PING = os.getenv("DB_POOL_PRE_PING", "1") == "1"
+# Connections opened per pool at startup, so the first requests do not pay for the handshakes
+POOL_WARM = int(os.getenv("DB_POOL_WARM", str(min(POOL_SIZE, 4))))
+
+# Read replicas: comma-separated host[:port] list, same credentials and database as the primary
+REPLICA_HOSTS = [host.strip() for host in os.getenv("DB_REPLICAS", "").split(",") if host.strip()]
+REPLICA_POOL_SIZE = int(os.getenv("DB_REPLICA_POOL_SIZE", str(POOL_SIZE)))
+# Seconds to wait for a free connection in a replica's pool before trying the next replica or the primary
+REPLICA_POOL_TIMEOUT = float(os.getenv("DB_REPLICA_POOL_TIMEOUT", "0.1"))
+REPLICA_ROUTING = os.getenv("DB_REPLICA_ROUTING", "round_robin")  # or least_latency
+REPLICA_MAX_LAG = float(os.getenv("DB_REPLICA_MAX_LAG", "2"))
+REPLICA_CHECK_INTERVAL = float(os.getenv("DB_REPLICA_CHECK_INTERVAL", "1"))
+# Seconds to open a replica connection / to wait on a read or write, so an unreachable
+# replica fails fast instead of hanging the request (mysql-connector waits forever by default)
+REPLICA_CONNECT_TIMEOUT = int(os.getenv("DB_REPLICA_CONNECT_TIMEOUT", "2"))
+REPLICA_READ_TIMEOUT = int(os.getenv("DB_REPLICA_READ_TIMEOUT", "5"))
+# After a user's own write, that user's reads go to the primary for this long
+READ_YOUR_WRITES_SECONDS = float(os.getenv("DB_READ_YOUR_WRITES_SECONDS", "5"))
+
+
+class PoolTimeout(Exception):
+    pass
+
+
+class TimedCursor:
+    """Cursor proxy that records execute/executemany latency per statement fingerprint."""
+
+    def __init__(self, raw):
+        self._raw = raw
+
+    def __getattr__(self, name):
+        return getattr(self._raw, name)
+
+    def __iter__(self):
+        return iter(self._raw)
+
+    def execute(self, operation, params=None, *args, **kwargs):
+        started = time.perf_counter()
+        try:
+            return self._raw.execute(operation, params, *args, **kwargs)
+        finally:
+            db_query_duration.observe(time.perf_counter() - started, fingerprint(operation))
+
+    def executemany(self, operation, seq_params, *args, **kwargs):
+        started = time.perf_counter()
+        try:
+            return self._raw.executemany(operation, seq_params, *args, **kwargs)
+        finally:
+            db_query_duration.observe(time.perf_counter() - started, fingerprint(operation))
+
+
+class PooledConnection:
+    """Wraps a mysql connection so that close() hands it back to the pool."""
+
+    def __init__(self, pool, raw):
+        self._pool = pool
+        self._raw = raw
+        self.created_at = time.monotonic()
+
+    def __getattr__(self, name):
+        return getattr(self._raw, name)
+
+    def cursor(self, *args, **kwargs):
+        return TimedCursor(self._raw.cursor(*args, **kwargs))
+
+    def commit(self):
+        self._raw.commit()
+        if self._pool is not None and self._pool.on_commit is not None:
+            self._pool.on_commit()
+
+    def close(self):
+        if self._pool is not None:
+            pool, self._pool = self._pool, None
+            pool._release(self)
+
+
+class ConnectionPool:
+    def __init__(self, config, size=POOL_SIZE, max_overflow=POOL_MAX_OVERFLOW,
+                 timeout=POOL_TIMEOUT, recycle=POOL_RECYCLE, pre_ping=POOL_PRE_PING, on_commit=None):
+        self.config = config
+        self.size = size
+        self.max_overflow = max_overflow
+        self.timeout = timeout
+        self.recycle = recycle
+        self.pre_ping = pre_ping
+        self.on_commit = on_commit
+
+        self._idle = deque()
+        self._lock = threading.Condition()
+        self._open = 0
+        self._in_use = 0
+        self._checkouts = 0
+        self._waits = 0
+        self._wait_time = 0.0
+        self._max_wait = 0.0
+        self._recycled = 0
+        self._timeouts = 0
+
+    def _connect(self):
+        return conn.connect(**self.config)
+
+    def _is_stale(self, raw, created_at):
+        if self.recycle and time.monotonic() - created_at > self.recycle:
+            return True
+        if self.pre_ping:
+            try:
+                raw.ping(reconnect=False)
+            except conn.Error:
+                return True
+        return False
+
+    def _discard(self, raw):
+        try:
+            raw.close()
+        except conn.Error:
+            pass
+
+    def acquire(self):
+        started = time.monotonic()
+        deadline = started + self.timeout
+        waited = False
+
+        with self._lock:
+            while True:
+                if self._idle:
+                    raw, created_at = self._idle.pop()
+                    self._in_use += 1
+                    break
+                if self._open < self.size + self.max_overflow:
+                    raw, created_at = None, None
+                    self._open += 1
+                    self._in_use += 1
+                    break
+
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self._timeouts += 1
+                    raise PoolTimeout(f"No database connection available after {self.timeout}s")
+                waited = True
+                self._lock.wait(remaining)
+
+            wait_time = time.monotonic() - started
+            db_checkout_duration.observe(wait_time)
+            self._checkouts += 1
+            if waited:
+                self._waits += 1
+                self._wait_time += wait_time
+                self._max_wait = max(self._max_wait, wait_time)
+
+        # Network work happens outside the lock
+        try:
+            if raw is not None and self._is_stale(raw, created_at):
+                self._discard(raw)
+                with self._lock:
+                    self._recycled += 1
+                raw = None
+            if raw is None:
+                raw = self._connect()
+                created_at = time.monotonic()
+        except Exception:
+            with self._lock:
+                self._open -= 1
+                self._in_use -= 1
+                self._lock.notify()
+            raise
+
+        pooled = PooledConnection(self, raw)
+        pooled.created_at = created_at
+        return pooled
+
+    def _release(self, pooled):
+        raw = pooled._raw
+        keep = True
+        try:
+            if raw.in_transaction:
+                raw.rollback()
+        except conn.Error:
+            keep = False
+
+        with self._lock:
+            self._in_use -= 1
+            if keep and len(self._idle) < self.size:
+                self._idle.append((raw, pooled.created_at))
+                raw = None
+            else:
+                self._open -= 1
+            self._lock.notify()
+
+        if raw is not None:
+            self._discard(raw)
+
+    def warm(self, count):
+        """Open connections in parallel until count (at most size) are idle; returns how many were opened."""
+        with self._lock:
+            missing = min(count, self.size) - len(self._idle)
+        if missing <= 0:
+            return 0
+
+        with ThreadPoolExecutor(max_workers=missing) as executor:
+            futures = [executor.submit(self.acquire) for _ in range(missing)]
+        connections = []
+        error = None
+        for future in futures:
+            try:
+                connections.append(future.result())
+            except Exception as e:
+                error = e
+        for connection in connections:
+            connection.close()
+        if error is not None:
+            raise error
+        return len(connections)
+
+    def dispose(self):
+        with self._lock:
+            idle = list(self._idle)
+            self._idle.clear()
+            self._open -= len(idle)
+        for raw, _ in idle:
+            self._discard(raw)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "size": self.size,
+                "max_overflow": self.max_overflow,
+                "open": self._open,
+                "in_use": self._in_use,
+                "idle": len(self._idle),
+                "checkouts": self._checkouts,
+                "waits": self._waits,
+                "total_wait_time": round(self._wait_time, 6),
+                "avg_wait_time": round(self._wait_time / self._waits, 6) if self._waits else 0.0,
+                "max_wait_time": round(self._max_wait, 6),
+                "recycled": self._recycled,
+                "timeouts": self._timeouts,
+            }
+
+
+class Replica:
+    def __init__(self, host, pool):
+        self.host = host
+        self.pool = pool
+        # Out of rotation until its first health check passes
+        self.healthy = False
+        self.lag = None
+        self.latency = None
+        self.error = "Not checked yet"
+        # Connection of its own for health checks, so they never wait for a pool slot
+        self.probe = None
+
+
+class ReplicaSet:
+    """Routes reads to healthy replicas, round-robin or to the lowest-latency one.
+
+    Health is checked every check_interval seconds by a background thread (start()),
+    never on a request. A replica is skipped while replication is stopped, it lags
+    by more than max_lag seconds, or it cannot be reached. With no healthy replica,
+    reads fail over to the primary.
+    """
+
+    def __init__(self, replicas, primary, routing=REPLICA_ROUTING, max_lag=REPLICA_MAX_LAG,
+                 check_interval=REPLICA_CHECK_INTERVAL):
+        self.replicas = replicas
+        self.primary = primary
+        self.routing = routing
+        self.max_lag = max_lag
+        self.check_interval = check_interval
+        self._next = itertools.count()
+        self._check_lock = threading.Lock()
+        self._stopped = threading.Event()
+        self._thread = None
+        self._stats_lock = threading.Lock()
+        self.replica_reads = 0
+        self.primary_reads = 0
+        self.sticky_reads = 0
+
+    def count(self, name):
+        with self._stats_lock:
+            setattr(self, name, getattr(self, name) + 1)
+
+    # Seconds the replica is behind its source, or None if replication is not running
+    def _probe(self, connection):
+        cursor = connection.cursor(dictionary=True)
+        try:
+            try:
+                cursor.execute("SHOW REPLICA STATUS")
+                key = "Seconds_Behind_Source"
+            except conn.Error:
+                cursor.execute("SHOW SLAVE STATUS")
+                key = "Seconds_Behind_Master"
+            status = cursor.fetchone()
+            return None if not status or status[key] is None else float(status[key])
+        finally:
+            cursor.close()
+
+    def _close_probe(self, replica):
+        probe, replica.probe = replica.probe, None
+        if probe is not None:
+            try:
+                probe.close()
+            except Exception:
+                pass
+
+    def _check(self, replica):
+        try:
+            if replica.probe is None:
+                replica.probe = replica.pool._connect()
+            started = time.perf_counter()
+            lag = self._probe(replica.probe)
+        except (conn.Error, OSError) as e:
+            self._close_probe(replica)
+            replica.healthy, replica.lag, replica.error = False, None, str(e)
+            return
+
+        elapsed = time.perf_counter() - started
+        replica.latency = elapsed if replica.latency is None else 0.8 * replica.latency + 0.2 * elapsed
+        replica.lag = lag
+        replica.error = None if lag is not None else "Replication is not running"
+        replica.healthy = lag is not None and lag <= self.max_lag
+
+    # Check every replica once
+    def refresh(self):
+        with self._check_lock:
+            for replica in self.replicas:
+                was_healthy = replica.healthy
+                self._check(replica)
+                if was_healthy and not replica.healthy:
+                    logger.warning("Replica %s taken out of rotation: lag=%s error=%s", replica.host, replica.lag, replica.error)
+                elif replica.healthy and not was_healthy:
+                    logger.info("Replica %s back in rotation", replica.host)
+
+    def _run(self):
+        while not self._stopped.is_set():
+            try:
+                self.refresh()
+            except Exception:
+                logger.exception("Replica health check failed")
+            self._stopped.wait(self.check_interval)
+        for replica in self.replicas:
+            self._close_probe(replica)
+
+    # Start the health check thread; called once at startup
+    def start(self):
+        if self.replicas and self._thread is None:
+            self._stopped.clear()
+            self._thread = threading.Thread(target=self._run, name="replica-health", daemon=True)
+            self._thread.start()
+
+    # Does not wait for a check in progress; the thread exits after it
+    def stop(self):
+        self._stopped.set()
+        self._thread = None
+
+    def _candidates(self):
+        healthy = [replica for replica in self.replicas if replica.healthy]
+        if self.routing == "least_latency":
+            return sorted(healthy, key=lambda replica: replica.latency if replica.latency is not None else float("inf"))
+        if not healthy:
+            return healthy
+        start = next(self._next) % len(healthy)
+        return healthy[start:] + healthy[:start]
+
+    def acquire(self):
+        for replica in self._candidates():
+            try:
+                connection = replica.pool.acquire()
+                self.count("replica_reads")
+                return connection
+            except PoolTimeout:
+                # Busy, not broken: it stays in rotation (pool stats count the timeouts)
+                continue
+            except conn.Error as e:
+                replica.healthy, replica.error = False, str(e)
+                logger.warning("Replica %s unavailable, trying the next one: %s", replica.host, e)
+        self.count("primary_reads")
+        return self.primary.acquire()
+
+    def dispose(self):
+        for replica in self.replicas:
+            replica.pool.dispose()
+
+    def stats(self):
+        with self._stats_lock:
+            reads = {
+                "replica_reads": self.replica_reads,
+                "primary_reads": self.primary_reads,
+                "sticky_reads": self.sticky_reads,
+            }
+        return {
+            "routing": self.routing,
+            **reads,
+            "replicas": [
+                {
+                    "host": replica.host,
+                    "healthy": replica.healthy,
+                    "lag": replica.lag,
+                    "latency_ms": round(replica.latency * 1000, 3) if replica.latency is not None else None,
+                    "error": replica.error,
+                    "pool": replica.pool.stats(),
+                }
+                for replica in self.replicas
+            ],
+        }
+
+
+# Read-your-writes: the session (the request's bearer token) of every commit on the primary is
+# remembered for READ_YOUR_WRITES_SECONDS, and that session's reads stay on the primary meanwhile
+_session = contextvars.ContextVar("db_session", default=None)
+recent_writers = TTLCache(maxsize=100000, ttl=READ_YOUR_WRITES_SECONDS)
+
+
+def _note_write():
+    session = _session.get()
+    if session is not None:
+        recent_writers.set(session, True)
+
+
+def _replica_config(host):
+    name, _, port = host.partition(":")
+    return {
+        **DB_CONFIG,
+        "host": name,
+        "port": int(port or DB_CONFIG["port"]),
+        "connection_timeout": REPLICA_CONNECT_TIMEOUT,
+        "read_timeout": REPLICA_READ_TIMEOUT,
+        "write_timeout": REPLICA_READ_TIMEOUT,
+    }
+
+
+pool = ConnectionPool(DB_CONFIG, on_commit=_note_write)
+replicas = ReplicaSet(
+    [Replica(host, ConnectionPool(_replica_config(host), size=REPLICA_POOL_SIZE, timeout=REPLICA_POOL_TIMEOUT))
+     for host in REPLICA_HOSTS],
+    pool
 )
-    return connection
 
 
+def get_connection():
+    return pool.acquire()
+
+
+def get_read_connection():
+    if not replicas.replicas:
+        return pool.acquire()
+    session = _session.get()
+    if session is not None and recent_writers.get(session):
+        replicas.count("sticky_reads")
+        return pool.acquire()
+    return replicas.acquire()
+
+
+# App-wide dependency: identifies the caller so their own writes can be read back from the primary.
+# It must stay async so the context variable is set in the request's own context
+async def bind_session(connection: HTTPConnection):
+    authorization = connection.headers.get("authorization")
+    _session.set(hashlib.sha256(authorization.encode("utf-8")).digest() if authorization else None)
+
+
+# FastAPI dependency: checks a connection out for the request and returns it afterwards
+def get_db():
+    connection = get_connection()
+    try:
+        yield connection
+    finally:
+        connection.close()
+
+
+# FastAPI dependency for read-only handlers: a replica connection unless the caller just wrote
+def get_read_db():
+    connection = get_read_connection()
+    try:
+        yield connection
+    finally:
+        connection.close()
+
+
+# Remaining rows of a plain (tuple) cursor as dicts. A dictionary=True cursor rebuilds
+# the column-name tuple for every row; this builds it once per result set
+def fetch_dicts(cursor):
+    columns = cursor.column_names
+    return [dict(zip(columns, row)) for row in cursor.fetchall()]
+
+
+# Open POOL_WARM connections to the primary and to each replica; called once at startup
+def warm_pools():
+    opened = pool.warm(POOL_WARM)
+    for replica in replicas.replicas:
+        try:
+            opened += replica.pool.warm(POOL_WARM)
+        except (conn.Error, PoolTimeout) as e:
+            logger.warning("Could not warm up replica %s: %s", replica.host, e)
+    return opened
+
+def pool_stats():
+    return pool.stats()
+
+
+def replica_stats():
+    return replicas.stats()
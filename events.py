@@ -0,0 +1,181 @@
+import os
+import json
+import asyncio
+import logging
+
+logger = logging.getLogger(__name__)
+
+MAX_SUBSCRIBERS = int(os.getenv("EVENTS_MAX_SUBSCRIBERS", "50000"))
+REDIS_CHANNEL_PREFIX = "events:"
+
+
+class TooManySubscribers(Exception):
+    pass
+
+
+class Subscription:
+    """A subscriber's mailbox.
+
+    Only the latest event per (topic, event type) is kept, so a burst of status
+    changes is coalesced into the final state and an idle or slow subscriber
+    holds at most one pending event of each kind per topic.
+    """
+
+    __slots__ = ("topics", "_pending", "_wakeup")
+
+    def __init__(self, topics):
+        self.topics = tuple(topics)
+        self._pending = {}
+        self._wakeup = asyncio.Event()
+
+    def deliver(self, topic, event):
+        self._pending[(topic, event.get("type"))] = event
+        self._wakeup.set()
+
+    async def next(self, timeout=None):
+        """Wait for pending events; returns an empty list if the timeout expires first."""
+        if not self._pending:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout)
+            except asyncio.TimeoutError:
+                return []
+        self._wakeup.clear()
+        events = list(self._pending.values())
+        self._pending.clear()
+        return events
+
+
+class EventBus:
+    """In-process publish/subscribe bus.
+
+    publish() may be called from worker threads (sync route handlers); delivery
+    always happens on the event loop the bus was started on.
+    """
+
+    def __init__(self, max_subscribers=MAX_SUBSCRIBERS):
+        self.max_subscribers = max_subscribers
+        self._topics = {}
+        self._count = 0
+        self._loop = None
+        self.published = 0
+        self.delivered = 0
+
+    async def start(self):
+        self._loop = asyncio.get_running_loop()
+
+    async def stop(self):
+        self._loop = None
+
+    def subscribe(self, topics):
+        if self._count >= self.max_subscribers:
+            raise TooManySubscribers()
+        subscription = Subscription(topics)
+        for topic in subscription.topics:
+            self._topics.setdefault(topic, set()).add(subscription)
+        self._count += 1
+        return subscription
+
+    def full(self):
+        return self._count >= self.max_subscribers
+
+    def unsubscribe(self, subscription):
+        for topic in subscription.topics:
+            subscribers = self._topics.get(topic)
+            if subscribers is not None:
+                subscribers.discard(subscription)
+                if not subscribers:
+                    del self._topics[topic]
+        self._count -= 1
+
+    def publish(self, topic, event):
+        self.published += 1
+        self._call_on_loop(self._dispatch, topic, event)
+
+    def _call_on_loop(self, func, *args):
+        loop = self._loop
+        if loop is None:
+            return
+        try:
+            running = asyncio.get_running_loop()
+        except RuntimeError:
+            running = None
+        if running is loop:
+            func(*args)
+        else:
+            loop.call_soon_threadsafe(func, *args)
+
+    def _dispatch(self, topic, event):
+        for subscription in self._topics.get(topic, ()):
+            subscription.deliver(topic, event)
+            self.delivered += 1
+
+    def stats(self):
+        return {
+            "backend": "memory",
+            "subscribers": self._count,
+            "topics": len(self._topics),
+            "published": self.published,
+            "delivered": self.delivered,
+        }
+
+
+class RedisEventBus(EventBus):
+    """Fans events out through Redis pub/sub so every worker sees every event."""
+
+    def __init__(self, url, max_subscribers=MAX_SUBSCRIBERS):
+        super().__init__(max_subscribers)
+        self.url = url
+        self._redis = None
+        self._listener = None
+
+    async def start(self):
+        import redis.asyncio as redis
+
+        await super().start()
+        self._redis = redis.from_url(self.url)
+        pubsub = self._redis.pubsub()
+        await pubsub.psubscribe(REDIS_CHANNEL_PREFIX + "*")
+        self._listener = asyncio.create_task(self._listen(pubsub))
+
+    async def stop(self):
+        if self._listener is not None:
+            self._listener.cancel()
+            try:
+                await self._listener
+            except asyncio.CancelledError:
+                pass
+            self._listener = None
+        if self._redis is not None:
+            await self._redis.aclose()
+            self._redis = None
+        await super().stop()
+
+    async def _listen(self, pubsub):
+        async for message in pubsub.listen():
+            if message["type"] != "pmessage":
+                continue
+            topic = message["channel"].decode("utf-8")[len(REDIS_CHANNEL_PREFIX):]
+            self._dispatch(topic, json.loads(message["data"]))
+
+    def publish(self, topic, event):
+        self.published += 1
+        self._call_on_loop(self._schedule_publish, topic, json.dumps(event, default=str))
+
+    def _schedule_publish(self, topic, payload):
+        task = asyncio.ensure_future(self._redis.publish(REDIS_CHANNEL_PREFIX + topic, payload))
+        task.add_done_callback(self._log_failure)
+
+    @staticmethod
+    def _log_failure(task):
+        if not task.cancelled() and task.exception() is not None:
+            logger.error("Failed to publish event to Redis: %s", task.exception())
+
+    def stats(self):
+        return {**super().stats(), "backend": "redis"}
+
+
+def order_topic(order_id):
+    return f"order:{order_id}"
+
+
+bus = RedisEventBus(os.environ["REDIS_URL"]) if os.getenv("REDIS_URL") else EventBus()
@@ -0,0 +1,29 @@
+import threading
+
+
+class Lazy:
+    """A value built by factory() on first use, once, even when several threads ask at the same time.
+
+    Used for external service clients, so a worker starts without importing their
+    SDKs or reading their credentials until the first call that needs them.
+    """
+
+    def __init__(self, factory):
+        self._factory = factory
+        self._value = None
+        self._lock = threading.Lock()
+        self.created = False
+
+    def get(self):
+        if not self.created:
+            with self._lock:
+                if not self.created:
+                    self._value = self._factory()
+                    self.created = True
+        return self._value
+
+    # Replace the value, e.g. with a stub in benchmarks
+    def set(self, value):
+        with self._lock:
+            self._value = value
+            self.created = True
@@ -1,17 +1,114 @@
-from fastapi import FastAPI
-from routers import products, orders, deliveries, payments
+import os
+import logging
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, Depends
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import PlainTextResponse
+from routers import products, orders, deliveries, payments, search, tracking, analytics
 from auth import auth
+from database import pool, pool_stats, replicas, replica_stats, bind_session, warm_pools
+from routers.notifications import dispatcher
+from migrate import apply_migrations
+from events import bus
+from metrics import registry, MetricsMiddleware, label_routes
+from compression import CompressionMiddleware, compressed_cache
+from responses import ORJSONResponse
+from routers.products import catalog_cache
+from auth.auth import token_cache, get_current_user
+from auth.permission import check_role
+from routers.payments import payment_status_cache, payment_writer, close_stripe_client
+from routers.analytics import analytics_cache
+from routers.deliveries import route_cache
+from archive import archiver
+from analytics import rollup_worker
 
-app = FastAPI()
+logger = logging.getLogger(__name__)
 
-app.include_router(auth.router, prefix="/auth", tags=["Authentication"])
-app.include_router(products.router, prefix="/products", tags=["Products"])
-app.include_router(orders.router, prefix="/orders", tags=["Orders"])
-app.include_router(deliveries.router, prefix="/deliveries", tags=["Deliveries"])
-app.include_router(payments.router, prefix="/payments", tags=["Payments"])
+# Startup and shutdown. External service clients (Stripe, Twilio, SMTP) are not created here:
+# they are built on first use, so a new worker is ready as soon as its database pool is
+@asynccontextmanager
+async def lifespan(app):
+    # Apply pending schema migrations (or run `python migrate.py` as a deploy step instead)
+    if os.getenv("MIGRATE_ON_STARTUP", "0") == "1":
+        await run_in_threadpool(apply_migrations)
 
+    try:
+        await run_in_threadpool(warm_pools)
+    except Exception as e:
+        logger.warning("Could not warm up the database pool: %s", e)
+    # Replica lag and reachability are checked in a background thread, not on requests
+    replicas.start()
+
+    # Event bus for live tracking, and the worker that drains the notification outbox
+    # (disable the worker with NOTIFICATION_WORKER=0 when running `python -m routers.notifications` separately)
+    await bus.start()
+    if os.getenv("NOTIFICATION_WORKER", "1") == "1":
+        dispatcher.start()
+    # Applies queued order placements and cancellations to the sales rollups (see analytics.py)
+    if os.getenv("ROLLUP_WORKER", "1") == "1":
+        rollup_worker.start()
+    # Moves completed orders older than ARCHIVE_AFTER_DAYS to the archive tables (see archive.py);
+    # off by default, set ARCHIVE_WORKER=1 on exactly one process
+    if os.getenv("ARCHIVE_WORKER", "0") == "1":
+        archiver.start()
+
+    yield
+
+    await archiver.stop()
+    await rollup_worker.stop()
+    await dispatcher.stop()
+    await payment_writer.stop()
+    await close_stripe_client()
+    await bus.stop()
+    replicas.stop()
+    pool.dispose()
+    replicas.dispose()
+
+
+# orjson renders untyped responses; routes with a response_model are serialized by Pydantic directly
+app = FastAPI(lifespan=lifespan, default_response_class=ORJSONResponse, dependencies=[Depends(bind_session)])
+# Metrics stays the outermost layer, so its timings include compression
+app.add_middleware(CompressionMiddleware)
+app.add_middleware(MetricsMiddleware)
+
+registry.gauges("db_pool", pool_stats)
+registry.gauges("db_replicas", replica_stats)
+registry.gauges("catalog_cache", catalog_cache.stats)
+registry.gauges("token_cache", token_cache.stats)
+registry.gauges("events", bus.stats)
+registry.gauges("payment_cache", payment_status_cache.stats)
+registry.gauges("analytics_cache", analytics_cache.stats)
+registry.gauges("compression_cache", compressed_cache.stats)
+registry.gauges("route_cache", route_cache.stats)
+
+ROUTERS = [
+    (auth.router, "/auth", "Authentication"),
+    (products.router, "/products", "Products"),
+    (orders.router, "/orders", "Orders"),
+    (deliveries.router, "/deliveries", "Deliveries"),
+    (payments.router, "/payments", "Payments"),
+    (search.router, "/search", "Search"),
+    (tracking.router, "/tracking", "Tracking"),
+    (analytics.router, "/analytics", "Analytics"),
+]
+# Request metrics are labelled with the full path template, prefix included
+for router, prefix, tag in ROUTERS:
+    app.include_router(router, prefix=prefix, tags=[tag])
+    label_routes(router, prefix)
 
 
 @app.get("/")
 def home():
     return {"message": "Welcome to Online Delivery System"}
+
+# Connection pool statistics (in-use, idle, wait time), plus replica health and routing counters (Admin only)
+@app.get("/db/pool")
+def db_pool_stats(user: dict = Depends(get_current_user)):
+    check_role(user, ["admin"])
+    return {**pool_stats(), "read_replicas": replica_stats()}
+
+# Prometheus metrics: latency histograms per route, SQL statement and external call, plus pool/cache gauges (Admin only)
+@app.get("/metrics", response_class=PlainTextResponse)
+def metrics(user: dict = Depends(get_current_user)):
+    check_role(user, ["admin"])
+    return PlainTextResponse(registry.render(), media_type="text/plain; version=0.0.4")
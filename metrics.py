@@ -0,0 +1,258 @@
+import os
+import re
+import sys
+import time
+import bisect
+import logging
+import threading
+from contextlib import contextmanager
+from functools import lru_cache
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# Beyond this many label combinations a histogram folds new ones into "other"
+MAX_SERIES = int(os.getenv("METRICS_MAX_SERIES", "1000"))
+
+PROFILING_ENABLED = os.getenv("PROFILING_ENABLED", "0") == "1"
+PROFILE_DIR = os.getenv("PROFILE_DIR", "profiles")
+PROFILE_SLOW_SECONDS = float(os.getenv("PROFILE_SLOW_SECONDS", "0.5"))
+PROFILE_INTERVAL = float(os.getenv("PROFILE_INTERVAL", "0.005"))
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+class Histogram:
+    def __init__(self, name, help_text, label_names, buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = tuple(label_names)
+        self.buckets = tuple(buckets)
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, *labels):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                if len(self._series) >= MAX_SERIES:
+                    labels = ("other",) * len(self.label_names)
+                    series = self._series.get(labels)
+                if series is None:
+                    series = self._series[labels] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+
+    @contextmanager
+    def time(self, *labels):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, *labels)
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            series = [(labels, list(counts), total, count) for labels, (counts, total, count) in self._series.items()]
+        for labels, counts, total, count in sorted(series):
+            base = ",".join(f'{name}="{_escape(value)}"' for name, value in zip(self.label_names, labels))
+            prefix = base + "," if base else ""
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, counts):
+                cumulative += bucket_count
+                lines.append(f'{self.name}_bucket{{{prefix}le="{bound}"}} {cumulative}')
+            lines.append(f'{self.name}_bucket{{{prefix}le="+Inf"}} {count}')
+            lines.append(f"{self.name}_sum{{{base}}} {total}")
+            lines.append(f"{self.name}_count{{{base}}} {count}")
+        return "\n".join(lines)
+
+
+class Registry:
+    def __init__(self):
+        self._histograms = []
+        self._gauge_sources = []
+
+    def histogram(self, name, help_text, label_names=(), buckets=DEFAULT_BUCKETS):
+        histogram = Histogram(name, help_text, label_names, buckets)
+        self._histograms.append(histogram)
+        return histogram
+
+    def gauges(self, prefix, source):
+        """Expose every numeric value of source() (a dict) as a gauge named prefix_key."""
+        self._gauge_sources.append((prefix, source))
+
+    def render(self):
+        parts = [histogram.render() for histogram in self._histograms]
+        for prefix, source in self._gauge_sources:
+            for key, value in source().items():
+                if isinstance(value, (int, float)) and not isinstance(value, bool):
+                    parts.append(f"# TYPE {prefix}_{key} gauge\n{prefix}_{key} {value}")
+        return "\n".join(parts) + "\n"
+
+
+registry = Registry()
+
+http_request_duration = registry.histogram(
+    "http_request_duration_seconds", "HTTP request latency by route", ("method", "route", "status")
+)
+db_query_duration = registry.histogram(
+    "db_query_duration_seconds", "SQL statement latency by statement fingerprint", ("statement",)
+)
+db_checkout_duration = registry.histogram(
+    "db_pool_checkout_seconds", "Time spent waiting for a pooled database connection"
+)
+external_call_duration = registry.histogram(
+    "external_call_duration_seconds", "Latency of calls to external services", ("service", "operation", "outcome")
+)
+
+
+@contextmanager
+def external_call(service, operation):
+    started = time.perf_counter()
+    outcome = "error"
+    try:
+        yield
+        outcome = "ok"
+    finally:
+        external_call_duration.observe(time.perf_counter() - started, service, operation, outcome)
+
+
+_STRING_RE = re.compile(r"'(?:[^'\\]|\\.)*'")
+_NUMBER_RE = re.compile(r"\b\d+(?:\.\d+)?\b")
+_LIST_RE = re.compile(r"\((?:\s*\?\s*,)*\s*\?\s*\)")
+_VALUES_RE = re.compile(r"(VALUES\s*\(\.\.\.\))(?:\s*,\s*\(\.\.\.\))+", re.IGNORECASE)
+_SPACE_RE = re.compile(r"\s+")
+
+
+# Collapse literals, placeholders and IN/VALUES lists so one query shape maps to one series
+@lru_cache(maxsize=2048)
+def fingerprint(sql):
+    text = _SPACE_RE.sub(" ", sql.strip())
+    text = _STRING_RE.sub("?", text)
+    text = text.replace("%s", "?")
+    text = _NUMBER_RE.sub("?", text)
+    text = _LIST_RE.sub("(...)", text)
+    text = _VALUES_RE.sub(r"\1", text)
+    return text[:200]
+
+
+class SamplingProfiler:
+    """Samples every thread's Python stack at a fixed interval.
+
+    Samples are aggregated as collapsed stacks ("frame;frame;frame count"), the
+    input format of flamegraph tools. The whole process is sampled, so
+    concurrent requests show up in each other's profiles.
+    """
+
+    def __init__(self, interval=PROFILE_INTERVAL):
+        self.interval = interval
+        self.stacks = {}
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="sampling-profiler", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self):
+        own_id = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own_id:
+                    continue
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})")
+                    frame = frame.f_back
+                key = ";".join(reversed(stack))
+                self.stacks[key] = self.stacks.get(key, 0) + 1
+
+    def dump(self, path):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with open(path, "w") as f:
+            for stack, count in sorted(self.stacks.items(), key=lambda item: -item[1]):
+                f.write(f"{stack} {count}\n")
+
+
+# id(route) -> full path template, for routes of routers included under a prefix. The route
+# the router puts in the ASGI scope only knows its path within the router ("/list"), which
+# would mix /products/list and /orders/list in one series
+_route_labels = {}
+_labelled = {}
+
+
+def label_routes(router, prefix=""):
+    """Label router's routes with their full path (prefix + path) in the request metrics.
+
+    Call with the same prefix the router is included under. Two routes that would share a
+    method and label raise ValueError, so endpoints never share a series.
+    """
+    for route in router.routes:
+        path = getattr(route, "path", None)
+        if path is None:
+            continue
+        label = prefix + path
+        for method in getattr(route, "methods", None) or ("*",):
+            other = _labelled.setdefault((method, label), route)
+            if other is not route:
+                raise ValueError(f"Routes {other.name!r} and {route.name!r} would both be recorded as {method} {label}")
+        _route_labels[id(route)] = label
+
+
+def route_label(route):
+    if route is None:
+        return "unmatched"
+    return _route_labels.get(id(route), route.path)
+
+
+class MetricsMiddleware:
+    """Records per-route latency; profiles requests that send an X-Profile header when enabled."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status = 500
+
+        async def send_wrapper(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        profiler = None
+        if PROFILING_ENABLED and any(name == b"x-profile" for name, _ in scope["headers"]):
+            profiler = SamplingProfiler()
+            profiler.start()
+
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            elapsed = time.perf_counter() - started
+            route_path = route_label(scope.get("route"))
+            http_request_duration.observe(elapsed, scope["method"], route_path, str(status))
+
+            if profiler is not None:
+                profiler.stop()
+                if elapsed >= PROFILE_SLOW_SECONDS:
+                    name = f"{time.strftime('%Y%m%d-%H%M%S')}-{scope['method']}{route_path}".replace("/", "_")
+                    path = os.path.join(PROFILE_DIR, f"{name}.folded")
+                    profiler.dump(path)
+                    logger.warning("Slow request %s %s took %.3fs; profile written to %s",
+                                   scope["method"], scope["path"], elapsed, path)
@@ -0,0 +1,133 @@
+import os
+import sys
+import logging
+from mysql.connector import Error, errorcode
+from database import get_connection
+
+logger = logging.getLogger(__name__)
+
+MIGRATIONS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "migrations")
+
+# MySQL DDL commits as it goes, so a migration that failed partway leaves some of its statements
+# applied. On the re-run, those fail with one of these errors and are skipped
+ALREADY_APPLIED_ERRORS = {errorcode.ER_TABLE_EXISTS_ERROR, errorcode.ER_DUP_FIELDNAME, errorcode.ER_DUP_KEYNAME}
+
+
+# The routers' hot queries, as they issue them, that must be served by an index (checked with EXPLAIN)
+def hot_queries():
+    # Imported here so applying migrations does not load the routers
+    from routers.orders import CART_PRODUCTS_QUERY, ORDER_ITEMS_QUERY, PAGE_ITEMS_QUERY, _order_filters, _orders_page_query
+    from routers.deliveries import COURIER_EXISTS_QUERY, DELIVERY_QUERY, COURIER_DELIVERIES_QUERY, ACTIVE_DELIVERY_STATUSES
+    from routers.payments import PAYMENT_STATUS_QUERY
+    from routers.products import PRODUCT_FIELDS, _catalog_query
+    from search_index import VERSION_QUERY
+
+    customer = {"user_id": 1, "role": "customer"}
+    statuses = ", ".join(["%s"] * len(ACTIVE_DELIVERY_STATUSES))
+    queries = [
+        ("product prices for cart", CART_PRODUCTS_QUERY.format(placeholders="%s, %s"), (1, 2)),
+        ("orders by customer", *_orders_page_query(*_order_filters(customer, None, None, None, None), None, 51)),
+        ("delivery personnel check", COURIER_EXISTS_QUERY, (1,)),
+        ("deliveries by courier", COURIER_DELIVERIES_QUERY.format(placeholders=statuses), (1, *ACTIVE_DELIVERY_STATUSES)),
+        ("products by category", *_catalog_query({"category": "Electronics"}, None, 100, PRODUCT_FIELDS)),
+        ("products by price", *_catalog_query({"min_price": 10, "max_price": 20}, None, 100, PRODUCT_FIELDS)),
+        ("search index version", VERSION_QUERY, ()),
+    ]
+    for suffix in ("", "_archive"):
+        queries += [
+            (f"order items by order{suffix}", ORDER_ITEMS_QUERY.format(suffix=suffix), (1,)),
+            (f"page items{suffix}", PAGE_ITEMS_QUERY.format(suffix=suffix, placeholders="%s, %s"), (1, 2)),
+            (f"delivery by order{suffix}", DELIVERY_QUERY.format(suffix=suffix), (1,)),
+            (f"payment by session{suffix}", PAYMENT_STATUS_QUERY.format(suffix=suffix), ("cs_test",)),
+        ]
+    return queries
+
+
+def _statements(sql):
+    lines = [line for line in sql.splitlines() if not line.strip().startswith("--")]
+    return [statement.strip() for statement in "\n".join(lines).split(";") if statement.strip()]
+
+
+def pending_migrations(applied):
+    files = sorted(name for name in os.listdir(MIGRATIONS_DIR) if name.endswith(".sql"))
+    return [name for name in files if name[:-4] not in applied]
+
+
+# Apply every migration that has not been recorded in schema_migrations yet
+def apply_migrations():
+    conn = get_connection()
+    cursor = conn.cursor()
+    applied_now = []
+
+    try:
+        # Several workers may start at once; only one of them runs the migrations
+        cursor.execute("SELECT GET_LOCK('schema_migrations', 60)")
+        if cursor.fetchone()[0] != 1:
+            raise RuntimeError("Could not acquire the schema migration lock")
+
+        cursor.execute(
+            "CREATE TABLE IF NOT EXISTS schema_migrations ("
+            "version VARCHAR(255) PRIMARY KEY, "
+            "applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP)"
+        )
+        cursor.execute("SELECT version FROM schema_migrations")
+        applied = {row[0] for row in cursor.fetchall()}
+
+        for name in pending_migrations(applied):
+            with open(os.path.join(MIGRATIONS_DIR, name)) as f:
+                statements = _statements(f.read())
+            for statement in statements:
+                try:
+                    cursor.execute(statement)
+                except Error as e:
+                    if e.errno not in ALREADY_APPLIED_ERRORS:
+                        raise
+                    logger.warning("Migration %s: skipping a statement that was already applied: %s", name, e.msg)
+            cursor.execute("INSERT INTO schema_migrations (version) VALUES (%s)", (name[:-4],))
+            conn.commit()
+            applied_now.append(name[:-4])
+
+        return applied_now
+
+    finally:
+        cursor.execute("SELECT RELEASE_LOCK('schema_migrations')")
+        cursor.fetchall()
+        cursor.close()
+        conn.close()
+
+
+# Run EXPLAIN on each hot query and report the ones that fall back to a full table scan
+def explain_hot_queries():
+    conn = get_connection()
+    cursor = conn.cursor(dictionary=True)
+    report = []
+
+    try:
+        for name, query, params in hot_queries():
+            cursor.execute("EXPLAIN " + query, params)
+            plan = cursor.fetchall()
+            full_scans = [row["table"] for row in plan if row["type"] == "ALL"]
+            report.append({
+                "query": name,
+                "keys": [row["key"] for row in plan],
+                "uses_index": not full_scans,
+            })
+        return report
+
+    finally:
+        cursor.close()
+        conn.close()
+
+
+# python migrate.py            apply pending migrations
+# python migrate.py --explain  fail if a hot query does not use an index
+if __name__ == "__main__":
+    if "--explain" in sys.argv:
+        report = explain_hot_queries()
+        for row in report:
+            status = "ok  " if row["uses_index"] else "SCAN"
+            print(f"{status} {row['query']:<28} keys={row['keys']}")
+        sys.exit(0 if all(row["uses_index"] for row in report) else 1)
+
+    applied = apply_migrations()
+    print(f"Applied {len(applied)} migration(s): {', '.join(applied)}" if applied else "Database is up to date")
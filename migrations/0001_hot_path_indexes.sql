@@ -0,0 +1,18 @@
+-- Secondary indexes for the lookups the routers run on every request
+
+CREATE INDEX idx_order_items_order ON order_items (order_id, product_id);
+
+CREATE INDEX idx_orders_customer ON orders (customer_id, created_at);
+
+CREATE INDEX idx_payments_order ON payments (order_id);
+
+CREATE INDEX idx_users_id_role ON users (id, role);
+
+CREATE INDEX idx_products_category ON products (category, price, availability);
+
+CREATE INDEX idx_products_price ON products (price, availability);
+
+-- One delivery per order; assign_delivery relies on this instead of a COUNT(*) check
+CREATE UNIQUE INDEX uq_deliveries_order ON deliveries (order_id);
+
+CREATE INDEX idx_deliveries_personnel ON deliveries (delivery_personnel_id, status);
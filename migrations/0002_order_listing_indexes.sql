@@ -0,0 +1,5 @@
+-- Keyset pagination on (created_at, id) for order listings, with and without a status filter
+
+CREATE INDEX idx_orders_created ON orders (created_at, id);
+
+CREATE INDEX idx_orders_status_created ON orders (status, created_at, id);
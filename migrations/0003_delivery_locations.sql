@@ -0,0 +1,14 @@
+-- Delivery coordinates on orders and live courier positions for automatic assignment
+
+ALTER TABLE orders
+    ADD COLUMN delivery_latitude DECIMAL(9,6) NULL,
+    ADD COLUMN delivery_longitude DECIMAL(9,6) NULL;
+
+CREATE TABLE courier_locations (
+    delivery_personnel_id INT PRIMARY KEY,
+    latitude DECIMAL(9,6) NOT NULL,
+    longitude DECIMAL(9,6) NOT NULL,
+    capacity INT NOT NULL DEFAULT 10,
+    available BOOLEAN DEFAULT TRUE,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP
+);
@@ -0,0 +1,13 @@
+-- Stock on hand per product; NULL means the product's stock is not tracked
+
+ALTER TABLE products ADD COLUMN stock INT NULL;
+
+-- Idempotency keys sent with /orders/place_order, scoped per customer
+CREATE TABLE idempotency_keys (
+    user_id INT NOT NULL,
+    idempotency_key VARCHAR(255) NOT NULL,
+    request_hash CHAR(64) NOT NULL,
+    order_id INT NOT NULL,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (user_id, idempotency_key)
+);
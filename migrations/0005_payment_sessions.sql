@@ -0,0 +1,5 @@
+-- Stripe checkout session per payment, so webhooks and verify-payment can find it
+
+ALTER TABLE payments
+    ADD COLUMN stripe_session_id VARCHAR(255) NULL,
+    ADD UNIQUE INDEX uq_payments_stripe_session (stripe_session_id);
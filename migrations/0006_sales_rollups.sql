@@ -0,0 +1,44 @@
+-- Daily sales rollups, kept up to date by place_order and order cancellation (see analytics.py).
+-- Counts are net of canceled orders; a rollup day is the day the order was placed.
+
+CREATE TABLE sales_product_daily (
+    day DATE NOT NULL,
+    product_id INT NOT NULL,
+    vendor_id INT NOT NULL,
+    category VARCHAR(100) NOT NULL DEFAULT '',
+    order_count INT NOT NULL DEFAULT 0,
+    units INT NOT NULL DEFAULT 0,
+    revenue DECIMAL(14,2) NOT NULL DEFAULT 0,
+    PRIMARY KEY (day, product_id),
+    INDEX idx_sales_product_vendor (vendor_id, day),
+    INDEX idx_sales_product_product (product_id, day),
+    INDEX idx_sales_product_category (category, day)
+);
+
+CREATE TABLE sales_vendor_daily (
+    day DATE NOT NULL,
+    vendor_id INT NOT NULL,
+    order_count INT NOT NULL DEFAULT 0,
+    units INT NOT NULL DEFAULT 0,
+    revenue DECIMAL(14,2) NOT NULL DEFAULT 0,
+    PRIMARY KEY (day, vendor_id),
+    INDEX idx_sales_vendor_vendor (vendor_id, day)
+);
+
+CREATE TABLE sales_category_daily (
+    day DATE NOT NULL,
+    category VARCHAR(100) NOT NULL DEFAULT '',
+    order_count INT NOT NULL DEFAULT 0,
+    units INT NOT NULL DEFAULT 0,
+    revenue DECIMAL(14,2) NOT NULL DEFAULT 0,
+    PRIMARY KEY (day, category),
+    INDEX idx_sales_category_category (category, day)
+);
+
+-- Platform totals per day (an order with items in several categories counts once here)
+CREATE TABLE sales_daily (
+    day DATE NOT NULL PRIMARY KEY,
+    order_count INT NOT NULL DEFAULT 0,
+    units INT NOT NULL DEFAULT 0,
+    revenue DECIMAL(14,2) NOT NULL DEFAULT 0
+);
@@ -0,0 +1,8 @@
+-- Row update times for Last-Modified/ETag validators and conditional GETs (millisecond precision,
+-- so two changes within one second still produce different validators)
+
+ALTER TABLE products
+    ADD COLUMN updated_at TIMESTAMP(3) NOT NULL DEFAULT CURRENT_TIMESTAMP(3) ON UPDATE CURRENT_TIMESTAMP(3);
+
+ALTER TABLE deliveries
+    ADD COLUMN updated_at TIMESTAMP(3) NOT NULL DEFAULT CURRENT_TIMESTAMP(3) ON UPDATE CURRENT_TIMESTAMP(3);
@@ -0,0 +1,48 @@
+-- Archive for completed orders. archive.py moves Delivered/Canceled orders older than
+-- ARCHIVE_AFTER_DAYS here, with their items, delivery and payments, and the per-order reads
+-- fall back to these tables when an order is not in the live ones. Rows keep their ids.
+-- Compressed InnoDB pages (needs innodb_file_per_table, the default): the archive is written
+-- once and read rarely, so it trades some CPU on access for a fraction of the disk and buffer pool.
+
+CREATE TABLE orders_archive (
+    id INT PRIMARY KEY,
+    customer_id INT NOT NULL,
+    status ENUM('Placed', 'Processing', 'Shipped', 'Out for Delivery', 'Delivered', 'Canceled') NOT NULL,
+    total_amount DECIMAL(10,2) NOT NULL,
+    created_at TIMESTAMP NULL,
+    delivery_latitude DECIMAL(9,6) NULL,
+    delivery_longitude DECIMAL(9,6) NULL,
+    archived_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    INDEX idx_orders_archive_customer (customer_id, created_at),
+    INDEX idx_orders_archive_created (created_at, id)
+) ROW_FORMAT=COMPRESSED KEY_BLOCK_SIZE=8;
+
+CREATE TABLE order_items_archive (
+    id INT PRIMARY KEY,
+    order_id INT NOT NULL,
+    product_id INT NOT NULL,
+    quantity INT NOT NULL,
+    subtotal DECIMAL(10,2) NOT NULL,
+    INDEX idx_order_items_archive_order (order_id, product_id)
+) ROW_FORMAT=COMPRESSED KEY_BLOCK_SIZE=8;
+
+CREATE TABLE deliveries_archive (
+    id INT PRIMARY KEY,
+    order_id INT NOT NULL,
+    delivery_personnel_id INT NOT NULL,
+    status ENUM('Assigned', 'Out for Delivery', 'Delivered', 'Failed') NOT NULL,
+    tracking_link VARCHAR(255),
+    updated_at TIMESTAMP(3) NULL,
+    UNIQUE INDEX uq_deliveries_archive_order (order_id)
+) ROW_FORMAT=COMPRESSED KEY_BLOCK_SIZE=8;
+
+CREATE TABLE payments_archive (
+    id INT PRIMARY KEY,
+    order_id INT NOT NULL,
+    amount DECIMAL(10,2) NOT NULL,
+    payment_method ENUM('Credit Card', 'Debit Card', 'Wallet') NOT NULL,
+    payment_status ENUM('Success', 'Failed', 'Pending') NOT NULL,
+    stripe_session_id VARCHAR(255) NULL,
+    INDEX idx_payments_archive_order (order_id),
+    UNIQUE INDEX uq_payments_archive_stripe_session (stripe_session_id)
+) ROW_FORMAT=COMPRESSED KEY_BLOCK_SIZE=8;
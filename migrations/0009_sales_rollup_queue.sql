@@ -0,0 +1,11 @@
+-- Orders waiting to be added to (sign 1) or taken out of (sign -1) the sales rollups. Order
+-- placement and cancellation only insert here; analytics.RollupWorker applies the queue in
+-- batches, so order transactions never queue up on the same rollup row for the day.
+
+CREATE TABLE sales_rollup_queue (
+    id BIGINT PRIMARY KEY AUTO_INCREMENT,
+    order_id INT NOT NULL,
+    sign TINYINT NOT NULL,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    INDEX idx_sales_rollup_queue_order (order_id)
+);
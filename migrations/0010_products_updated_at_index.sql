@@ -0,0 +1,4 @@
+-- The search index in each worker polls MAX(updated_at) and reads the products changed since
+-- its last check; without this index both scan the whole table
+
+CREATE INDEX idx_products_updated ON products (updated_at);
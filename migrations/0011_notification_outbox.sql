@@ -0,0 +1,17 @@
+-- Notification outbox: written in the same transaction as the order, drained by the notification
+-- worker (routers/notifications.py). IF NOT EXISTS because databases created from an earlier
+-- database.sql already have it.
+
+CREATE TABLE IF NOT EXISTS notification_outbox (
+    id INT PRIMARY KEY AUTO_INCREMENT,
+    channel ENUM('email', 'sms') NOT NULL,
+    recipient VARCHAR(255) NOT NULL,
+    subject VARCHAR(255),
+    body TEXT NOT NULL,
+    status ENUM('Pending', 'Sending', 'Sent', 'Failed') DEFAULT 'Pending',
+    attempts INT NOT NULL DEFAULT 0,
+    next_attempt_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    last_error TEXT,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    INDEX idx_outbox_due (status, next_attempt_at)
+);
@@ -0,0 +1,16 @@
+-- Vendor and category of each ordered product as they were when the order was placed. The
+-- sales rollups group by these, so an order canceled after its product moved to another vendor
+-- or category is taken out of the same rollup rows it was added to. Existing items get their
+-- product's current values.
+
+ALTER TABLE order_items ADD COLUMN vendor_id INT NULL, ADD COLUMN category VARCHAR(100) NULL;
+
+ALTER TABLE order_items_archive ADD COLUMN vendor_id INT NULL, ADD COLUMN category VARCHAR(100) NULL;
+
+UPDATE order_items oi JOIN products p ON p.id = oi.product_id
+SET oi.vendor_id = p.vendor_id, oi.category = COALESCE(p.category, '')
+WHERE oi.vendor_id IS NULL;
+
+UPDATE order_items_archive oi JOIN products p ON p.id = oi.product_id
+SET oi.vendor_id = p.vendor_id, oi.category = COALESCE(p.category, '')
+WHERE oi.vendor_id IS NULL;
@@ -0,0 +1,65 @@
+from decimal import Decimal
+from email.utils import formatdate, parsedate_to_datetime
+import orjson
+from fastapi.responses import JSONResponse
+
+
+# Same output as FastAPI's jsonable_encoder for the database types orjson does not handle itself
+def _default(value):
+    if isinstance(value, Decimal):
+        return int(value) if value.as_tuple().exponent >= 0 else float(value)
+    if isinstance(value, (bytes, bytearray)):
+        return value.decode("utf-8")
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def dumps(content):
+    return orjson.dumps(content, default=_default, option=orjson.OPT_NON_STR_KEYS)
+
+
+class ORJSONResponse(JSONResponse):
+    """JSON response rendered with orjson.
+
+    The app's default response class. Handlers that return large row lists
+    return it directly, which skips FastAPI's jsonable_encoder pass over every value.
+    """
+
+    def render(self, content):
+        return dumps(content)
+
+
+# ETag for a row version: the key plus its update time (UNIX_TIMESTAMP, with milliseconds)
+def version_etag(key, modified):
+    return f'"{key}-{round(float(modified) * 1000)}"'
+
+
+def cache_headers(cache_control, etag=None, last_modified=None):
+    headers = {"Cache-Control": cache_control}
+    if etag:
+        headers["ETag"] = etag
+    if last_modified is not None:
+        headers["Last-Modified"] = formatdate(float(last_modified), usegmt=True)
+    return headers
+
+
+def not_modified(request, etag, last_modified=None):
+    """Whether a GET can be answered with 304 Not Modified.
+
+    If-None-Match is compared with etag (weakly, since compressed responses carry
+    W/ tags). If-Modified-Since is only considered when no If-None-Match was sent,
+    and only when last_modified (Unix seconds) is given.
+    """
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match:
+        tags = [tag.strip() for tag in if_none_match.split(",")]
+        return "*" in tags or etag in tags or f"W/{etag}" in tags
+
+    if_modified_since = request.headers.get("if-modified-since")
+    if not if_modified_since or last_modified is None:
+        return False
+    try:
+        since = parsedate_to_datetime(if_modified_since).timestamp()
+    except (TypeError, ValueError):
+        return False
+    # HTTP dates have one-second resolution
+    return int(float(last_modified)) <= since
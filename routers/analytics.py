@@ -0,0 +1,183 @@
+import os
+from datetime import date, timedelta
+from decimal import Decimal
+from fastapi import APIRouter, HTTPException, Depends, Query
+from database import get_read_db
+from auth.auth import get_current_user
+from auth.permission import check_role
+from cache import TTLCache
+
+router = APIRouter()
+
+# API metric name -> rollup column
+METRICS = {"revenue": "revenue", "units": "units", "orders": "order_count"}
+INTERVALS = ["day", "week", "month"]
+DEFAULT_RANGE_DAYS = 30
+MAX_RANGE_DAYS = 731
+
+# Reports served from the sales rollups (see analytics.py), cached briefly per worker
+analytics_cache = TTLCache(
+    maxsize=int(os.getenv("ANALYTICS_CACHE_SIZE", "1024")),
+    ttl=float(os.getenv("ANALYTICS_CACHE_TTL", "30"))
+)
+
+def _date_range(date_from, date_to):
+    date_to = date_to or date.today()
+    date_from = date_from or date_to - timedelta(days=DEFAULT_RANGE_DAYS - 1)
+    if date_from > date_to:
+        raise HTTPException(status_code=400, detail="date_from must not be after date_to")
+    if (date_to - date_from).days >= MAX_RANGE_DAYS:
+        raise HTTPException(status_code=400, detail=f"Date range is limited to {MAX_RANGE_DAYS} days")
+    return date_from, date_to
+
+# Admins see all sales, vendors only their own
+def _vendor_scope(user, vendor_id):
+    check_role(user, ["admin", "vendor"])
+    if user["role"] == "vendor":
+        if vendor_id is not None and vendor_id != user["user_id"]:
+            raise HTTPException(status_code=403, detail="You can only view your own sales")
+        return user["user_id"]
+    return vendor_id
+
+def _cached(key, load):
+    report = analytics_cache.get(key)
+    if report is None:
+        report = load()
+        analytics_cache.set(key, report)
+    return report
+
+def _filters(date_from, date_to, **columns):
+    where = "WHERE day >= %s AND day <= %s"
+    params = [date_from, date_to]
+    for column, value in columns.items():
+        if value is not None:
+            where += f" AND {column} = %s"
+            params.append(value)
+    return where, params
+
+def _top_products(conn, date_from, date_to, metric, vendor_id, category, limit):
+    column = METRICS[metric]
+    where, params = _filters(date_from, date_to, vendor_id=vendor_id, category=category)
+
+    # Rank on the rollup alone, then look up names for the winners only
+    cursor = conn.cursor(dictionary=True)
+    try:
+        cursor.execute(
+            "SELECT t.product_id, p.name, t.order_count, t.units, t.revenue FROM ("
+            "SELECT product_id, SUM(order_count) AS order_count, SUM(units) AS units, SUM(revenue) AS revenue "
+            f"FROM sales_product_daily {where} GROUP BY product_id HAVING SUM(order_count) > 0 "
+            f"ORDER BY {column} DESC, product_id LIMIT %s"
+            f") t LEFT JOIN products p ON p.id = t.product_id ORDER BY t.{column} DESC, t.product_id",
+            (*params, limit)
+        )
+        rows = cursor.fetchall()
+    finally:
+        cursor.close()
+
+    return [
+        {"product_id": row["product_id"], "name": row["name"], "orders": int(row["order_count"]),
+         "units": int(row["units"]), "revenue": Decimal(str(row["revenue"]))}
+        for row in rows
+    ]
+
+# Daily totals from the smallest rollup table that can answer the filters
+def _daily_totals(conn, date_from, date_to, vendor_id, category, product_id):
+    if product_id is not None or (vendor_id is not None and category is not None):
+        table = "sales_product_daily"
+    elif vendor_id is not None:
+        table = "sales_vendor_daily"
+    elif category is not None:
+        table = "sales_category_daily"
+    else:
+        table = "sales_daily"
+    where, params = _filters(date_from, date_to, vendor_id=vendor_id, category=category, product_id=product_id)
+
+    cursor = conn.cursor()
+    try:
+        cursor.execute(
+            f"SELECT day, SUM(order_count), SUM(units), SUM(revenue) FROM {table} {where} GROUP BY day",
+            tuple(params)
+        )
+        return cursor.fetchall()
+    finally:
+        cursor.close()
+
+def _period(day, interval):
+    if interval == "week":
+        return day - timedelta(days=day.weekday())
+    if interval == "month":
+        return day.replace(day=1)
+    return day
+
+# Bucket daily totals by interval; periods without sales are included with zeros
+def _series(daily, date_from, date_to, interval):
+    periods = {}
+    day = date_from
+    while day <= date_to:
+        periods.setdefault(_period(day, interval), [0, 0, Decimal("0")])
+        day += timedelta(days=1)
+
+    for day, order_count, units, revenue in daily:
+        totals = periods[_period(day, interval)]
+        totals[0] += int(order_count)
+        totals[1] += int(units)
+        totals[2] += Decimal(str(revenue))
+
+    return [
+        {"period": period, "orders": order_count, "units": units, "revenue": revenue}
+        for period, (order_count, units, revenue) in periods.items()
+    ]
+
+# Best-selling products by revenue, units or orders
+@router.get("/top-products")
+def top_products(
+    date_from: date = Query(None, description="First day (default: 30 days before date_to)"),
+    date_to: date = Query(None, description="Last day, inclusive (default: today)"),
+    metric: str = Query("revenue", description="revenue, units or orders"),
+    vendor_id: int = Query(None, description="Filter by vendor (admin only; vendors always see their own)"),
+    category: str = Query(None, description="Filter by category"),
+    limit: int = Query(10, ge=1, le=100),
+    user: dict = Depends(get_current_user),
+    conn=Depends(get_read_db)
+):
+    if metric not in METRICS:
+        raise HTTPException(status_code=400, detail=f"metric must be one of {', '.join(METRICS)}")
+    vendor_id = _vendor_scope(user, vendor_id)
+    date_from, date_to = _date_range(date_from, date_to)
+
+    key = ("top-products", date_from, date_to, metric, vendor_id, category, limit)
+    products = _cached(key, lambda: _top_products(conn, date_from, date_to, metric, vendor_id, category, limit))
+    return {"date_from": date_from, "date_to": date_to, "metric": metric, "products": products}
+
+# Sales over time for the platform, a vendor, a category or a product
+@router.get("/timeseries")
+def sales_timeseries(
+    date_from: date = Query(None, description="First day (default: 30 days before date_to)"),
+    date_to: date = Query(None, description="Last day, inclusive (default: today)"),
+    interval: str = Query("day", description="day, week or month"),
+    vendor_id: int = Query(None, description="Filter by vendor (admin only; vendors always see their own)"),
+    category: str = Query(None, description="Filter by category"),
+    product_id: int = Query(None, description="Filter by product"),
+    user: dict = Depends(get_current_user),
+    conn=Depends(get_read_db)
+):
+    if interval not in INTERVALS:
+        raise HTTPException(status_code=400, detail=f"interval must be one of {', '.join(INTERVALS)}")
+    vendor_id = _vendor_scope(user, vendor_id)
+    date_from, date_to = _date_range(date_from, date_to)
+
+    key = ("timeseries", date_from, date_to, interval, vendor_id, category, product_id)
+    series = _cached(key, lambda: _series(
+        _daily_totals(conn, date_from, date_to, vendor_id, category, product_id), date_from, date_to, interval
+    ))
+    return {
+        "date_from": date_from,
+        "date_to": date_to,
+        "interval": interval,
+        "series": series,
+        "total": {
+            "orders": sum(point["orders"] for point in series),
+            "units": sum(point["units"] for point in series),
+            "revenue": sum((point["revenue"] for point in series), Decimal("0")),
+        },
+    }
@@ -1,20 +1,46 @@
-from fastapi import APIRouter, HTTPException, Depends
-from database import get_connection
-from schemas import DeliveryAssign, DeliveryStatusUpdate
-from mysql.connector import Error
+import os
+from fastapi import APIRouter, HTTPException, Depends, Query, Request, Response
+from database import get_db, get_read_db
+from schemas import DeliveryAssign, DeliveryStatusUpdate, CourierLocationUpdate, DeliveryOut
+from mysql.connector import Error, IntegrityError, errorcode
 from auth.auth import get_current_user
 from auth.permission import check_role  
+from assignment import assign_orders
+from routing import RoutePlan
+from cache import TTLCache
+from events import bus, order_topic
+from responses import cache_headers, version_etag, not_modified
+from transitions import DELIVERY_TRANSITIONS, apply_transitions
+from routers.orders import TRANSITION_ERRORS
 
 router = APIRouter()
 
-DELIVERY_STATUSES = ["Assigned", "Out for Delivery", "Delivered", "Failed"]
+DELIVERY_STATUSES = list(DELIVERY_TRANSITIONS)
+ACTIVE_DELIVERY_STATUSES = ["Assigned", "Out for Delivery"]
+DEFAULT_COURIER_CAPACITY = 10
+
+# Hot queries, also run through EXPLAIN by `python migrate.py --explain`; {suffix} is "" or "_archive"
+COURIER_EXISTS_QUERY = "SELECT COUNT(*) FROM users WHERE id = %s AND role = 'delivery'"
+DELIVERY_QUERY = (
+    "SELECT d.*, UNIX_TIMESTAMP(d.updated_at) AS modified, o.customer_id FROM deliveries{suffix} d "
+    "LEFT JOIN orders{suffix} o ON o.id = d.order_id WHERE d.order_id = %s"
+)
+COURIER_DELIVERIES_QUERY = (
+    "SELECT d.order_id, d.status, o.delivery_latitude, o.delivery_longitude FROM deliveries d "
+    "JOIN orders o ON o.id = d.order_id WHERE d.delivery_personnel_id = %s AND d.status IN ({placeholders})"
+)
+
+# Each courier's planned route; refreshed on every read, re-planned from scratch after the TTL
+route_cache = TTLCache(
+    maxsize=int(os.getenv("ROUTE_CACHE_SIZE", "10000")),
+    ttl=float(os.getenv("ROUTE_CACHE_TTL", "3600"))
+)
 
 # Assign Delivery 
 @router.post("/assign_delivery")
-def assign_delivery(delivery: DeliveryAssign, user: dict = Depends(get_current_user)):
+def assign_delivery(delivery: DeliveryAssign, user: dict = Depends(get_current_user), conn=Depends(get_db)):
     check_role(user, ["admin"])  
 
-    conn = get_connection()
     cursor = conn.cursor()
 
     try:
@@ -24,22 +50,138 @@ def assign_delivery(delivery: DeliveryAssign, user: dict = Depends(get_current_u
             raise HTTPException(status_code=404, detail="Order not found")
 
         
-        cursor.execute("SELECT COUNT(*) FROM users WHERE id = %s AND role = 'delivery'", (delivery.delivery_personnel_id,))
+        cursor.execute(COURIER_EXISTS_QUERY, (delivery.delivery_personnel_id,))
         if cursor.fetchone()[0] == 0:
             raise HTTPException(status_code=400, detail="Invalid delivery_personnel_id: Delivery personnel does not exist")
 
-       
-        cursor.execute("SELECT COUNT(*) FROM deliveries WHERE order_id = %s", (delivery.order_id,))
-        if cursor.fetchone()[0] > 0:
-            raise HTTPException(status_code=400, detail="Delivery already assigned for this order")
+        # The UNIQUE index on deliveries.order_id rejects a second assignment
+        try:
+            cursor.execute(
+                "INSERT INTO deliveries (order_id, delivery_personnel_id, status) VALUES (%s, %s, %s)",
+                (delivery.order_id, delivery.delivery_personnel_id, "Assigned")
+            )
+        except IntegrityError as e:
+            if e.errno == errorcode.ER_DUP_ENTRY:
+                raise HTTPException(status_code=400, detail="Delivery already assigned for this order")
+            raise
+        conn.commit()
+        bus.publish(order_topic(delivery.order_id), {"type": "delivery_status", "order_id": delivery.order_id, "status": "Assigned"})
+        return {"message": "Delivery assigned successfully", "order_id": delivery.order_id}
+
+    except Error as e:
+        conn.rollback()
+        raise HTTPException(status_code=500, detail=f"Database error: {e}")
 
-       
+    finally:
+        cursor.close()
+
+# Report Courier Location
+@router.put("/courier_location")
+def update_courier_location(location: CourierLocationUpdate, user: dict = Depends(get_current_user), conn=Depends(get_db)):
+    check_role(user, ["delivery"])
+
+    cursor = conn.cursor()
+
+    try:
         cursor.execute(
-            "INSERT INTO deliveries (order_id, delivery_personnel_id, status) VALUES (%s, %s, %s)",
-            (delivery.order_id, delivery.delivery_personnel_id, "Assigned")
+            "INSERT INTO courier_locations (delivery_personnel_id, latitude, longitude, capacity, available) "
+            "VALUES (%s, %s, %s, %s, %s) "
+            "ON DUPLICATE KEY UPDATE latitude = VALUES(latitude), longitude = VALUES(longitude), "
+            "capacity = COALESCE(%s, capacity), available = VALUES(available)",
+            (user["user_id"], location.latitude, location.longitude, location.capacity or DEFAULT_COURIER_CAPACITY,
+             location.available, location.capacity)
         )
         conn.commit()
-        return {"message": "Delivery assigned successfully", "order_id": delivery.order_id}
+        return {"message": "Location updated"}
+
+    except Error as e:
+        conn.rollback()
+        raise HTTPException(status_code=500, detail=f"Database error: {e}")
+
+    finally:
+        cursor.close()
+
+# Automatically Assign Unassigned Orders
+@router.post("/auto_assign")
+def auto_assign_deliveries(
+    limit: int = Query(10000, ge=1, le=50000, description="Maximum number of backlog orders to assign"),
+    max_distance_km: float = Query(None, gt=0, description="Leave orders unassigned if no courier is this close"),
+    user: dict = Depends(get_current_user),
+    conn=Depends(get_db)
+):
+    check_role(user, ["admin"])
+
+    cursor = conn.cursor(dictionary=True)
+
+    try:
+        # Only one engine run at a time; manual assignments are still guarded by the UNIQUE index
+        cursor.execute("SELECT GET_LOCK('auto_assign_deliveries', 10) AS locked")
+        if cursor.fetchone()["locked"] != 1:
+            raise HTTPException(status_code=409, detail="Another assignment run is in progress")
+
+        try:
+            cursor.execute(
+                "SELECT o.id, o.delivery_latitude AS latitude, o.delivery_longitude AS longitude FROM orders o "
+                "LEFT JOIN deliveries d ON d.order_id = o.id "
+                "WHERE d.id IS NULL AND o.status IN ('Placed', 'Processing') AND o.delivery_latitude IS NOT NULL "
+                "ORDER BY o.created_at, o.id LIMIT %s",
+                (limit,)
+            )
+            orders = [{**row, "latitude": float(row["latitude"]), "longitude": float(row["longitude"])} for row in cursor.fetchall()]
+
+            placeholders = ", ".join(["%s"] * len(ACTIVE_DELIVERY_STATUSES))
+            cursor.execute(
+                "SELECT c.delivery_personnel_id AS id, c.latitude, c.longitude, c.capacity, COUNT(d.id) AS active_deliveries "
+                "FROM courier_locations c "
+                f"LEFT JOIN deliveries d ON d.delivery_personnel_id = c.delivery_personnel_id AND d.status IN ({placeholders}) "
+                "WHERE c.available = TRUE "
+                "GROUP BY c.delivery_personnel_id, c.latitude, c.longitude, c.capacity",
+                tuple(ACTIVE_DELIVERY_STATUSES)
+            )
+            couriers = [
+                {**row, "latitude": float(row["latitude"]), "longitude": float(row["longitude"]), "load": row["active_deliveries"]}
+                for row in cursor.fetchall()
+            ]
+
+            assignments, unassigned = assign_orders(orders, couriers, max_distance_km)
+
+            # All assignments are written in one transaction
+            assigned = 0
+            if assignments:
+                cursor.executemany(
+                    "INSERT IGNORE INTO deliveries (order_id, delivery_personnel_id, status) VALUES (%s, %s, %s)",
+                    [(order_id, courier_id, "Assigned") for order_id, courier_id, _ in assignments]
+                )
+                assigned = cursor.rowcount
+            conn.commit()
+
+            # Orders assigned manually in the meantime were skipped by INSERT IGNORE
+            skipped = len(assignments) - assigned
+            if skipped:
+                placeholders = ", ".join(["%s"] * len(assignments))
+                cursor.execute(
+                    f"SELECT order_id, delivery_personnel_id FROM deliveries WHERE order_id IN ({placeholders})",
+                    tuple(order_id for order_id, _, _ in assignments)
+                )
+                stored = {(row["order_id"], row["delivery_personnel_id"]) for row in cursor.fetchall()}
+                assignments = [a for a in assignments if (a[0], a[1]) in stored]
+
+        finally:
+            cursor.execute("SELECT RELEASE_LOCK('auto_assign_deliveries')")
+            cursor.fetchall()
+
+        for order_id, _, _ in assignments:
+            bus.publish(order_topic(order_id), {"type": "delivery_status", "order_id": order_id, "status": "Assigned"})
+
+        return {
+            "assigned": len(assignments),
+            "unassigned": len(unassigned),
+            "skipped": skipped,
+            "assignments": [
+                {"order_id": order_id, "delivery_personnel_id": courier_id, "distance_km": distance}
+                for order_id, courier_id, distance in assignments
+            ],
+        }
 
     except Error as e:
         conn.rollback()
@@ -47,31 +189,28 @@ def assign_delivery(delivery: DeliveryAssign, user: dict = Depends(get_current_u
 
     finally:
         cursor.close()
-        conn.close()
 
-# Update Delivery Status 
+# Update Delivery Status; the order follows (see transitions.py)
 @router.put("/update_delivery_status")
-def update_delivery_status(delivery_update: DeliveryStatusUpdate, user: dict = Depends(get_current_user)):
+def update_delivery_status(delivery_update: DeliveryStatusUpdate, user: dict = Depends(get_current_user), conn=Depends(get_db)):
     check_role(user, ["delivery"])  
 
     if delivery_update.status not in DELIVERY_STATUSES:
         raise HTTPException(status_code=400, detail="Invalid delivery status")
 
-    conn = get_connection()
     cursor = conn.cursor()
 
     try:
-        
-        cursor.execute("SELECT delivery_personnel_id FROM deliveries WHERE order_id = %s", (delivery_update.order_id,))
-        result = cursor.fetchone()
-        if not result:
-            raise HTTPException(status_code=404, detail="Delivery not found for this order")
-        if result[0] != user["id"]:
-            raise HTTPException(status_code=403, detail="You are not assigned to this delivery")
+        (outcome,), events = apply_transitions(
+            cursor, "delivery", [(delivery_update.order_id, delivery_update.status)], delivery_personnel_id=user["user_id"]
+        )
+        if outcome["result"] in TRANSITION_ERRORS:
+            conn.rollback()
+            raise HTTPException(status_code=TRANSITION_ERRORS[outcome["result"]], detail=outcome["detail"])
 
-        
-        cursor.execute("UPDATE deliveries SET status = %s WHERE order_id = %s", (delivery_update.status, delivery_update.order_id))
         conn.commit()
+        for order_id, event in events:
+            bus.publish(order_topic(order_id), event)
 
         return {"message": f"Delivery for Order {delivery_update.order_id} updated to {delivery_update.status}"}
 
@@ -81,26 +220,85 @@ def update_delivery_status(delivery_update: DeliveryStatusUpdate, user: dict = D
 
     finally:
         cursor.close()
-        conn.close()
 
 # Get Delivery Details 
-@router.get("/delivery/{order_id}")
-def get_delivery_details(order_id: int, user: dict = Depends(get_current_user)):
-    conn = get_connection()
+@router.get("/delivery/{order_id}", response_model=DeliveryOut)
+def get_delivery_details(order_id: int, request: Request, response: Response, user: dict = Depends(get_current_user), conn=Depends(get_read_db)):
     cursor = conn.cursor(dictionary=True)
 
-    cursor.execute("SELECT * FROM deliveries WHERE order_id = %s", (order_id,))
+    # One indexed lookup serves both the authorization check and the conditional GET
+    cursor.execute(DELIVERY_QUERY.format(suffix=""), (order_id,))
     delivery = cursor.fetchone()
+    if not delivery:
+        # Deliveries of archived orders keep their id and updated_at, so validators stay the same
+        cursor.execute(DELIVERY_QUERY.format(suffix="_archive"), (order_id,))
+        delivery = cursor.fetchone()
+    cursor.close()
     if not delivery:
         raise HTTPException(status_code=404, detail="Delivery details not found for this order")
 
     # Check if the user is authorized to view the order delivery details
-    if user["role"] == "customer":
-        cursor.execute("SELECT customer_id FROM orders WHERE id = %s", (order_id,))
-        order = cursor.fetchone()
-        if order["customer_id"] != user["id"]:
-            raise HTTPException(status_code=403, detail="You are not authorized to view this delivery")
+    if user["role"] == "customer" and delivery["customer_id"] != user["user_id"]:
+        raise HTTPException(status_code=403, detail="You are not authorized to view this delivery")
 
-    cursor.close()
-    conn.close()
+    # Delivery status changes often and is per-user, so clients revalidate every time
+    modified = delivery["modified"]
+    headers = cache_headers("private, no-cache", version_etag(delivery["id"], modified), modified)
+    if not_modified(request, headers["ETag"], modified):
+        return Response(status_code=304, headers=headers)
+
+    response.headers.update(headers)
     return delivery
+
+# Courier Route: active deliveries in driving order from the courier's last reported location
+@router.get("/route/{delivery_personnel_id}")
+def get_courier_route(delivery_personnel_id: int, user: dict = Depends(get_current_user), conn=Depends(get_read_db)):
+    check_role(user, ["admin", "delivery"])
+    if user["role"] == "delivery" and user["user_id"] != delivery_personnel_id:
+        raise HTTPException(status_code=403, detail="You can only view your own route")
+
+    cursor = conn.cursor()
+
+    try:
+        cursor.execute(
+            "SELECT latitude, longitude FROM courier_locations WHERE delivery_personnel_id = %s",
+            (delivery_personnel_id,)
+        )
+        location = cursor.fetchone()
+        placeholders = ", ".join(["%s"] * len(ACTIVE_DELIVERY_STATUSES))
+        cursor.execute(
+            COURIER_DELIVERIES_QUERY.format(placeholders=placeholders),
+            (delivery_personnel_id, *ACTIVE_DELIVERY_STATUSES)
+        )
+        deliveries = cursor.fetchall()
+    finally:
+        cursor.close()
+
+    if not location:
+        raise HTTPException(status_code=404, detail="No location reported for this courier")
+
+    start = (float(location[0]), float(location[1]))
+    statuses = {order_id: status for order_id, status, _, _ in deliveries}
+    stops = {
+        order_id: (float(latitude), float(longitude))
+        for order_id, _, latitude, longitude in deliveries
+        if latitude is not None and longitude is not None
+    }
+
+    plan = route_cache.get(delivery_personnel_id) or RoutePlan()
+    legs, total_km, planning = plan.update(start, stops)
+    route_cache.set(delivery_personnel_id, plan)
+
+    return {
+        "delivery_personnel_id": delivery_personnel_id,
+        "start": {"latitude": start[0], "longitude": start[1]},
+        "stops": [
+            {"order_id": order_id, "status": statuses[order_id], "latitude": stops[order_id][0],
+             "longitude": stops[order_id][1], "leg_km": round(distance, 3)}
+            for order_id, distance in legs
+        ],
+        "total_km": round(total_km, 3),
+        "planning": planning,
+        # Active deliveries without delivery coordinates cannot be placed on the route
+        "unrouted": sorted(order_id for order_id in statuses if order_id not in stops),
+    }
@@ -1,38 +1,239 @@
-from fastapi_mail import FastMail, MessageSchema, ConnectionConfig
-from twilio.rest import Client
-from config import MAIL_USERNAME, MAIL_PASSWORD, MAIL_FROM, TWILIO_SID, TWILIO_AUTH_TOKEN, TWILIO_PHONE
-
-# Email Configuration
-conf = ConnectionConfig(
-    MAIL_USERNAME=MAIL_USERNAME,
-    MAIL_PASSWORD=MAIL_PASSWORD,
-    MAIL_FROM=MAIL_FROM,
-    MAIL_PORT=587,
-    MAIL_SERVER="smtp.gmail.com",
-    MAIL_STARTTLS=True, 
-    MAIL_SSL_TLS=False,
-    USE_CREDENTIALS=True
-)
+import os
+import asyncio
+import logging
+import smtplib
+from email.message import EmailMessage
+from fastapi.concurrency import run_in_threadpool
+import config
+from database import get_connection
+from metrics import external_call
+from lazy import Lazy
 
-fm = FastMail(conf)
+logger = logging.getLogger(__name__)
 
-# Function to Send Email
-async def send_email(subject: str, email_to: str, body: str):
-    message = MessageSchema(
-        subject=subject,
-        recipients=[email_to],
-        body=body,
-        subtype="html"
-    )
-    await fm.send_message(message)
+MAIL_SERVER = os.getenv("MAIL_SERVER", "smtp.gmail.com")
+MAIL_PORT = int(os.getenv("MAIL_PORT", "587"))
+MAIL_STARTTLS = os.getenv("MAIL_STARTTLS", "1") == "1"
+
+# Twilio is imported on first send, not at worker start
+def _create_twilio_client():
+    from twilio.rest import Client
 
-# Configuration
-twilio_client = Client(TWILIO_SID, TWILIO_AUTH_TOKEN)
+    return Client(config.TWILIO_SID, config.TWILIO_AUTH_TOKEN)
+
+twilio_client = Lazy(_create_twilio_client)
 
 # Function to Send SMS
 def send_sms(phone_number: str, message: str):
-    twilio_client.messages.create(
-        body=message,
-        from_=TWILIO_PHONE,
-        to=phone_number
+    with external_call("twilio", "send_sms"):
+        twilio_client.get().messages.create(
+            body=message,
+            from_=config.TWILIO_PHONE,
+            to=phone_number
+        )
+
+# Queue notifications in the outbox using the caller's cursor, so they commit with the caller's transaction
+def enqueue_notifications(cursor, notifications):
+    cursor.executemany(
+        "INSERT INTO notification_outbox (channel, recipient, subject, body) VALUES (%s, %s, %s, %s)",
+        [(n["channel"], n["recipient"], n.get("subject"), n["body"]) for n in notifications]
     )
+
+
+# Drains notification_outbox in the background
+class NotificationDispatcher:
+    def __init__(self, batch_size=50, concurrency=5, poll_interval=2.0, max_attempts=5,
+                 backoff_base=5, backoff_max=600, lease_seconds=120, sms_sender=None):
+        self.batch_size = batch_size
+        self.concurrency = concurrency
+        self.poll_interval = poll_interval
+        self.max_attempts = max_attempts
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.lease_seconds = lease_seconds
+        self.sms_sender = sms_sender or send_sms
+        self._task = None
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self.run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def run(self):
+        while True:
+            try:
+                processed = await self.drain_once()
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception("Notification dispatcher failed to drain the outbox")
+                processed = 0
+            if processed < self.batch_size:
+                await asyncio.sleep(self.poll_interval)
+
+    async def drain_once(self):
+        rows = await run_in_threadpool(self._claim_batch)
+        if not rows:
+            return 0
+
+        emails = [row for row in rows if row["channel"] == "email"]
+        messages = [row for row in rows if row["channel"] == "sms"]
+
+        email_results, sms_results = await asyncio.gather(
+            run_in_threadpool(self._send_email_batch, emails),
+            self._send_sms_batch(messages),
+        )
+        await run_in_threadpool(self._record_results, rows, {**email_results, **sms_results})
+        return len(rows)
+
+    # Lock a batch of due rows and lease them so other workers skip them
+    def _claim_batch(self):
+        conn = get_connection()
+        cursor = conn.cursor(dictionary=True)
+
+        try:
+            cursor.execute(
+                "SELECT id, channel, recipient, subject, body, attempts FROM notification_outbox "
+                "WHERE status IN ('Pending', 'Sending') AND next_attempt_at <= NOW() "
+                "ORDER BY next_attempt_at LIMIT %s FOR UPDATE SKIP LOCKED",
+                (self.batch_size,)
+            )
+            rows = cursor.fetchall()
+            if rows:
+                placeholders = ", ".join(["%s"] * len(rows))
+                cursor.execute(
+                    f"UPDATE notification_outbox SET status = 'Sending', attempts = attempts + 1, "
+                    f"next_attempt_at = NOW() + INTERVAL %s SECOND WHERE id IN ({placeholders})",
+                    (self.lease_seconds, *[row["id"] for row in rows])
+                )
+            conn.commit()
+            for row in rows:
+                row["attempts"] += 1
+            return rows
+
+        finally:
+            cursor.close()
+            conn.close()
+
+    # Send every email in the batch over a single SMTP connection
+    def _send_email_batch(self, rows):
+        results = {}
+        if not rows:
+            return results
+
+        try:
+            with external_call("smtp", "connect"):
+                smtp = smtplib.SMTP(MAIL_SERVER, MAIL_PORT, timeout=30)
+        except (OSError, smtplib.SMTPException) as e:
+            return {row["id"]: str(e) for row in rows}
+
+        try:
+            with external_call("smtp", "login"):
+                if MAIL_STARTTLS:
+                    smtp.starttls()
+                if config.MAIL_USERNAME:
+                    smtp.login(config.MAIL_USERNAME, config.MAIL_PASSWORD)
+
+            for row in rows:
+                message = EmailMessage()
+                message["Subject"] = row["subject"] or ""
+                message["From"] = config.MAIL_FROM
+                message["To"] = row["recipient"]
+                message.set_content(row["body"], subtype="html")
+                try:
+                    with external_call("smtp", "send_message"):
+                        smtp.send_message(message)
+                    results[row["id"]] = None
+                except smtplib.SMTPException as e:
+                    results[row["id"]] = str(e)
+
+        except (OSError, smtplib.SMTPException) as e:
+            for row in rows:
+                results.setdefault(row["id"], str(e))
+
+        finally:
+            try:
+                smtp.quit()
+            except (OSError, smtplib.SMTPException):
+                smtp.close()
+
+        return results
+
+    async def _send_sms_batch(self, rows):
+        semaphore = asyncio.Semaphore(self.concurrency)
+
+        async def send(row):
+            async with semaphore:
+                try:
+                    await run_in_threadpool(self.sms_sender, row["recipient"], row["body"])
+                    return row["id"], None
+                except Exception as e:
+                    return row["id"], str(e)
+
+        return dict(await asyncio.gather(*(send(row) for row in rows)))
+
+    def _backoff(self, attempts):
+        return min(self.backoff_base * 2 ** (attempts - 1), self.backoff_max)
+
+    def _record_results(self, rows, results):
+        sent = [row["id"] for row in rows if results.get(row["id"]) is None]
+        retry = []
+        failed = []
+        for row in rows:
+            error = results.get(row["id"])
+            if error is None:
+                continue
+            if row["attempts"] >= self.max_attempts:
+                failed.append((error, row["id"]))
+            else:
+                retry.append((error, self._backoff(row["attempts"]), row["id"]))
+                logger.warning("Notification %s failed (attempt %s): %s", row["id"], row["attempts"], error)
+
+        conn = get_connection()
+        cursor = conn.cursor()
+
+        try:
+            if sent:
+                placeholders = ", ".join(["%s"] * len(sent))
+                cursor.execute(
+                    f"UPDATE notification_outbox SET status = 'Sent', last_error = NULL WHERE id IN ({placeholders})",
+                    tuple(sent)
+                )
+            if retry:
+                cursor.executemany(
+                    "UPDATE notification_outbox SET status = 'Pending', last_error = %s, "
+                    "next_attempt_at = NOW() + INTERVAL %s SECOND WHERE id = %s",
+                    retry
+                )
+            if failed:
+                cursor.executemany(
+                    "UPDATE notification_outbox SET status = 'Failed', last_error = %s WHERE id = %s",
+                    failed
+                )
+            conn.commit()
+
+        finally:
+            cursor.close()
+            conn.close()
+
+
+dispatcher = NotificationDispatcher(
+    batch_size=int(os.getenv("NOTIFY_BATCH_SIZE", "50")),
+    concurrency=int(os.getenv("NOTIFY_CONCURRENCY", "5")),
+    poll_interval=float(os.getenv("NOTIFY_POLL_INTERVAL", "2")),
+    max_attempts=int(os.getenv("NOTIFY_MAX_ATTEMPTS", "5")),
+)
+
+
+# Run the dispatcher as a separate process: python -m routers.notifications
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    asyncio.run(dispatcher.run())
@@ -1,111 +1,408 @@
-from fastapi import APIRouter, HTTPException, Depends
-from database import get_connection
-from schemas import OrderCreate, OrderStatusUpdate
-from mysql.connector import Error
+import os
+import json
+import base64
+import hashlib
+from datetime import datetime
+from decimal import Decimal
+from fastapi import APIRouter, HTTPException, Depends, Query, Header, Response
+from fastapi.responses import StreamingResponse
+from fastapi.concurrency import run_in_threadpool
+import orjson
+from database import get_db, get_read_db, get_connection, get_read_connection, fetch_dicts
+from schemas import OrderCreate, OrderStatusUpdate, BulkOrderStatusUpdate, OrderOut, OrderPage
+from mysql.connector import Error, IntegrityError, errorcode
 from auth.auth import get_current_user
 from auth.permission import check_role  
-from routers.notifications import send_email,send_sms 
+from routers.notifications import enqueue_notifications
+from routers.products import catalog_cache
+from events import bus, order_topic
+from cache import TTLCache
+from analytics import queue_orders
+from transitions import ORDER_TRANSITIONS, apply_transitions
+from responses import ORJSONResponse
 
 router = APIRouter()
 
-ORDER_STATUSES = ["Placed", "Processing", "Shipped", "Out for Delivery", "Delivered", "Canceled"]
+ORDER_STATUSES = list(ORDER_TRANSITIONS)
+# HTTP status for each rejected transition outcome
+TRANSITION_ERRORS = {"not_found": 404, "forbidden": 403, "invalid_transition": 409}
+EXPORT_CHUNK_SIZE = 1000
 
-@router.post("/place_order")
-async def place_order(order: OrderCreate, user: dict = Depends(get_current_user)):
-    check_role(user, ["customer"])  
+# Hot queries, also run through EXPLAIN by `python migrate.py --explain`; {suffix} is "" or "_archive"
+CART_PRODUCTS_QUERY = "SELECT id, price, availability, stock, vendor_id, category FROM products WHERE id IN ({placeholders}) ORDER BY id FOR UPDATE"
+# Items are returned without the vendor/category snapshot, which only the sales rollups use
+ORDER_ITEMS_QUERY = "SELECT id, order_id, product_id, quantity, subtotal FROM order_items{suffix} WHERE order_id = %s"
+PAGE_ITEMS_QUERY = (
+    "SELECT id, order_id, product_id, quantity, subtotal FROM order_items{suffix} "
+    "WHERE order_id IN ({placeholders}) ORDER BY order_id, id"
+)
 
-    conn = get_connection()
+# (request hash, order id) per (customer, Idempotency-Key); the idempotency_keys table is the durable copy
+idempotency_cache = TTLCache(
+    maxsize=int(os.getenv("IDEMPOTENCY_CACHE_SIZE", "100000")),
+    ttl=float(os.getenv("IDEMPOTENCY_CACHE_TTL", "86400"))
+)
+
+# Lock the cart's products in id order (so concurrent carts cannot deadlock), check availability
+# and stock, and reserve the stock with a single UPDATE; returns each product's Decimal price, vendor and
+# category (the snapshot order_items keeps for the sales rollups), and whether any stock was reserved
+def _reserve_stock(cursor, quantities):
+    product_ids = sorted(quantities)
+    placeholders = ", ".join(["%s"] * len(product_ids))
+    cursor.execute(CART_PRODUCTS_QUERY.format(placeholders=placeholders), tuple(product_ids))
+    rows = {row[0]: row for row in cursor.fetchall()}
+
+    missing = [product_id for product_id in product_ids if product_id not in rows]
+    if missing:
+        raise HTTPException(status_code=400, detail=f"Product ID(s) {', '.join(map(str, missing))} do not exist")
+
+    unavailable = [product_id for product_id in product_ids if not rows[product_id][2]]
+    if unavailable:
+        raise HTTPException(status_code=400, detail=f"Product ID(s) {', '.join(map(str, unavailable))} are not available")
+
+    tracked = [product_id for product_id in product_ids if rows[product_id][3] is not None]
+    short = [product_id for product_id in tracked if rows[product_id][3] < quantities[product_id]]
+    if short:
+        raise HTTPException(status_code=409, detail=f"Insufficient stock for product ID(s) {', '.join(map(str, short))}")
+
+    if tracked:
+        cases = " ".join(["WHEN %s THEN %s"] * len(tracked))
+        cursor.execute(
+            f"UPDATE products SET stock = stock - CASE id {cases} END WHERE id IN ({', '.join(['%s'] * len(tracked))})",
+            (*[value for product_id in tracked for value in (product_id, quantities[product_id])], *tracked)
+        )
+
+    return {
+        product_id: (Decimal(str(rows[product_id][1])), rows[product_id][4], rows[product_id][5] or "")
+        for product_id in product_ids
+    }, bool(tracked)
+
+def _request_hash(order):
+    return hashlib.sha256(json.dumps(order.model_dump(), sort_keys=True, default=str).encode("utf-8")).hexdigest()
+
+# Canceled orders get their stock back, which catalog pages show
+def _clear_catalog_on_cancel(events):
+    if any(event["type"] == "order_status" and event["status"] == "Canceled" for _, event in events):
+        catalog_cache.clear()
+
+def _replay(stored, request_hash):
+    stored_hash, order_id = stored
+    if stored_hash != request_hash:
+        raise HTTPException(status_code=422, detail="Idempotency-Key was already used for a different order")
+    return order_id
+
+def _stored_order(cursor, user_id, idempotency_key):
+    cursor.execute(
+        "SELECT request_hash, order_id FROM idempotency_keys WHERE user_id = %s AND idempotency_key = %s",
+        (user_id, idempotency_key)
+    )
+    return cursor.fetchone()
+
+# Blocking part of order placement; runs in the threadpool so it does not stall the event loop.
+# Returns (order_id, replayed)
+def _create_order(conn, user, order, idempotency_key=None, request_hash=None):
+    products = order.products
     cursor = conn.cursor()
 
     try:
-        total_amount = 0
-        product_prices = {}
+        if idempotency_key:
+            stored = _stored_order(cursor, user["user_id"], idempotency_key)
+            if stored:
+                return _replay(stored, request_hash), True
 
-        for item in order.products:
-            cursor.execute("SELECT price FROM products WHERE id = %s", (item["product_id"],))
-            product = cursor.fetchone()
-            if not product:
-                raise HTTPException(status_code=400, detail=f"Product ID {item['product_id']} does not exist")
+        quantities = {}
+        for item in products:
+            quantities[item.product_id] = quantities.get(item.product_id, 0) + item.quantity
+        cart_products, reserved = _reserve_stock(cursor, quantities)
 
-            price = product[0]
-            product_prices[item["product_id"]] = price
-            total_amount += price * item["quantity"]
+        subtotals = [cart_products[item.product_id][0] * item.quantity for item in products]
+        total_amount = sum(subtotals, Decimal("0"))
 
         cursor.execute(
-            "INSERT INTO orders (customer_id, total_amount, status) VALUES (%s, %s, %s)",
-            (user["user_id"], total_amount, "Placed")
+            "INSERT INTO orders (customer_id, total_amount, status, delivery_latitude, delivery_longitude) VALUES (%s, %s, %s, %s, %s)",
+            (user["user_id"], total_amount, "Placed", order.delivery_latitude, order.delivery_longitude)
         )
         order_id = cursor.lastrowid
 
-        for item in order.products:
-            subtotal = item["quantity"] * product_prices[item["product_id"]]
-            cursor.execute(
-                "INSERT INTO order_items (order_id, product_id, quantity, subtotal) VALUES (%s, %s, %s, %s)",
-                (order_id, item["product_id"], item["quantity"], subtotal)
-            )
-
-        conn.commit()
-
-        cursor.execute("SELECT phone_number FROM users WHERE id = %s", (user["user_id"],))
-        phone_data = cursor.fetchone()
-        customer_phone = phone_data[0] if phone_data else None
+        # mysql.connector rewrites an INSERT executemany into one multi-row INSERT
+        cursor.executemany(
+            "INSERT INTO order_items (order_id, product_id, quantity, subtotal, vendor_id, category) VALUES (%s, %s, %s, %s, %s, %s)",
+            [
+                (order_id, item.product_id, item.quantity, subtotal, *cart_products[item.product_id][1:])
+                for item, subtotal in zip(products, subtotals)
+            ]
+        )
+        queue_orders(cursor, [order_id])
 
-        email_body = f"Hello {user['username']},<br>Your order (ID: {order_id}) has been placed successfully! 🎉<br>Total: ${total_amount}"
-        await send_email("Order Confirmation", user["email"], email_body)
+        # Notifications go to the outbox in the same transaction; the dispatcher sends them later
+        cursor.execute("SELECT username, email, phone_number FROM users WHERE id = %s", (user["user_id"],))
+        username, email, customer_phone = cursor.fetchone()
 
+        notifications = [{
+            "channel": "email",
+            "recipient": email,
+            "subject": "Order Confirmation",
+            "body": f"Hello {username},<br>Your order (ID: {order_id}) has been placed successfully! 🎉<br>Total: ${total_amount}",
+        }]
         if customer_phone:
-            sms_message = f"Hello {user['username']}, your order (ID: {order_id}) of ${total_amount} has been placed successfully! ✅"
-            send_sms(customer_phone, sms_message)
+            notifications.append({
+                "channel": "sms",
+                "recipient": customer_phone,
+                "body": f"Hello {username}, your order (ID: {order_id}) of ${total_amount} has been placed successfully! ✅",
+            })
+        enqueue_notifications(cursor, notifications)
 
-        return {"message": "Order placed successfully", "order_id": order_id}
+        # A concurrent retry with the same key blocks here until the first request commits,
+        # then hits the primary key; it rolls back its own order and returns the first one
+        if idempotency_key:
+            try:
+                cursor.execute(
+                    "INSERT INTO idempotency_keys (user_id, idempotency_key, request_hash, order_id) VALUES (%s, %s, %s, %s)",
+                    (user["user_id"], idempotency_key, request_hash, order_id)
+                )
+            except IntegrityError as e:
+                if e.errno != errorcode.ER_DUP_ENTRY:
+                    raise
+                conn.rollback()
+                return _replay(_stored_order(cursor, user["user_id"], idempotency_key), request_hash), True
 
-    except Error as e:
+        conn.commit()
+        # Catalog pages show stock; carts of untracked products leave them unchanged
+        if reserved:
+            catalog_cache.clear()
+        return order_id, False
+
+    except Exception:
         conn.rollback()
-        raise HTTPException(status_code=400, detail=f"Database error: {e}")
+        raise
 
     finally:
         cursor.close()
+
+def _place_order(user, order, idempotency_key, request_hash):
+    conn = get_connection()
+    try:
+        return _create_order(conn, user, order, idempotency_key, request_hash)
+    finally:
         conn.close()
 
+# Place an order. With an Idempotency-Key header, retries return the original order instead of creating another
+@router.post("/place_order")
+async def place_order(
+    order: OrderCreate,
+    response: Response,
+    user: dict = Depends(get_current_user),
+    idempotency_key: str = Header(None, alias="Idempotency-Key", max_length=255)
+):
+    check_role(user, ["customer"])  
+
+    request_hash = _request_hash(order) if idempotency_key else None
+    if idempotency_key:
+        cached = idempotency_cache.get((user["user_id"], idempotency_key))
+        if cached is not None:
+            order_id = _replay(cached, request_hash)
+            response.headers["Idempotent-Replayed"] = "true"
+            return {"message": "Order placed successfully", "order_id": order_id}
+
+    try:
+        order_id, replayed = await run_in_threadpool(_place_order, user, order, idempotency_key, request_hash)
+    except Error as e:
+        raise HTTPException(status_code=400, detail=f"Database error: {e}")
+
+    if idempotency_key:
+        idempotency_cache.set((user["user_id"], idempotency_key), (request_hash, order_id))
+    if replayed:
+        response.headers["Idempotent-Replayed"] = "true"
+    return {"message": "Order placed successfully", "order_id": order_id}
+
 # Get Order Details 
-@router.get("/order/{order_id}")
-def get_order(order_id: int, user: dict = Depends(get_current_user)):
-    conn = get_connection()
-    cursor = conn.cursor(dictionary=True)
+@router.get("/order/{order_id}", response_model=OrderOut)
+def get_order(order_id: int, user: dict = Depends(get_current_user), conn=Depends(get_read_db)):
+    cursor = conn.cursor()
 
     cursor.execute("SELECT * FROM orders WHERE id = %s", (order_id,))
-    order = cursor.fetchone()
-    if not order:
+    row = cursor.fetchone()
+    suffix = ""
+    if not row:
+        # Completed orders older than ARCHIVE_AFTER_DAYS have moved to the archive (see archive.py)
+        cursor.execute("SELECT * FROM orders_archive WHERE id = %s", (order_id,))
+        row = cursor.fetchone()
+        suffix = "_archive"
+    if not row:
         raise HTTPException(status_code=404, detail="Order not found")
+    order = dict(zip(cursor.column_names, row))
 
     if user["role"] not in ["admin", "delivery"] and order["customer_id"] != user["user_id"]:
         raise HTTPException(status_code=403, detail="You are not authorized to view this order")
 
-    cursor.execute("SELECT * FROM order_items WHERE order_id = %s", (order_id,))
-    order["items"] = cursor.fetchall()
+    cursor.execute(ORDER_ITEMS_QUERY.format(suffix=suffix), (order_id,))
+    order["items"] = fetch_dicts(cursor)
 
     cursor.close()
-    conn.close()
     return order
 
-# Update Order Status
+# Cursor for (created_at, id) keyset pagination, newest first
+def _encode_cursor(order):
+    raw = f"{order['created_at'].isoformat()}|{order['id']}"
+    return base64.urlsafe_b64encode(raw.encode("utf-8")).decode("ascii")
+
+def _decode_cursor(cursor_value):
+    try:
+        created_at, order_id = base64.urlsafe_b64decode(cursor_value.encode("ascii")).decode("utf-8").split("|")
+        return datetime.fromisoformat(created_at), int(order_id)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+# WHERE clause for the order listing, scoped to the caller's own orders for customers
+def _order_filters(user, customer_id, status, created_from, created_to):
+    if user["role"] == "customer":
+        if customer_id is not None and customer_id != user["user_id"]:
+            raise HTTPException(status_code=403, detail="You can only list your own orders")
+        customer_id = user["user_id"]
+    elif user["role"] not in ["admin", "delivery"]:
+        raise HTTPException(status_code=403, detail="Unauthorized access")
+
+    if status is not None and status not in ORDER_STATUSES:
+        raise HTTPException(status_code=400, detail="Invalid order status")
+
+    where = "WHERE 1=1"
+    params = []
+
+    if customer_id is not None:
+        where += " AND customer_id = %s"
+        params.append(customer_id)
+
+    if status is not None:
+        where += " AND status = %s"
+        params.append(status)
+
+    if created_from is not None:
+        where += " AND created_at >= %s"
+        params.append(created_from)
+
+    if created_to is not None:
+        where += " AND created_at < %s"
+        params.append(created_to)
+
+    return where, params
+
+# Also EXPLAINed by migrate.py --explain
+def _orders_page_query(where, params, after, limit, archived=False):
+    suffix = "_archive" if archived else ""
+    query = f"SELECT * FROM orders{suffix} {where}"
+    params = list(params)
+
+    if after is not None:
+        query += " AND (created_at < %s OR (created_at = %s AND id < %s))"
+        params.extend([after[0], after[0], after[1]])
+
+    query += " ORDER BY created_at DESC, id DESC LIMIT %s"
+    params.append(limit)
+    return query, tuple(params)
+
+# One page of orders after the cursor, with items for the whole page loaded in one IN query
+def _fetch_orders_page(cursor, where, params, after, limit, archived=False):
+    cursor.execute(*_orders_page_query(where, params, after, limit, archived))
+    orders = fetch_dicts(cursor)
+    if not orders:
+        return orders
+
+    placeholders = ", ".join(["%s"] * len(orders))
+    cursor.execute(
+        PAGE_ITEMS_QUERY.format(suffix="_archive" if archived else "", placeholders=placeholders),
+        tuple(order["id"] for order in orders)
+    )
+    items = {}
+    for item in fetch_dicts(cursor):
+        items.setdefault(item["order_id"], []).append(item)
+
+    for order in orders:
+        order["items"] = items.get(order["id"], [])
+    return orders
+
+# List Orders
+@router.get("/list", response_model=OrderPage)
+def list_orders(
+    customer_id: int = Query(None, description="Filter by customer (admin/delivery only)"),
+    status: str = Query(None, description="Filter by order status"),
+    created_from: datetime = Query(None, description="Orders created at or after this time"),
+    created_to: datetime = Query(None, description="Orders created before this time"),
+    cursor: str = Query(None, description="next_cursor from the previous page"),
+    limit: int = Query(50, ge=1, le=500),
+    archived: bool = Query(False, description="List archived (completed, older) orders instead of live ones"),
+    user: dict = Depends(get_current_user),
+    conn=Depends(get_read_db)
+):
+    where, params = _order_filters(user, customer_id, status, created_from, created_to)
+    after = _decode_cursor(cursor) if cursor else None
+
+    db_cursor = conn.cursor()
+    try:
+        orders = _fetch_orders_page(db_cursor, where, params, after, limit + 1, archived)
+    finally:
+        db_cursor.close()
+
+    next_cursor = None
+    if len(orders) > limit:
+        orders = orders[:limit]
+        next_cursor = _encode_cursor(orders[-1])
+
+    # Rendered with orjson directly; a page can hold hundreds of orders with their items
+    return ORJSONResponse({"orders": orders, "next_cursor": next_cursor})
+
+# Export Orders as NDJSON, streamed page by page
+@router.get("/export")
+def export_orders(
+    customer_id: int = Query(None, description="Filter by customer (admin/delivery only)"),
+    status: str = Query(None, description="Filter by order status"),
+    created_from: datetime = Query(None, description="Orders created at or after this time"),
+    created_to: datetime = Query(None, description="Orders created before this time"),
+    archived: bool = Query(False, description="Export archived (completed, older) orders instead of live ones"),
+    user: dict = Depends(get_current_user)
+):
+    where, params = _order_filters(user, customer_id, status, created_from, created_to)
+
+    # The stream outlives the request's dependencies, so it checks out its own connection
+    def generate():
+        conn = get_read_connection()
+        cursor = conn.cursor()
+        try:
+            after = None
+            while True:
+                orders = _fetch_orders_page(cursor, where, params, after, EXPORT_CHUNK_SIZE, archived)
+                # Decimals and timestamps are written as strings, as with json.dumps(default=str)
+                yield b"".join(
+                    orjson.dumps(order, default=str, option=orjson.OPT_PASSTHROUGH_DATETIME) + b"\n" for order in orders
+                )
+                if len(orders) < EXPORT_CHUNK_SIZE:
+                    break
+                after = (orders[-1]["created_at"], orders[-1]["id"])
+        finally:
+            cursor.close()
+            conn.close()
+
+    return StreamingResponse(generate(), media_type="application/x-ndjson")
+
+# Update Order Status; the order's delivery follows (see transitions.py)
 @router.put("/update_status")
-def update_order_status(order_update: OrderStatusUpdate, user: dict = Depends(get_current_user)):
+def update_order_status(order_update: OrderStatusUpdate, user: dict = Depends(get_current_user), conn=Depends(get_db)):
     check_role(user, ["admin", "delivery"]) 
 
     if order_update.status not in ORDER_STATUSES:
         raise HTTPException(status_code=400, detail="Invalid order status")
 
-    conn = get_connection()
     cursor = conn.cursor()
 
     try:
-        cursor.execute("SELECT COUNT(*) FROM orders WHERE id = %s", (order_update.order_id,))
-        if cursor.fetchone()[0] == 0:
-            raise HTTPException(status_code=404, detail="Order not found")
+        (outcome,), events = apply_transitions(cursor, "order", [(order_update.order_id, order_update.status)])
+        if outcome["result"] in TRANSITION_ERRORS:
+            conn.rollback()
+            raise HTTPException(status_code=TRANSITION_ERRORS[outcome["result"]], detail=outcome["detail"])
 
-        cursor.execute("UPDATE orders SET status = %s WHERE id = %s", (order_update.status, order_update.order_id))
         conn.commit()
+        _clear_catalog_on_cancel(events)
+        for order_id, event in events:
+            bus.publish(order_topic(order_id), event)
 
         return {"message": f"Order {order_update.order_id} updated to {order_update.status}"}
 
@@ -115,4 +412,30 @@ def update_order_status(order_update: OrderStatusUpdate, user: dict = Depends(ge
 
     finally:
         cursor.close()
-        conn.close()
+
+# Bulk Update Order Status: all transitions in one transaction, with one outcome per order
+@router.post("/bulk_status")
+def bulk_update_order_status(update: BulkOrderStatusUpdate, user: dict = Depends(get_current_user), conn=Depends(get_db)):
+    check_role(user, ["admin"])
+
+    cursor = conn.cursor()
+
+    try:
+        outcomes, events = apply_transitions(cursor, "order", [(change.order_id, change.status) for change in update.transitions])
+        conn.commit()
+        _clear_catalog_on_cancel(events)
+        for order_id, event in events:
+            bus.publish(order_topic(order_id), event)
+
+    except Error as e:
+        conn.rollback()
+        raise HTTPException(status_code=500, detail=f"Database error: {e}")
+
+    finally:
+        cursor.close()
+
+    counts = {"updated": 0, "unchanged": 0}
+    for outcome in outcomes:
+        if outcome["result"] in counts:
+            counts[outcome["result"]] += 1
+    return {**counts, "failed": len(outcomes) - counts["updated"] - counts["unchanged"], "results": outcomes}
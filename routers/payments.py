@@ -1,14 +1,157 @@
+import os
+import json
+import asyncio
+import logging
 import stripe
-from fastapi import APIRouter, HTTPException
-from database import get_connection
-from config import STRIPE_SECRET_KEY
+from fastapi import APIRouter, HTTPException, Depends, Request
+from fastapi.concurrency import run_in_threadpool
+from mysql.connector import Error
+from database import get_connection, get_read_connection, PoolTimeout
+import config
+from auth.permission import check_role
+from auth.auth import get_current_user
+from metrics import external_call
+from cache import TTLCache
+from lazy import Lazy
+
+logger = logging.getLogger(__name__)
 
 router = APIRouter()
 
-stripe.api_key = STRIPE_SECRET_KEY  
+# Point at a mock server (e.g. benchmarks/mock_stripe.py) instead of api.stripe.com
+STRIPE_API_BASE = os.getenv("STRIPE_API_BASE")
+STRIPE_TIMEOUT = float(os.getenv("STRIPE_TIMEOUT", "10"))
+STRIPE_MAX_RETRIES = int(os.getenv("STRIPE_MAX_RETRIES", "2"))
 
-@router.post("/create-checkout-session")
-def create_checkout_session(order_id: int):
+# Final statuses never change, so they can be cached for long; Pending only briefly to absorb polling
+FINAL_PAYMENT_STATUSES = ["Success", "Failed"]
+PENDING_CACHE_TTL = float(os.getenv("PAYMENT_PENDING_CACHE_TTL", "2"))
+
+# Status lookup for verify-payment, also run through EXPLAIN by `python migrate.py --explain`
+PAYMENT_STATUS_QUERY = "SELECT order_id, payment_status FROM payments{suffix} WHERE stripe_session_id = %s"
+
+# Webhook event type -> payment status (checkout.session.completed depends on the session's payment_status)
+WEBHOOK_STATUSES = {
+    "checkout.session.async_payment_succeeded": "Success",
+    "checkout.session.async_payment_failed": "Failed",
+    "checkout.session.expired": "Failed",
+}
+
+# One pooled async HTTP client for every Stripe call, with a timeout and retries on network errors.
+# Both are created on the first Stripe call, so workers start without loading httpx or needing the secret key
+def _create_stripe_http_client():
+    return stripe.HTTPXClient(timeout=STRIPE_TIMEOUT)
+
+def _create_stripe_client():
+    return stripe.StripeClient(
+        config.STRIPE_SECRET_KEY,
+        http_client=stripe_http_client.get(),
+        max_network_retries=STRIPE_MAX_RETRIES,
+        base_addresses={"api": STRIPE_API_BASE} if STRIPE_API_BASE else None,
+    )
+
+stripe_http_client = Lazy(_create_stripe_http_client)
+stripe_client = Lazy(_create_stripe_client)
+
+async def close_stripe_client():
+    if stripe_http_client.created:
+        await stripe_http_client.get().close_async()
+
+# (order_id, payment_status) per Stripe checkout session
+payment_status_cache = TTLCache(
+    maxsize=int(os.getenv("PAYMENT_CACHE_SIZE", "100000")),
+    ttl=float(os.getenv("PAYMENT_CACHE_TTL", "3600"))
+)
+
+
+# Writes webhook status updates with group commit: updates that arrive while a batch is
+# being written are collected and committed together in the next one
+class PaymentStatusWriter:
+    def __init__(self, max_batch=500):
+        self.max_batch = max_batch
+        self._queue = None
+        self._task = None
+        self.batches = 0
+        self.updates = 0
+
+    def start(self):
+        if self._task is None:
+            self._queue = asyncio.Queue()
+            self._task = asyncio.create_task(self.run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def write(self, session_id, status):
+        """Queue an update and wait until the batch containing it has been committed."""
+        self.start()
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put((session_id, status, future))
+        await future
+
+    async def run(self):
+        while True:
+            batch = [await self._queue.get()]
+            while len(batch) < self.max_batch and not self._queue.empty():
+                batch.append(self._queue.get_nowait())
+
+            try:
+                await run_in_threadpool(self._flush, {session_id: status for session_id, status, _ in batch})
+            except Exception as e:
+                logger.exception("Failed to record %s payment status update(s)", len(batch))
+                for _, _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+                continue
+
+            self.batches += 1
+            self.updates += len(batch)
+            for _, _, future in batch:
+                if not future.done():
+                    future.set_result(None)
+
+    # One conditional UPDATE for the whole batch; a final status is never overwritten
+    def _flush(self, statuses):
+        session_ids = list(statuses)
+        cases = " ".join(["WHEN %s THEN %s"] * len(session_ids))
+        placeholders = ", ".join(["%s"] * len(session_ids))
+
+        conn = get_connection()
+        cursor = conn.cursor()
+
+        try:
+            cursor.execute(
+                f"UPDATE payments SET payment_status = CASE stripe_session_id {cases} END "
+                f"WHERE stripe_session_id IN ({placeholders}) AND payment_status = 'Pending'",
+                (*[value for session_id in session_ids for value in (session_id, statuses[session_id])], *session_ids)
+            )
+            conn.commit()
+        finally:
+            cursor.close()
+            conn.close()
+
+        for session_id in session_ids:
+            payment_status_cache.pop(session_id)
+
+    def stats(self):
+        return {
+            "pending": self._queue.qsize() if self._queue is not None else 0,
+            "batches": self.batches,
+            "updates": self.updates,
+        }
+
+
+payment_writer = PaymentStatusWriter()
+
+
+# The handlers below check connections out only around their queries, never across a Stripe call
+def _order_total(order_id):
     conn = get_connection()
     cursor = conn.cursor(dictionary=True)
 
@@ -17,40 +160,131 @@ def create_checkout_session(order_id: int):
         order = cursor.fetchone()
         if not order:
             raise HTTPException(status_code=404, detail="Order not found")
+        return order["total_amount"]
+
+    finally:
+        cursor.close()
+        conn.close()
 
-        total_amount = int(order["total_amount"] * 100)  
-
-        session = stripe.checkout.Session.create(
-            payment_method_types=["card"],
-            line_items=[
-                {
-                    "price_data": {
-                        "currency": "usd",
-                        "product_data": {"name": f"Order {order_id}"},
-                        "unit_amount": total_amount,
-                    },
-                    "quantity": 1,
-                }
-            ],
-            mode="payment",
-            success_url="http://localhost:8000/payment-success",
-            cancel_url="http://localhost:8000/payment-cancel",
+def _record_session(order_id, amount, session_id):
+    conn = get_connection()
+    cursor = conn.cursor()
+
+    try:
+        cursor.execute(
+            "INSERT INTO payments (order_id, amount, payment_method, payment_status, stripe_session_id) VALUES (%s, %s, %s, %s, %s)",
+            (order_id, amount, "Credit Card", "Pending", session_id)
         )
+        conn.commit()
+
+    finally:
+        cursor.close()
+        conn.close()
 
-        return {"session_id": session.id,"checkout_url": session.url}
+@router.post("/create-checkout-session")
+async def create_checkout_session(order_id: int):
+    total_amount = await run_in_threadpool(_order_total, order_id)
 
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
+    try:
+        with external_call("stripe", "checkout_session_create"):
+            session = await stripe_client.get().v1.checkout.sessions.create_async(params={
+                "payment_method_types": ["card"],
+                "line_items": [
+                    {
+                        "price_data": {
+                            "currency": "usd",
+                            "product_data": {"name": f"Order {order_id}"},
+                            "unit_amount": int(total_amount * 100),
+                        },
+                        "quantity": 1,
+                    }
+                ],
+                "mode": "payment",
+                "client_reference_id": str(order_id),
+                "metadata": {"order_id": str(order_id)},
+                "success_url": "http://localhost:8000/payment-success",
+                "cancel_url": "http://localhost:8000/payment-cancel",
+            })
+    except stripe.StripeError as e:
+        raise HTTPException(status_code=502, detail=f"Stripe error: {e.user_message or e}")
+
+    try:
+        await run_in_threadpool(_record_session, order_id, total_amount, session.id)
+    except Error as e:
+        raise HTTPException(status_code=500, detail=f"Database error: {e}")
+
+    payment_status_cache.set(session.id, (order_id, "Pending"), ttl=PENDING_CACHE_TTL)
+    return {"session_id": session.id, "checkout_url": session.url}
+
+# Stripe webhook: verifies the signature and records the payment status
+@router.post("/webhook")
+async def stripe_webhook(request: Request):
+    # Read like STRIPE_SECRET_KEY; configs from before webhooks were handled may not define it
+    webhook_secret = getattr(config, "STRIPE_WEBHOOK_SECRET", None)
+    if not webhook_secret:
+        raise HTTPException(status_code=503, detail="Stripe webhook secret is not configured")
+
+    payload = await request.body()
+    try:
+        # Without a tolerance any old signed event could be replayed; Stripe's default is 5 minutes
+        stripe.WebhookSignature.verify_header(
+            payload.decode("utf-8"), request.headers.get("stripe-signature"), webhook_secret,
+            tolerance=stripe.Webhook.DEFAULT_TOLERANCE
+        )
+        event = json.loads(payload)
+    except stripe.SignatureVerificationError:
+        raise HTTPException(status_code=400, detail="Invalid signature")
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid payload")
+
+    session = event["data"]["object"]
+    if event["type"] == "checkout.session.completed":
+        status = "Success" if session.get("payment_status") in ("paid", "no_payment_required") else None
+    else:
+        status = WEBHOOK_STATUSES.get(event["type"])
+
+    if status is not None:
+        try:
+            await payment_writer.write(session["id"], status)
+        except (Error, PoolTimeout):
+            # Stripe retries webhooks that do not get a 2xx
+            raise HTTPException(status_code=500, detail="Could not record payment status")
+
+    return {"received": True}
+
+def _payment_status(session_id):
+    conn = get_read_connection()
+    cursor = conn.cursor()
+
+    try:
+        cursor.execute(PAYMENT_STATUS_QUERY.format(suffix=""), (session_id,))
+        row = cursor.fetchone()
+        if row is None:
+            cursor.execute(PAYMENT_STATUS_QUERY.format(suffix="_archive"), (session_id,))
+            row = cursor.fetchone()
+        return row
 
     finally:
         cursor.close()
         conn.close()
 
+# Payment status as recorded from Stripe webhooks; served from the cache when possible
 @router.get("/verify-payment/{session_id}")
 def verify_payment(session_id: str):
-    try:
-        session = stripe.checkout.Session.retrieve(session_id)
-        return {"status": session.payment_status}
+    cached = payment_status_cache.get(session_id)
+    if cached is None:
+        cached = _payment_status(session_id)
+        if cached is None:
+            raise HTTPException(status_code=404, detail="Payment session not found")
+        order_id, status = cached
+        ttl = None if status in FINAL_PAYMENT_STATUSES else PENDING_CACHE_TTL
+        payment_status_cache.set(session_id, (order_id, status), ttl=ttl)
+
+    order_id, status = cached
+    return {"order_id": order_id, "status": status}
 
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
+# Payment status cache and webhook writer counters (Admin only)
+@router.get("/stats")
+def payment_stats(user: dict = Depends(get_current_user)):
+    check_role(user, ["admin"])
+    return {"cache": payment_status_cache.stats(), "writer": payment_writer.stats()}
@@ -1,52 +1,167 @@
-from fastapi import APIRouter, HTTPException, Depends, Query
-from database import get_connection
-from schemas import ProductCreate
+import os
+import json
+import hashlib
+import csv
+import codecs
+from fastapi import APIRouter, HTTPException, Depends, Query, Request, Response
+from fastapi.concurrency import run_in_threadpool
+from pydantic import ValidationError
+from mysql.connector import Error
+from database import get_connection, get_db, get_read_db
+from schemas import ProductCreate, ProductOut, ProductPage
 from auth.permission import check_role
 from auth.auth import get_current_user
+from cache import TTLCache
+from search_index import product_index
+from responses import dumps, cache_headers, version_etag, not_modified
 
 router = APIRouter()
 
+PRODUCT_FIELDS = ["id", "vendor_id", "name", "description", "price", "availability", "category", "stock"]
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 1000
+BULK_BATCH_SIZE = 1000
+MAX_REPORTED_ERRORS = 1000
+# How long clients and shared caches may reuse catalog responses without revalidating
+CATALOG_MAX_AGE = int(os.getenv("CATALOG_MAX_AGE", "30"))
+
+# Catalog pages cached in-process; cleared whenever this worker changes a product or its stock
+catalog_cache = TTLCache(
+    maxsize=int(os.getenv("CATALOG_CACHE_SIZE", "512")),
+    ttl=float(os.getenv("CATALOG_CACHE_TTL", "30"))
+)
+
+def _parse_fields(fields):
+    if not fields:
+        return PRODUCT_FIELDS
+    selected = [field.strip() for field in fields.split(",") if field.strip()]
+    unknown = [field for field in selected if field not in PRODUCT_FIELDS]
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown field(s): {', '.join(unknown)}")
+    # id is always returned because it is the pagination cursor
+    return ["id"] + [field for field in PRODUCT_FIELDS if field in selected and field != "id"]
+
+# The catalog page query; `python migrate.py --explain` checks it against the indexes
+def _catalog_query(filters, after_id, limit, columns):
+    # The trailing update time is not part of the row; zip() in _catalog_page drops it
+    query = f"SELECT {', '.join(columns)}, UNIX_TIMESTAMP(updated_at) FROM products WHERE 1=1"
+    params = []
+
+    if filters.get("category"):
+        query += " AND category = %s"
+        params.append(filters["category"])
+
+    if filters.get("min_price") is not None:
+        query += " AND price >= %s"
+        params.append(filters["min_price"])
+
+    if filters.get("max_price") is not None:
+        query += " AND price <= %s"
+        params.append(filters["max_price"])
+
+    if filters.get("available") is not None:
+        query += " AND availability = %s"
+        params.append(filters["available"])
+
+    if after_id is not None:
+        query += " AND id > %s"
+        params.append(after_id)
+
+    # Fetch one extra row to know whether another page follows
+    query += " ORDER BY id LIMIT %s"
+    params.append(limit + 1)
+    return query, tuple(params)
+
+# Fetch one keyset page of the catalog, served from the cache when possible
+def _catalog_page(conn, filters, after_id, limit, fields):
+    columns = _parse_fields(fields)
+    key = (tuple(sorted(filters.items())), after_id, limit, tuple(columns))
+    page = catalog_cache.get(key)
+    if page is not None:
+        return page
+
+    cursor = conn.cursor()
+    try:
+        cursor.execute(*_catalog_query(filters, after_id, limit, columns))
+        rows = cursor.fetchall()
+    finally:
+        cursor.close()
+
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = rows[-1][0]
+    products = [dict(zip(columns, row)) for row in rows]
+
+    if "availability" in columns:
+        for product in products:
+            product["availability"] = bool(product["availability"])
+
+    # Pages are cached serialized, so a cache hit is sent without touching the rows again
+    body = dumps(products)
+    page = {
+        "body": body,
+        "next_cursor": next_cursor,
+        "etag": '"' + hashlib.md5(body).hexdigest() + '"',
+        "last_modified": max((row[-1] for row in rows), default=None),
+    }
+    catalog_cache.set(key, page)
+    return page
+
+# Pages are revalidated by ETag only: deleting a product changes the page without
+# moving any updated_at, so Last-Modified is informational here
+def _page_headers(page):
+    return cache_headers(f"public, max-age={CATALOG_MAX_AGE}", page["etag"], page["last_modified"])
+
 # Add Product
 @router.post("/add")
-def add_product(product: ProductCreate, user: dict = Depends(get_current_user)):
+def add_product(product: ProductCreate, user: dict = Depends(get_current_user), conn=Depends(get_db)):
     check_role(user, ["vendor"])  
-    conn = get_connection()
     cursor = conn.cursor()
 
     try:
         cursor.execute(
-            "INSERT INTO products (vendor_id, name, description, price, availability, category) VALUES (%s, %s, %s, %s, %s, %s)",
-            (product.vendor_id, product.name, product.description, product.price, product.availability, product.category)
+            "INSERT INTO products (vendor_id, name, description, price, availability, category, stock) VALUES (%s, %s, %s, %s, %s, %s, %s)",
+            (product.vendor_id, product.name, product.description, product.price, product.availability, product.category, product.stock)
         )
         conn.commit()
+        catalog_cache.clear()
+        if product_index.loaded:
+            product_index.add({"id": cursor.lastrowid, **product.model_dump()})
         return {"message": "Product added successfully"}
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
     finally:
         cursor.close()
-        conn.close()
 
 # Get Products
-@router.get("/list")
-def list_products():
-    conn = get_connection()
-    cursor = conn.cursor(dictionary=True)
-
+@router.get("/list", response_model=list[ProductOut])
+def list_products(
+    request: Request,
+    after_id: int = Query(None, description="Return products with id greater than this cursor"),
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE, description="Page size"),
+    fields: str = Query(None, description="Comma-separated list of fields to return"),
+    conn=Depends(get_read_db)
+):
     try:
-        cursor.execute("SELECT * FROM products")
-        products = cursor.fetchall()
-        return products
+        page = _catalog_page(conn, {}, after_id, limit, fields)
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
-    finally:
-        cursor.close()
-        conn.close()
+
+    headers = _page_headers(page)
+    if not_modified(request, page["etag"]):
+        return Response(status_code=304, headers=headers)
+
+    if page["next_cursor"] is not None:
+        headers["X-Next-Cursor"] = str(page["next_cursor"])
+    return Response(content=page["body"], media_type="application/json", headers=headers)
 
 @router.put("/update/{product_id}")
-def update_product(product_id: int, product: ProductCreate, user: dict = Depends(get_current_user)):
+def update_product(product_id: int, product: ProductCreate, user: dict = Depends(get_current_user), conn=Depends(get_db)):
     check_role(user, ["vendor"]) 
 
-    conn = get_connection()
     cursor = conn.cursor()
 
     try:
@@ -60,14 +175,17 @@ def update_product(product_id: int, product: ProductCreate, user: dict = Depends
             raise HTTPException(status_code=403, detail="You can only update your own products")  
 
         cursor.execute(
-            "UPDATE products SET name=%s, description=%s, price=%s, availability=%s, category=%s WHERE id=%s",
-            (product.name, product.description, product.price, product.availability, product.category, product_id)
+            "UPDATE products SET name=%s, description=%s, price=%s, availability=%s, category=%s, stock=COALESCE(%s, stock) WHERE id=%s",
+            (product.name, product.description, product.price, product.availability, product.category, product.stock, product_id)
         )
 
         if cursor.rowcount == 0:
             raise HTTPException(status_code=400, detail="No changes were made to the product")
 
         conn.commit()
+        catalog_cache.clear()
+        if product_index.loaded:
+            product_index.add({"id": product_id, **product.model_dump()})
         return {"message": "Product updated successfully"}
 
     except Exception as e:
@@ -76,58 +194,236 @@ def update_product(product_id: int, product: ProductCreate, user: dict = Depends
 
     finally:
         cursor.close()
-        conn.close()
 
 # Delete Product
 @router.delete("/delete/{product_id}")
-def delete_product(product_id: int, user: dict = Depends(get_current_user)):
+def delete_product(product_id: int, user: dict = Depends(get_current_user), conn=Depends(get_db)):
     check_role(user, ["admin"])  
 
-    conn = get_connection()
     cursor = conn.cursor()
 
     try:
         cursor.execute("DELETE FROM products WHERE id=%s", (product_id,))
         conn.commit()
+        catalog_cache.clear()
+        product_index.remove(product_id)
         return {"message": "Product deleted successfully"}
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
     finally:
         cursor.close()
+
+# Stream lines out of the request body without loading it into memory
+async def _body_lines(request):
+    decoder = codecs.getincrementaldecoder("utf-8-sig")()
+    pending = ""
+    async for chunk in request.stream():
+        pending += decoder.decode(chunk)
+        # Only "\n" ends a line; str.splitlines would also split inside JSON strings on U+2028 and the like
+        *lines, pending = pending.split("\n")
+        for line in lines:
+            yield line + "\n"
+    pending += decoder.decode(b"", final=True)
+    if pending:
+        yield pending
+
+# Group physical lines into CSV records; a quoted field may span several lines
+async def _csv_records(request):
+    record = ""
+    async for line in _body_lines(request):
+        record += line
+        if record.count('"') % 2 == 0:
+            yield record
+            record = ""
+    if record:
+        yield record
+
+async def _bulk_rows(request, body_format):
+    if body_format == "csv":
+        header = None
+        async for record in _csv_records(request):
+            if not record.strip():
+                continue
+            values = next(csv.reader([record]))
+            if header is None:
+                header = [column.strip() for column in values]
+                continue
+            yield dict(zip(header, values))
+    else:
+        async for line in _body_lines(request):
+            if not line.strip():
+                continue
+            try:
+                row = json.loads(line)
+            except ValueError as e:
+                yield e
+                continue
+            yield row if isinstance(row, dict) else ValueError("Each line must be a JSON object")
+
+# Upsert one batch of validated rows in a single transaction, on a connection held only for that batch
+def _upsert_batch(user, batch):
+    conn = get_connection()
+    cursor = conn.cursor()
+
+    try:
+        errors = []
+        updates = [row for _, row in batch if row["id"] is not None]
+        if updates:
+            ids = sorted({row["id"] for row in updates})
+            placeholders = ", ".join(["%s"] * len(ids))
+            # Locked until the upsert commits, so no other vendor can take over these rows in between
+            cursor.execute(f"SELECT id, vendor_id FROM products WHERE id IN ({placeholders}) ORDER BY id FOR UPDATE", tuple(ids))
+            owners = dict(cursor.fetchall())
+            allowed = []
+            for line_number, row in batch:
+                if row["id"] is None:
+                    allowed.append((line_number, row))
+                elif row["id"] not in owners:
+                    # New products get their id from the database
+                    errors.append({"row": line_number, "errors": [f"Product {row['id']} does not exist; leave id empty to create a product"]})
+                elif owners[row["id"]] != user["user_id"]:
+                    errors.append({"row": line_number, "errors": ["You can only update your own products"]})
+                else:
+                    allowed.append((line_number, row))
+            batch = allowed
+
+        if batch:
+            cursor.executemany(
+                "INSERT INTO products (id, vendor_id, name, description, price, availability, category, stock) "
+                "VALUES (%s, %s, %s, %s, %s, %s, %s, %s) "
+                "ON DUPLICATE KEY UPDATE name = VALUES(name), description = VALUES(description), "
+                "price = VALUES(price), availability = VALUES(availability), category = VALUES(category), "
+                "stock = COALESCE(VALUES(stock), stock)",
+                [(row["id"], row["vendor_id"], row["name"], row["description"], row["price"], row["availability"], row["category"], row["stock"])
+                 for _, row in batch]
+            )
+        conn.commit()
+        return len(batch), errors
+
+    except Error as e:
+        conn.rollback()
+        return 0, [{"row": line_number, "errors": [f"Database error: {e}"]} for line_number, _ in batch]
+
+    finally:
+        cursor.close()
         conn.close()
 
-@router.get("/products")
+# Bulk Import Products (CSV with a header row, or NDJSON)
+@router.post("/bulk_import")
+async def bulk_import(request: Request, user: dict = Depends(get_current_user)):
+    check_role(user, ["vendor"])
+
+    content_type = request.headers.get("content-type", "")
+    if "csv" in content_type:
+        body_format = "csv"
+    elif "ndjson" in content_type or "jsonlines" in content_type:
+        body_format = "ndjson"
+    else:
+        raise HTTPException(status_code=415, detail="Send text/csv or application/x-ndjson")
+
+    processed = 0
+    imported = 0
+    failed = 0
+    errors = []
+    batch = []
+
+    def report(line_errors):
+        nonlocal failed
+        failed += len(line_errors)
+        room = MAX_REPORTED_ERRORS - len(errors)
+        if room > 0:
+            errors.extend(line_errors[:room])
+
+    async def flush():
+        nonlocal imported, batch
+        if batch:
+            count, batch_errors = await run_in_threadpool(_upsert_batch, user, batch)
+            imported += count
+            report(batch_errors)
+            batch = []
+
+    async for row in _bulk_rows(request, body_format):
+        processed += 1
+        if isinstance(row, Exception):
+            report([{"row": processed, "errors": [str(row)]}])
+            continue
+        try:
+            raw_id = row.pop("id", None)
+            product_id = int(raw_id) if raw_id not in (None, "") else None
+            if row.get("stock") == "":
+                row["stock"] = None
+            product = ProductCreate(**row)
+        except ValidationError as e:
+            report([{"row": processed, "errors": [f"{'.'.join(map(str, err['loc']))}: {err['msg']}" for err in e.errors()]}])
+            continue
+        except (ValueError, TypeError) as e:
+            report([{"row": processed, "errors": [str(e)]}])
+            continue
+        if product.vendor_id != user["user_id"]:
+            report([{"row": processed, "errors": ["vendor_id must be your own user id"]}])
+            continue
+
+        batch.append((processed, {"id": product_id, **product.model_dump()}))
+        if len(batch) >= BULK_BATCH_SIZE:
+            await flush()
+
+    await flush()
+
+    if imported:
+        catalog_cache.clear()
+        # Rebuilt from the table on the next search
+        product_index.clear()
+
+    return {"processed": processed, "imported": imported, "failed": failed, "errors": errors}
+
+@router.get("/products", response_model=ProductPage)
 def list_products(
+    request: Request,
     category: str = Query(None, description="Filter by category"),
     min_price: float = Query(None, description="Minimum price"),
     max_price: float = Query(None, description="Maximum price"),
-    available: bool = Query(None, description="Filter by availability")
+    available: bool = Query(None, description="Filter by availability"),
+    after_id: int = Query(None, description="Return products with id greater than this cursor"),
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE, description="Page size"),
+    fields: str = Query(None, description="Comma-separated list of fields to return"),
+    conn=Depends(get_read_db)
 ):
-    conn = get_connection()
-    cursor = conn.cursor(dictionary=True)
+    filters = {"category": category, "min_price": min_price, "max_price": max_price, "available": available}
+    page = _catalog_page(conn, filters, after_id, limit, fields)
 
-    query = "SELECT * FROM products WHERE 1=1"
-    params = []
+    headers = _page_headers(page)
+    if not_modified(request, page["etag"]):
+        return Response(status_code=304, headers=headers)
 
-    if category:
-        query += " AND category = %s"
-        params.append(category)
+    body = b'{"products":' + page["body"] + b',"next_cursor":' + dumps(page["next_cursor"]) + b"}"
+    return Response(content=body, media_type="application/json", headers=headers)
 
-    if min_price is not None:
-        query += " AND price >= %s"
-        params.append(min_price)
+# Catalog cache hit-rate metrics (Admin only)
+@router.get("/cache_stats")
+def cache_stats(user: dict = Depends(get_current_user)):
+    check_role(user, ["admin"])
+    return catalog_cache.stats()
 
-    if max_price is not None:
-        query += " AND price <= %s"
-        params.append(max_price)
+# Get Product; a conditional GET for an unchanged product costs one primary-key lookup
+@router.get("/{product_id}", response_model=ProductOut)
+def get_product(product_id: int, request: Request, response: Response, conn=Depends(get_read_db)):
+    cursor = conn.cursor()
+    try:
+        cursor.execute(
+            f"SELECT {', '.join(PRODUCT_FIELDS)}, UNIX_TIMESTAMP(updated_at) FROM products WHERE id = %s",
+            (product_id,)
+        )
+        row = cursor.fetchone()
+    finally:
+        cursor.close()
 
-    if available is not None:
-        query += " AND availability = %s"
-        params.append(available)
+    if not row:
+        raise HTTPException(status_code=404, detail="Product not found")
 
-    cursor.execute(query, tuple(params))
-    products = cursor.fetchall()
+    modified = row[-1]
+    headers = cache_headers(f"public, max-age={CATALOG_MAX_AGE}", version_etag(product_id, modified), modified)
+    if not_modified(request, headers["ETag"], modified):
+        return Response(status_code=304, headers=headers)
 
-    cursor.close()
-    conn.close()
-    return {"products": products}
\ No newline at end of file
+    response.headers.update(headers)
+    return dict(zip(PRODUCT_FIELDS, row))
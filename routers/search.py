@@ -0,0 +1,38 @@
+from fastapi import APIRouter, Depends, Query
+from database import get_db, get_read_db
+from auth.auth import get_current_user
+from auth.permission import check_role
+from search_index import product_index
+
+router = APIRouter()
+
+# Full-text product search with relevance ranking and facet counts
+@router.get("/products")
+def search_products(
+    q: str = Query("", description="Search text; the last word is matched as a prefix"),
+    category: str = Query(None, description="Filter by category"),
+    min_price: float = Query(None, description="Minimum price"),
+    max_price: float = Query(None, description="Maximum price"),
+    available: bool = Query(None, description="Filter by availability"),
+    limit: int = Query(20, ge=1, le=100),
+    offset: int = Query(0, ge=0, le=1000),
+    conn=Depends(get_read_db)
+):
+    product_index.ensure_fresh(conn)
+    return product_index.search(
+        q, category=category, min_price=min_price, max_price=max_price,
+        available=available, limit=limit, offset=offset
+    )
+
+# Prefix autocomplete
+@router.get("/autocomplete")
+def autocomplete(prefix: str = Query(..., min_length=1), limit: int = Query(10, ge=1, le=50), conn=Depends(get_read_db)):
+    product_index.ensure_fresh(conn)
+    return {"suggestions": product_index.autocomplete(prefix, limit)}
+
+# Rebuild the index from the products table
+@router.post("/reindex")
+def reindex(user: dict = Depends(get_current_user), conn=Depends(get_db)):
+    check_role(user, ["admin"])
+    product_index.load(conn)
+    return {"message": "Search index rebuilt", "products": len(product_index)}
@@ -0,0 +1,175 @@
+import json
+import asyncio
+from fastapi import APIRouter, HTTPException, Depends, Request, WebSocket, WebSocketDisconnect, Query
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse
+from database import get_connection
+from auth.auth import get_current_user
+from auth.permission import check_role
+from events import bus, order_topic, TooManySubscribers
+from transitions import ORDER_TRANSITIONS, DELIVERY_TRANSITIONS, reachable
+
+router = APIRouter()
+
+HEARTBEAT_SECONDS = 15
+FINAL_ORDER_STATUSES = ["Delivered", "Canceled"]
+
+# Current state of an order and its delivery, after checking the user may see it
+def _order_snapshot(user, order_id):
+    conn = get_connection()
+    cursor = conn.cursor(dictionary=True)
+
+    try:
+        cursor.execute(
+            "SELECT o.id AS order_id, o.customer_id, o.status, d.status AS delivery_status, d.tracking_link "
+            "FROM orders o LEFT JOIN deliveries d ON d.order_id = o.id WHERE o.id = %s",
+            (order_id,)
+        )
+        order = cursor.fetchone()
+        if not order:
+            # Archived orders are final, so their stream ends right after the snapshot
+            cursor.execute(
+                "SELECT o.id AS order_id, o.customer_id, o.status, d.status AS delivery_status, d.tracking_link "
+                "FROM orders_archive o LEFT JOIN deliveries_archive d ON d.order_id = o.id WHERE o.id = %s",
+                (order_id,)
+            )
+            order = cursor.fetchone()
+    finally:
+        cursor.close()
+        conn.close()
+
+    if not order:
+        raise HTTPException(status_code=404, detail="Order not found")
+    if user["role"] not in ["admin", "delivery"] and order["customer_id"] != user["user_id"]:
+        raise HTTPException(status_code=403, detail="You are not authorized to track this order")
+
+    return {
+        "type": "snapshot",
+        "order_id": order["order_id"],
+        "status": order["status"],
+        "delivery_status": order["delivery_status"],
+        "tracking_link": order["tracking_link"],
+    }
+
+def _is_final(event):
+    return event.get("type") in ("snapshot", "order_status") and event.get("status") in FINAL_ORDER_STATUSES
+
+# Streams subscribe before they read the snapshot, so no change can fall between the two. Events
+# the client already has, through the snapshot or earlier events, are dropped: an event is passed
+# on only if its status can still follow the last status sent for that record
+def _newer(state, event):
+    if event.get("type") == "order_status":
+        key, transitions = "status", ORDER_TRANSITIONS
+    elif event.get("type") == "delivery_status":
+        key, transitions = "delivery_status", DELIVERY_TRANSITIONS
+    else:
+        return True
+    current = state.get(key)
+    if current is not None and event.get("status") not in reachable(transitions, current):
+        return False
+    state[key] = event.get("status")
+    return True
+
+def _subscribe(order_id):
+    try:
+        return bus.subscribe([order_topic(order_id)])
+    except TooManySubscribers:
+        raise HTTPException(status_code=503, detail="Too many tracking subscribers, try again later")
+
+# Server-Sent Events stream of order and delivery status changes
+@router.get("/orders/{order_id}/events")
+async def order_events(order_id: int, request: Request, user: dict = Depends(get_current_user)):
+    # Access is checked before the response starts, so errors are still 403/404/503
+    await run_in_threadpool(_order_snapshot, user, order_id)
+    if bus.full():
+        raise HTTPException(status_code=503, detail="Too many tracking subscribers, try again later")
+
+    async def stream():
+        # Subscribed inside the generator, so the finally below always unsubscribes
+        try:
+            subscription = bus.subscribe([order_topic(order_id)])
+        except TooManySubscribers:
+            yield f"event: error\ndata: {json.dumps({'detail': 'Too many tracking subscribers, try again later'})}\n\n"
+            return
+        try:
+            snapshot = await run_in_threadpool(_order_snapshot, user, order_id)
+            yield f"event: snapshot\ndata: {json.dumps(snapshot)}\n\n"
+            if _is_final(snapshot):
+                return
+            state = dict(snapshot)
+            while not await request.is_disconnected():
+                events = await subscription.next(timeout=HEARTBEAT_SECONDS)
+                if not events:
+                    yield ": keep-alive\n\n"
+                    continue
+                events = [event for event in events if _newer(state, event)]
+                for event in events:
+                    yield f"event: {event['type']}\ndata: {json.dumps(event, default=str)}\n\n"
+                if any(_is_final(event) for event in events):
+                    return
+        finally:
+            bus.unsubscribe(subscription)
+
+    return StreamingResponse(
+        stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+# WebSocket stream of the same events; browsers cannot set headers, so the token is a query parameter
+@router.websocket("/ws/orders/{order_id}")
+async def order_events_ws(websocket: WebSocket, order_id: int, token: str = Query(...)):
+    try:
+        user = get_current_user(token)
+        subscription = _subscribe(order_id)
+    except HTTPException as e:
+        await websocket.close(code=1008, reason=str(e.detail))
+        return
+
+    received = None
+    try:
+        try:
+            snapshot = await run_in_threadpool(_order_snapshot, user, order_id)
+        except HTTPException as e:
+            await websocket.close(code=1008, reason=str(e.detail))
+            return
+
+        await websocket.accept()
+        # Watch for the client going away while we wait for events
+        received = asyncio.create_task(websocket.receive())
+
+        await websocket.send_json(snapshot)
+        if _is_final(snapshot):
+            await websocket.close()
+            return
+        state = dict(snapshot)
+        while True:
+            next_events = asyncio.create_task(subscription.next(timeout=HEARTBEAT_SECONDS))
+            done, _ = await asyncio.wait({next_events, received}, return_when=asyncio.FIRST_COMPLETED)
+            if received in done:
+                next_events.cancel()
+                if received.result()["type"] == "websocket.disconnect":
+                    return
+                # Messages from the client are ignored
+                received = asyncio.create_task(websocket.receive())
+                continue
+            events = [event for event in next_events.result() if _newer(state, event)]
+            for event in events:
+                await websocket.send_text(json.dumps(event, default=str))
+            if any(_is_final(event) for event in events):
+                await websocket.close()
+                return
+
+    except WebSocketDisconnect:
+        pass
+
+    finally:
+        if received is not None:
+            received.cancel()
+        bus.unsubscribe(subscription)
+
+# Subscriber and publish counters for this worker (Admin only)
+@router.get("/stats")
+def tracking_stats(user: dict = Depends(get_current_user)):
+    check_role(user, ["admin"])
+    return bus.stats()
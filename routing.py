@@ -0,0 +1,137 @@
+import math
+import threading
+
+EARTH_RADIUS_KM = 6371.0088
+
+
+def haversine_km(latitude1, longitude1, latitude2, longitude2):
+    phi1, phi2 = math.radians(latitude1), math.radians(latitude2)
+    dphi = phi2 - phi1
+    dlambda = math.radians(longitude2 - longitude1)
+    a = math.sin(dphi / 2) ** 2 + math.cos(phi1) * math.cos(phi2) * math.sin(dlambda / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * math.asin(math.sqrt(a))
+
+
+def route_length(route, matrix):
+    return sum(matrix[a][b] for a, b in zip(route, route[1:]))
+
+
+# Open route from node 0, always driving to the closest stop not yet visited
+def nearest_neighbor(matrix):
+    route = [0]
+    remaining = set(range(1, len(matrix)))
+    while remaining:
+        row = matrix[route[-1]]
+        nearest = min(remaining, key=row.__getitem__)
+        remaining.remove(nearest)
+        route.append(nearest)
+    return route
+
+
+# Insert node where it lengthens the open route least
+def cheapest_insertion(route, node, matrix):
+    best_position = len(route)
+    best_cost = matrix[route[-1]][node]
+    for position in range(1, len(route)):
+        a, b = route[position - 1], route[position]
+        cost = matrix[a][node] + matrix[node][b] - matrix[a][b]
+        if cost < best_cost:
+            best_position, best_cost = position, cost
+    route.insert(best_position, node)
+    return route
+
+
+def two_opt(route, matrix):
+    """Shorten an open route (route[0] fixed) by reversing segments until no reversal helps."""
+    route = list(route)
+    n = len(route)
+    improved = True
+    while improved:
+        improved = False
+        for i in range(1, n - 1):
+            row_a = matrix[route[i - 1]]
+            for j in range(i + 1, n):
+                b, c = route[i], route[j]
+                # Reversing route[i..j] replaces edges (a, b) and (c, d) with (a, c) and (b, d);
+                # at the end of the route there is no d
+                delta = row_a[c] - row_a[b]
+                if j < n - 1:
+                    d = route[j + 1]
+                    delta += matrix[b][d] - matrix[c][d]
+                if delta < -1e-9:
+                    route[i:j + 1] = route[i:j + 1][::-1]
+                    improved = True
+    return route
+
+
+class RoutePlan:
+    """One courier's stop sequence, kept between requests and re-planned incrementally.
+
+    Distances between stops are computed once per pair with the haversine formula
+    and kept; only the courier's start position is measured again on each update.
+    The first plan is nearest neighbor plus 2-opt. Later, new stops are inserted
+    where they cost least and removed stops dropped, followed by a 2-opt pass. An
+    unchanged set of stops keeps its sequence.
+    """
+
+    def __init__(self):
+        self.stops = []
+        self.points = {}
+        self.distances = {}
+        self._lock = threading.Lock()
+
+    def _add_point(self, stop, point):
+        row = {}
+        for other, other_point in self.points.items():
+            distance = haversine_km(*point, *other_point)
+            row[other] = distance
+            self.distances[other][stop] = distance
+        row[stop] = 0.0
+        self.points[stop] = point
+        self.distances[stop] = row
+
+    def _remove_point(self, stop):
+        del self.points[stop]
+        del self.distances[stop]
+        for row in self.distances.values():
+            row.pop(stop, None)
+
+    def update(self, start, stops):
+        """Sequence stops ({stop_id: (latitude, longitude)}) from start (latitude, longitude).
+
+        Returns (legs, total_km, planning): legs are (stop_id, km from the previous point)
+        in driving order, and planning is "full", "incremental" or "cached".
+        """
+        with self._lock:
+            removed = [stop for stop in self.points if stops.get(stop) != self.points[stop]]
+            added = [stop for stop in stops if stop not in self.points or stops[stop] != self.points[stop]]
+            for stop in removed:
+                self._remove_point(stop)
+            kept = [stop for stop in self.stops if stop in self.points]
+            for stop in added:
+                self._add_point(stop, stops[stop])
+
+            # Node 0 is the start, then the kept stops in their current order, then the new ones
+            nodes = kept + added
+            start_row = [0.0] + [haversine_km(*start, *self.points[stop]) for stop in nodes]
+            matrix = [start_row] + [
+                [start_row[index + 1]] + [self.distances[stop][other] for other in nodes]
+                for index, stop in enumerate(nodes)
+            ]
+
+            if not kept:
+                planning = "full" if nodes else "cached"
+                route = two_opt(nearest_neighbor(matrix), matrix)
+            elif added or removed:
+                planning = "incremental"
+                route = list(range(len(kept) + 1))
+                for node in range(len(kept) + 1, len(nodes) + 1):
+                    cheapest_insertion(route, node, matrix)
+                route = two_opt(route, matrix)
+            else:
+                planning = "cached"
+                route = list(range(len(nodes) + 1))
+
+            self.stops = [nodes[node - 1] for node in route[1:]]
+            legs = [(nodes[b - 1], matrix[a][b]) for a, b in zip(route, route[1:])]
+            return legs, sum(distance for _, distance in legs), planning
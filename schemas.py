@@ -1,4 +1,6 @@
-from pydantic import BaseModel, EmailStr
+from typing import Optional
+from datetime import datetime
+from pydantic import BaseModel, EmailStr, Field
 
 class UserCreate(BaseModel):
     username: str
@@ -18,20 +20,81 @@ class ProductCreate(BaseModel):
     price: float
     availability: bool
     category: str
+    # None leaves stock untracked (on update: unchanged)
+    stock: Optional[int] = Field(None, ge=0)
+
+class OrderItem(BaseModel):
+    product_id: int
+    quantity: int = Field(gt=0)
 
 class OrderCreate(BaseModel):
     customer_id: int
-    products: list  
+    products: list[OrderItem] = Field(min_length=1)
+    delivery_latitude: Optional[float] = None
+    delivery_longitude: Optional[float] = None
 
 
 class OrderStatusUpdate(BaseModel):
     order_id: int
     status: str
 
+class BulkOrderStatusUpdate(BaseModel):
+    transitions: list[OrderStatusUpdate] = Field(..., min_length=1, max_length=10000)
+
 class DeliveryAssign(BaseModel):
     order_id: int
     delivery_personnel_id: int
 
 class DeliveryStatusUpdate(BaseModel):
     order_id: int
-    status: str
\ No newline at end of file
+    status: str
+
+class CourierLocationUpdate(BaseModel):
+    latitude: float
+    longitude: float
+    capacity: Optional[int] = None
+    available: bool = True
+
+
+# Response models. Money and coordinates are typed float so they serialize as JSON numbers
+class ProductOut(BaseModel):
+    id: int
+    vendor_id: int
+    name: str
+    description: Optional[str] = None
+    price: float
+    availability: bool
+    category: Optional[str] = None
+    stock: Optional[int] = None
+
+class OrderItemOut(BaseModel):
+    id: int
+    order_id: int
+    product_id: int
+    quantity: int
+    subtotal: float
+
+class OrderOut(BaseModel):
+    id: int
+    customer_id: int
+    status: str
+    total_amount: float
+    created_at: Optional[datetime] = None
+    delivery_latitude: Optional[float] = None
+    delivery_longitude: Optional[float] = None
+    items: list[OrderItemOut] = []
+
+class OrderPage(BaseModel):
+    orders: list[OrderOut]
+    next_cursor: Optional[str] = None
+
+class ProductPage(BaseModel):
+    products: list[ProductOut]
+    next_cursor: Optional[int] = None
+
+class DeliveryOut(BaseModel):
+    id: int
+    order_id: int
+    delivery_personnel_id: int
+    status: str
+    tracking_link: Optional[str] = None
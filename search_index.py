@@ -0,0 +1,332 @@
+import os
+import re
+import math
+import time
+import heapq
+import bisect
+import threading
+
+TOKEN_RE = re.compile(r"[a-z0-9]+")
+STOPWORDS = {"a", "an", "and", "the", "for", "of", "with", "in", "on", "to", "or", "by"}
+
+# Upper bounds of the price facet buckets; the last bucket is open-ended
+PRICE_BUCKETS = [25, 50, 100, 250, 500, 1000]
+
+# Name matches count more than category/description matches
+NAME_WEIGHT = 3
+K1 = 1.2
+B = 0.75
+LOAD_CHUNK_SIZE = 5000
+# Seconds a worker serves its index before checking the products table for changes made elsewhere
+REFRESH_INTERVAL = float(os.getenv("SEARCH_INDEX_REFRESH", "30"))
+PRODUCT_COLUMNS = "id, name, description, price, availability, category"
+# Checked every REFRESH_INTERVAL; products.updated_at is indexed for it (migration 0010)
+VERSION_QUERY = "SELECT COUNT(*) AS products, MAX(updated_at) AS updated_at FROM products"
+
+
+def tokenize(text):
+    if not text:
+        return []
+    return [token for token in TOKEN_RE.findall(text.lower()) if token not in STOPWORDS]
+
+
+def price_bucket(price):
+    low = 0
+    for high in PRICE_BUCKETS:
+        if price < high:
+            return f"{low}-{high}"
+        low = high
+    return f"{low}+"
+
+
+class ProductIndex:
+    """In-memory inverted index over product name, category and description."""
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        # One load or refresh at a time; searches keep using the current index meanwhile
+        self._build_lock = threading.Lock()
+        self._postings = {}
+        self._docs = {}
+        self._total_length = 0
+        self._sorted_terms = []
+        self._terms_dirty = False
+        # (row count, MAX(updated_at)) of the products table the index reflects, and when it was checked
+        self._version = None
+        self._checked = 0.0
+        self.loaded = False
+
+    def __len__(self):
+        return len(self._docs)
+
+    def _term_frequencies(self, product):
+        frequencies = {}
+        for token in tokenize(product.get("name")):
+            frequencies[token] = frequencies.get(token, 0) + NAME_WEIGHT
+        for field in ("category", "description"):
+            for token in tokenize(product.get(field)):
+                frequencies[token] = frequencies.get(token, 0) + 1
+        return frequencies
+
+    def add(self, product):
+        product_id = product["id"]
+        frequencies = self._term_frequencies(product)
+        length = sum(frequencies.values())
+
+        with self._lock:
+            self._remove(product_id)
+            for term, frequency in frequencies.items():
+                postings = self._postings.get(term)
+                if postings is None:
+                    postings = self._postings[term] = {}
+                    self._terms_dirty = True
+                postings[product_id] = frequency
+            self._docs[product_id] = (
+                product.get("name"),
+                product.get("category"),
+                float(product.get("price") or 0),
+                bool(product.get("availability")),
+                length,
+                tuple(frequencies),
+            )
+            self._total_length += length
+
+    def remove(self, product_id):
+        with self._lock:
+            self._remove(product_id)
+
+    def _remove(self, product_id):
+        doc = self._docs.pop(product_id, None)
+        if doc is None:
+            return
+        self._total_length -= doc[4]
+        for term in doc[5]:
+            postings = self._postings.get(term)
+            if postings is not None:
+                postings.pop(product_id, None)
+                if not postings:
+                    del self._postings[term]
+                    self._terms_dirty = True
+
+    def clear(self):
+        with self._lock:
+            self._postings = {}
+            self._docs = {}
+            self._total_length = 0
+            self._sorted_terms = []
+            self._terms_dirty = False
+            self._version = None
+            self.loaded = False
+
+    # Products table rows, in keyset chunks; with `since`, only those updated at or after it
+    @staticmethod
+    def _rows(cursor, since=None):
+        last_id = 0
+        while True:
+            if since is None:
+                cursor.execute(
+                    f"SELECT {PRODUCT_COLUMNS} FROM products WHERE id > %s ORDER BY id LIMIT %s",
+                    (last_id, LOAD_CHUNK_SIZE)
+                )
+            else:
+                cursor.execute(
+                    f"SELECT {PRODUCT_COLUMNS} FROM products WHERE updated_at >= %s AND id > %s ORDER BY id LIMIT %s",
+                    (since, last_id, LOAD_CHUNK_SIZE)
+                )
+            rows = cursor.fetchall()
+            if not rows:
+                return
+            yield from rows
+            last_id = rows[-1]["id"]
+
+    @staticmethod
+    def _table_version(cursor):
+        cursor.execute(VERSION_QUERY)
+        row = cursor.fetchone()
+        return row["products"], row["updated_at"]
+
+    # Build the index from the products table into a new one and swap it in,
+    # so searches are not blocked for the length of the build
+    def load(self, conn):
+        with self._build_lock:
+            self._load(conn)
+
+    def _load(self, conn):
+        fresh = ProductIndex()
+        cursor = conn.cursor(dictionary=True)
+        try:
+            # Read before the scan, so rows changed during it are picked up by the next refresh
+            version = self._table_version(cursor)
+            for row in self._rows(cursor):
+                fresh.add(row)
+        finally:
+            cursor.close()
+
+        with self._lock:
+            self._postings = fresh._postings
+            self._docs = fresh._docs
+            self._total_length = fresh._total_length
+            self._sorted_terms = []
+            self._terms_dirty = True
+            self._version = version
+            self._checked = time.monotonic()
+            self.loaded = True
+
+    def refresh(self, conn):
+        """Apply products added or updated since the last check, by any worker.
+
+        Deleted products leave nothing to find by updated_at, so when the row count
+        no longer matches the index is rebuilt instead. A refresh already running in
+        another thread makes this a no-op.
+        """
+        if not self._build_lock.acquire(blocking=False):
+            return
+        try:
+            cursor = conn.cursor(dictionary=True)
+            try:
+                version = self._table_version(cursor)
+                if version == self._version:
+                    self._checked = time.monotonic()
+                    return
+                since = self._version[1] if self._version else None
+                changed = list(self._rows(cursor, since)) if since is not None else None
+            finally:
+                cursor.close()
+
+            if changed is None:
+                self._load(conn)
+                return
+            for row in changed:
+                self.add(row)
+            if len(self) != version[0]:
+                self._load(conn)
+                return
+            self._version = version
+            self._checked = time.monotonic()
+        finally:
+            self._build_lock.release()
+
+    # Load on first use, then refresh every REFRESH_INTERVAL seconds
+    def ensure_fresh(self, conn):
+        if not self.loaded:
+            with self._build_lock:
+                if not self.loaded:
+                    self._load(conn)
+        elif time.monotonic() - self._checked >= REFRESH_INTERVAL:
+            self.refresh(conn)
+
+    def _expand(self, token, prefix):
+        if not prefix:
+            return [token] if token in self._postings else []
+        terms = self._terms()
+        start = bisect.bisect_left(terms, token)
+        expanded = []
+        for term in terms[start:]:
+            if not term.startswith(token):
+                break
+            expanded.append(term)
+        return expanded
+
+    def _terms(self):
+        if self._terms_dirty:
+            self._sorted_terms = sorted(self._postings)
+            self._terms_dirty = False
+        return self._sorted_terms
+
+    def search(self, query, category=None, min_price=None, max_price=None, available=None,
+               limit=20, offset=0, prefix=True):
+        tokens = tokenize(query)
+
+        with self._lock:
+            doc_count = len(self._docs)
+            if not doc_count:
+                return {"total": 0, "results": [], "facets": {"category": {}, "price": {}}}
+            average_length = self._total_length / doc_count
+
+            # Each query token matches exactly or, for the last token, by prefix
+            term_groups = []
+            for position, token in enumerate(tokens):
+                terms = self._expand(token, prefix and position == len(tokens) - 1)
+                if not terms:
+                    return {"total": 0, "results": [], "facets": {"category": {}, "price": {}}}
+                term_groups.append(terms)
+
+            scores = None
+            for terms in sorted(term_groups, key=lambda group: sum(len(self._postings[t]) for t in group)):
+                group_scores = {}
+                for term in terms:
+                    postings = self._postings[term]
+                    idf = math.log(1 + (doc_count - len(postings) + 0.5) / (len(postings) + 0.5))
+                    # Walk whichever side is smaller: the postings list or the surviving candidates
+                    if scores is None or len(postings) <= len(scores):
+                        pairs = postings.items()
+                    else:
+                        pairs = ((product_id, postings[product_id]) for product_id in scores if product_id in postings)
+                    for product_id, frequency in pairs:
+                        if scores is not None and product_id not in scores:
+                            continue
+                        length = self._docs[product_id][4]
+                        weight = idf * frequency * (K1 + 1) / (frequency + K1 * (1 - B + B * length / average_length))
+                        group_scores[product_id] = group_scores.get(product_id, 0.0) + weight
+                if scores is None:
+                    scores = group_scores
+                else:
+                    scores = {product_id: scores[product_id] + score for product_id, score in group_scores.items()}
+                if not scores:
+                    break
+
+            if scores is None:
+                # An empty query browses the whole catalog
+                scores = dict.fromkeys(self._docs, 0.0)
+
+            # One pass applies the filters and counts the facets
+            category_counts = {}
+            price_counts = {}
+            matched = []
+            docs = self._docs
+            for product_id, score in scores.items():
+                name, doc_category, price, is_available, _, _ = docs[product_id]
+                if available is not None and is_available != available:
+                    continue
+                price_ok = (min_price is None or price >= min_price) and (max_price is None or price <= max_price)
+                category_ok = category is None or doc_category == category
+                # Each facet ignores its own filter so clients can show the alternatives
+                if price_ok:
+                    category_counts[doc_category] = category_counts.get(doc_category, 0) + 1
+                if category_ok:
+                    bucket = price_bucket(price)
+                    price_counts[bucket] = price_counts.get(bucket, 0) + 1
+                if price_ok and category_ok:
+                    matched.append((score, -product_id))
+
+            top = heapq.nlargest(offset + limit, matched)[offset:]
+            results = []
+            for score, negative_id in top:
+                name, doc_category, price, is_available, _, _ = docs[-negative_id]
+                results.append({
+                    "id": -negative_id,
+                    "name": name,
+                    "category": doc_category,
+                    "price": price,
+                    "availability": is_available,
+                    "score": round(score, 4),
+                })
+
+            return {
+                "total": len(matched),
+                "results": results,
+                "facets": {"category": category_counts, "price": price_counts},
+            }
+
+    # Prefix completions for the last word typed, most common terms first
+    def autocomplete(self, prefix, limit=10):
+        tokens = tokenize(prefix)
+        if not tokens:
+            return []
+        with self._lock:
+            terms = self._expand(tokens[-1], True)
+            counts = [(len(self._postings[term]), term) for term in terms]
+        return [term for _, term in heapq.nlargest(limit, counts)]
+
+
+product_index = ProductIndex()
@@ -0,0 +1,172 @@
+from analytics import queue_orders
+
+# Legal status changes. Delivered and Canceled are final
+ORDER_TRANSITIONS = {
+    "Placed": ["Processing", "Canceled"],
+    "Processing": ["Shipped", "Out for Delivery", "Canceled"],
+    "Shipped": ["Out for Delivery"],
+    "Out for Delivery": ["Delivered"],
+    "Delivered": [],
+    "Canceled": [],
+}
+DELIVERY_TRANSITIONS = {
+    "Assigned": ["Out for Delivery", "Failed"],
+    "Out for Delivery": ["Delivered", "Failed"],
+    # A failed delivery can be attempted again
+    "Failed": ["Assigned"],
+    "Delivered": [],
+}
+
+# An order entering one of these statuses moves its delivery along, and the other way round
+ORDER_DELIVERY_STATUS = {"Out for Delivery": "Out for Delivery", "Delivered": "Delivered", "Canceled": "Failed"}
+DELIVERY_ORDER_STATUS = {"Out for Delivery": "Out for Delivery", "Delivered": "Delivered"}
+
+CHUNK_SIZE = 1000
+
+
+class InvalidTransition(Exception):
+    pass
+
+
+def reachable(transitions, status):
+    """Statuses that can follow status, directly or after others."""
+    seen = set()
+    pending = list(transitions.get(status, ()))
+    while pending:
+        current = pending.pop()
+        if current not in seen:
+            seen.add(current)
+            pending.extend(transitions.get(current, ()))
+    return seen
+
+
+def _follow(transitions, label, current, target):
+    if target is None or target == current:
+        return current
+    if target not in transitions.get(current, ()):
+        raise InvalidTransition(f"{label} cannot go from {current} to {target}")
+    return target
+
+
+def plan(kind, status, order_status, delivery_status):
+    """New (order status, delivery status) after moving an order (kind "order") or its
+    delivery (kind "delivery") to status; the other one follows where the two are paired.
+
+    delivery_status is None for an order without a delivery. Raises InvalidTransition
+    if either change is not allowed, so an order and its delivery never drift apart.
+    """
+    transitions = ORDER_TRANSITIONS if kind == "order" else DELIVERY_TRANSITIONS
+    if status not in transitions:
+        raise InvalidTransition(f"Invalid {kind} status: {status}")
+
+    if kind == "order":
+        order_target, delivery_target = status, ORDER_DELIVERY_STATUS.get(status)
+    else:
+        order_target, delivery_target = DELIVERY_ORDER_STATUS.get(status), status
+
+    new_order = _follow(ORDER_TRANSITIONS, "Order", order_status, order_target)
+    if delivery_status is None:
+        return new_order, None
+    new_delivery = _follow(DELIVERY_TRANSITIONS, "Delivery", delivery_status, delivery_target)
+    if new_delivery != delivery_status and not ORDER_TRANSITIONS[order_status]:
+        raise InvalidTransition(f"Order is {order_status}, its delivery can no longer change")
+    return new_order, new_delivery
+
+
+def _in(values):
+    return ", ".join(["%s"] * len(values))
+
+
+def _chunks(values):
+    for start in range(0, len(values), CHUNK_SIZE):
+        yield values[start:start + CHUNK_SIZE]
+
+
+# Put the reserved stock of canceled orders back
+def _restore_stock(cursor, order_ids):
+    cursor.execute(
+        "UPDATE products SET stock = stock + (SELECT SUM(quantity) FROM order_items "
+        f"WHERE order_id IN ({_in(order_ids)}) AND product_id = products.id) "
+        f"WHERE stock IS NOT NULL AND id IN (SELECT product_id FROM order_items WHERE order_id IN ({_in(order_ids)}))",
+        (*order_ids, *order_ids)
+    )
+
+
+def _write(cursor, table, key, transitions, updates):
+    for target, order_ids in updates.items():
+        # The rows are locked, so the status condition only guards against a stale plan
+        sources = [source for source, targets in transitions.items() if target in targets]
+        for chunk in _chunks(order_ids):
+            cursor.execute(
+                f"UPDATE {table} SET status = %s WHERE {key} IN ({_in(chunk)}) AND status IN ({_in(sources)})",
+                (target, *chunk, *sources)
+            )
+
+
+def apply_transitions(cursor, kind, changes, delivery_personnel_id=None):
+    """Apply (order_id, status) changes to orders (kind "order") or deliveries (kind "delivery").
+
+    Runs in the caller's transaction. Each chunk of orders and their deliveries is locked
+    and read with one query, and every change is checked with plan(). Accepted changes are
+    written with one conditional UPDATE per table and target status. Canceled orders get
+    their stock back and are queued to leave the sales rollups. With delivery_personnel_id,
+    only that courier's deliveries may change.
+
+    Returns (outcomes, events): one outcome per change, in order, and the
+    (order_id, event) pairs to publish once the transaction is committed.
+    """
+    outcomes = []
+    events = []
+    order_updates = {}
+    delivery_updates = {}
+    seen = set()
+
+    for chunk in _chunks(changes):
+        order_ids = sorted({order_id for order_id, _ in chunk})
+        cursor.execute(
+            "SELECT o.id, o.status, d.status, d.delivery_personnel_id FROM orders o "
+            f"LEFT JOIN deliveries d ON d.order_id = o.id WHERE o.id IN ({_in(order_ids)}) ORDER BY o.id FOR UPDATE",
+            tuple(order_ids)
+        )
+        current = {row[0]: row[1:] for row in cursor.fetchall()}
+
+        for order_id, status in chunk:
+            outcome = {"order_id": order_id, "status": status}
+            outcomes.append(outcome)
+            if order_id in seen:
+                outcome.update(result="duplicate", detail="Order appears more than once in this request")
+                continue
+            seen.add(order_id)
+
+            order_status, delivery_status, courier_id = current.get(order_id, (None, None, None))
+            outcome.update(order_status=order_status, delivery_status=delivery_status)
+            if order_status is None or (kind == "delivery" and delivery_status is None):
+                outcome.update(result="not_found", detail="Order not found" if order_status is None else "Delivery not found for this order")
+                continue
+            if delivery_personnel_id is not None and courier_id != delivery_personnel_id:
+                outcome.update(result="forbidden", detail="You are not assigned to this delivery")
+                continue
+
+            try:
+                new_order, new_delivery = plan(kind, status, order_status, delivery_status)
+            except InvalidTransition as e:
+                outcome.update(result="invalid_transition", detail=str(e))
+                continue
+
+            outcome.update(order_status=new_order, delivery_status=new_delivery)
+            outcome["result"] = "updated" if (new_order, new_delivery) != (order_status, delivery_status) else "unchanged"
+            if new_order != order_status:
+                order_updates.setdefault(new_order, []).append(order_id)
+                events.append((order_id, {"type": "order_status", "order_id": order_id, "status": new_order}))
+            if new_delivery != delivery_status:
+                delivery_updates.setdefault(new_delivery, []).append(order_id)
+                events.append((order_id, {"type": "delivery_status", "order_id": order_id, "status": new_delivery}))
+
+    _write(cursor, "orders", "id", ORDER_TRANSITIONS, order_updates)
+    _write(cursor, "deliveries", "order_id", DELIVERY_TRANSITIONS, delivery_updates)
+
+    for chunk in _chunks(order_updates.get("Canceled", [])):
+        _restore_stock(cursor, chunk)
+        queue_orders(cursor, chunk, sign=-1)
+
+    return outcomes, events